@@ -0,0 +1 @@
+default_app_config = 'superman.apps.accounts.app_config.AccountsConfig'
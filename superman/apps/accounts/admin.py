@@ -1,9 +1,29 @@
-from django.contrib import admin
+from django.conf import settings
+from django.conf.urls import url
+from django.contrib.admin.utils import unquote
+from django.contrib import admin, messages
+from django.contrib.admin import helpers
+from django.contrib.admin.views.main import ORDER_VAR
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
-from django.utils.translation import ugettext_lazy as _
+from django.core.exceptions import PermissionDenied
+from django.core.urlresolvers import reverse
+from django.db import transaction
+from django.http import FileResponse, Http404, HttpResponseRedirect, JsonResponse, StreamingHttpResponse
+from django.template.response import TemplateResponse
+from django.utils.translation import ugettext, ugettext_lazy as _, ungettext
 
-from .models import User
-from .forms import UserCreationForm, UserChangeForm
+from .audit import audit_update, record
+from .changelist import EstimatedCountPaginator, UserChangeList
+from .exports import CONTENT_TYPES, stream_rows
+from .filters import CreatedByFilter, search_creators
+from .models import AuditEntry, User
+from .outbox import publish_update
+from .profiling import (
+    SORT_KEYS, ProfileNotFound, get_path, get_top_functions, get_top_queries, list_profiles, load_profile)
+from .search import search_users
+from .forms import ReassignForm, UserCreationForm, UserChangeForm
+from .utils import CSV, JSONL
+from .widgets import CreatorRawIdWidget
 
 
 @admin.register(User)
@@ -27,8 +47,91 @@ class UserAdmin(BaseUserAdmin):
     form = UserChangeForm
     list_display = ('username', 'first_name', 'last_name', 'iban',
                     'is_staff', 'is_superuser', 'is_active', 'created_by')
-    list_filter = ('is_staff', 'is_superuser', 'is_active', 'date_joined', 'created_by')
+    list_filter = ('is_staff', 'is_superuser', 'is_active', 'date_joined', CreatedByFilter)
+    list_select_related = ('created_by', )
+    # searched with trigram indexes by `search_users`, listed to show the search box
+    search_fields = ('username', 'first_name', 'last_name', 'email', 'iban')
+    # avoid second COUNT(*) of the whole table on filtered changelist
+    show_full_result_count = False
     raw_id_fields = ('created_by', )
+    actions = ['activate_users', 'deactivate_users', 'reassign_created_by', 'clear_iban',
+               'export_csv', 'export_jsonl']
+    # bulk actions changing users and who can run them besides users with change permission
+    change_actions = {
+        'activate_users': None,
+        'deactivate_users': None,
+        'reassign_created_by': 'is_superuser',
+        'clear_iban': 'is_superuser',
+    }
+
+    def get_urls(self):
+        info = self.model._meta.app_label, self.model._meta.model_name
+        return [
+            url(r'^creators/$', self.admin_site.admin_view(self.creators_view), name='%s_%s_creators' % info),
+            url(r'^profiles/$', self.admin_site.admin_view(self.profiles_view), name='%s_%s_profiles' % info),
+            url(r'^profiles/([0-9a-f-]+)/$', self.admin_site.admin_view(self.profile_view),
+                name='%s_%s_profile' % info),
+        ] + super(UserAdmin, self).get_urls()
+
+    def creators_view(self, request):
+        """
+        Searches creators for `created_by` filter by `q` parameter
+        """
+        if not request.user.is_superuser or not self.has_change_permission(request):
+            raise PermissionDenied
+        return JsonResponse({'results': search_creators(self.model, request.GET.get('q', ''))})
+
+    def profiles_view(self, request):
+        """
+        Lists stored profiles of requests, see `profiling.ProfilingMiddleware`
+        """
+        if not request.user.is_superuser:
+            raise PermissionDenied
+        return TemplateResponse(request, 'admin/accounts/user/profiles.html', dict(
+            self.admin_site.each_context(request),
+            title=_('Profiled requests'),
+            opts=self.model._meta,
+            profiles=list_profiles(),
+            enabled=settings.PROFILING_ENABLED,
+        ))
+
+    def profile_view(self, request, profile_id):
+        """
+        Top functions sorted by `sort` parameter and top SQL queries of a profile, `download`
+        parameter returns the `pstats` dump
+        """
+        if not request.user.is_superuser:
+            raise PermissionDenied
+        sort = request.GET.get('sort')
+        if sort not in SORT_KEYS:
+            sort = SORT_KEYS[0]
+        try:
+            profile = load_profile(profile_id)
+            if 'download' in request.GET:
+                response = FileResponse(open(get_path(profile_id, 'prof'), 'rb'),
+                                        content_type='application/octet-stream')
+                response['Content-Disposition'] = 'attachment; filename="%s.prof"' % profile_id
+                return response
+            functions = get_top_functions(profile_id, sort)
+        except (ProfileNotFound, FileNotFoundError):
+            raise Http404
+        return TemplateResponse(request, 'admin/accounts/user/profile.html', dict(
+            self.admin_site.each_context(request),
+            title=_('Profile of %(method)s %(path)s') % profile,
+            opts=self.model._meta,
+            profile=profile,
+            sort=sort,
+            sort_keys=SORT_KEYS,
+            functions=functions,
+            queries=get_top_queries(profile['queries']),
+        ))
+
+    def formfield_for_foreignkey(self, db_field, request=None, **kwargs):
+        formfield = super(UserAdmin, self).formfield_for_foreignkey(db_field, request, **kwargs)
+        if db_field.name == 'created_by' and db_field.name in self.raw_id_fields:
+            formfield.widget = CreatorRawIdWidget(db_field.remote_field, self.admin_site,
+                                                  using=kwargs.get('using'))
+        return formfield
 
     def get_form(self, request, obj=None, **kwargs):
         user = request.user
@@ -57,6 +160,29 @@ class UserAdmin(BaseUserAdmin):
             return list_display
         return super(UserAdmin, self).get_list_display(request)
 
+    def get_list_select_related(self, request):
+        """
+        Join creators only when they are displayed
+        """
+        if 'created_by' in self.get_list_display(request):
+            return self.list_select_related
+        return ()
+
+    def get_changelist(self, request, **kwargs):
+        return UserChangeList
+
+    def keyset_pagination_enabled(self, request):
+        return settings.ADMIN_KEYSET_PAGINATION
+
+    def get_paginator(self, request, queryset, per_page, orphans=0, allow_empty_first_page=True):
+        """
+        Keyset pagination is meant for big tables so counts are estimated as well
+        """
+        if self.keyset_pagination_enabled(request):
+            return EstimatedCountPaginator(queryset, per_page, orphans, allow_empty_first_page)
+        return super(UserAdmin, self).get_paginator(request, queryset, per_page, orphans,
+                                                    allow_empty_first_page)
+
     def get_list_filter(self, request):
         """
         For simple administrators who are not superuser we only need to show relevant filters
@@ -69,6 +195,7 @@ class UserAdmin(BaseUserAdmin):
     def has_permission(self, request, obj=None):
         """
         If user is not superuser then check request.user is the one who created the user `obj`
+        (or one of his ancestors in subtree scope)
         :param request: Http request
         :param obj: accounts.User object
         :return: boolean
@@ -76,8 +203,10 @@ class UserAdmin(BaseUserAdmin):
         has_perm = True
         user = request.user
         if obj and not user.is_superuser:
-            created_by = obj.created_by
-            if not created_by or created_by.id != user.id:
+            if self.subtree_scope_enabled(request):
+                if not obj.owner_path.startswith(user.subtree_path):
+                    has_perm = False
+            elif obj.created_by_id != user.id:
                 has_perm = False
         return has_perm
 
@@ -95,4 +224,166 @@ class UserAdmin(BaseUserAdmin):
         qs = super(UserAdmin, self).get_queryset(request)
         if request.user.is_superuser:
             return qs
+        if self.subtree_scope_enabled(request):
+            return qs.descendants_of(request.user)
         return qs.filter(created_by__id=request.user.id)
+
+    def get_search_results(self, request, queryset, search_term):
+        """
+        Results are ranked by relevance unless user picked ordering by clicking column headers
+        """
+        return search_users(queryset, search_term, rank=ORDER_VAR not in request.GET), False
+
+    def history_view(self, request, object_id, extra_context=None):
+        """
+        History of the user is browsed in audit log
+        """
+        obj = self.get_object(request, unquote(object_id))
+        if obj is None or not self.has_change_permission(request, obj):
+            raise PermissionDenied
+        return HttpResponseRedirect('%s?user__id__exact=%s' % (
+            reverse('admin:accounts_auditentry_changelist', current_app=self.admin_site.name), obj.pk))
+
+    def subtree_scope_enabled(self, request):
+        """
+        Administrators manage the whole subtree of users created by them or their descendants
+        instead of only the users they created
+        """
+        return settings.ADMIN_SUBTREE_SCOPE
+
+    def get_export_fields(self, request):
+        """
+        Exported columns are the model fields user can see in changelist
+        """
+        names = set(f.name for f in self.model._meta.concrete_fields)
+        return [name for name in self.get_list_display(request) if name in names]
+
+    def export(self, request, queryset, fmt):
+        """
+        Streams selected users in given format without loading them all in memory
+        """
+        fields = self.get_export_fields(request)
+        response = StreamingHttpResponse(stream_rows(queryset, fields, fmt),
+                                         content_type=CONTENT_TYPES[fmt])
+        response['Content-Disposition'] = 'attachment; filename="users.%s"' % fmt
+        return response
+
+    def export_csv(self, request, queryset):
+        return self.export(request, queryset, CSV)
+    export_csv.short_description = _('Export selected users as CSV')
+
+    def export_jsonl(self, request, queryset):
+        return self.export(request, queryset, JSONL)
+    export_jsonl.short_description = _('Export selected users as JSONL')
+
+    def get_actions(self, request):
+        """
+        Permissions of bulk actions are checked once per request, selected users are always
+        limited to `get_queryset` i.e. to the users owned by the administrator
+        """
+        actions = super(UserAdmin, self).get_actions(request)
+        can_change = self.has_change_permission(request)
+        for name, user_attr in self.change_actions.items():
+            if not can_change or (user_attr and not getattr(request.user, user_attr)):
+                actions.pop(name, None)
+        return actions
+
+    def update_users(self, request, queryset, message, **values):
+        """
+        Updates selected users with a single UPDATE, changes are audited and published as UPDATE
+        doesn't send signals
+        """
+        with transaction.atomic():
+            entries = audit_update(queryset, values)
+            publish_update(queryset, values)
+            rows = queryset.update(**values)
+            record(entries)
+        self.message_user(request, message % {'count': rows}, messages.SUCCESS)
+
+    def activate_users(self, request, queryset):
+        self.update_users(request, queryset, ugettext('%(count)d users were activated.'), is_active=True)
+    activate_users.short_description = _('Activate selected users')
+
+    def deactivate_users(self, request, queryset):
+        # administrators can't lock themselves out
+        self.update_users(request, queryset.exclude(pk=request.user.pk),
+                          ugettext('%(count)d users were deactivated.'), is_active=False)
+    deactivate_users.short_description = _('Deactivate selected users')
+
+    def clear_iban(self, request, queryset):
+        self.update_users(request, queryset, ugettext('IBAN of %(count)d users was cleared.'), iban=None)
+    clear_iban.short_description = _('Clear IBAN of selected users')
+
+    def reassign_created_by(self, request, queryset):
+        """
+        Asks for the new owner of selected users, then reassigns them with a single UPDATE, changes
+        are audited and published as UPDATE doesn't send signals
+        """
+        form = ReassignForm(request.POST if request.POST.get('post') else None)
+        if form.is_valid():
+            created_by = form.cleaned_data['created_by']
+            values = {'created_by_id': created_by.pk if created_by else None}
+            try:
+                with transaction.atomic():
+                    entries = audit_update(queryset, values)
+                    publish_update(queryset, values)
+                    rows = queryset.reassign(created_by)
+                    record(entries)
+            except ValueError:
+                self.message_user(request, ugettext('User can not be created by himself or his descendants.'),
+                                  messages.ERROR)
+                return None
+            self.message_user(request, ungettext(
+                '%(count)d user was reassigned to %(owner)s.', '%(count)d users were reassigned to %(owner)s.',
+                rows) % {'count': rows, 'owner': created_by or '-'}, messages.SUCCESS)
+            return None
+
+        opts = self.model._meta
+        context = dict(
+            self.admin_site.each_context(request),
+            title=_('Reassign selected users'),
+            opts=opts,
+            form=form,
+            count=queryset.count(),
+            action=request.POST.get('action'),
+            select_across=request.POST.get('select_across', '0'),
+            selected=request.POST.getlist(helpers.ACTION_CHECKBOX_NAME),
+            action_checkbox_name=helpers.ACTION_CHECKBOX_NAME,
+        )
+        request.current_app = self.admin_site.name
+        return TemplateResponse(request, 'admin/%s/%s/reassign_created_by.html' % (
+            opts.app_label, opts.model_name), context)
+    reassign_created_by.short_description = _('Reassign selected users to another owner')
+
+
+@admin.register(AuditEntry)
+class AuditEntryAdmin(admin.ModelAdmin):
+    """
+    Read only audit log, administrators see history of users they can change
+    """
+    list_display = ('created_at', 'username', 'action', 'changes', 'actor')
+    list_display_links = None
+    list_filter = ('action', 'created_at')
+    list_select_related = ('actor', )
+    show_full_result_count = False
+    actions = None
+
+    def get_queryset(self, request):
+        qs = super(AuditEntryAdmin, self).get_queryset(request)
+        if request.user.is_superuser:
+            return qs
+        users = self.admin_site._registry[User].get_queryset(request)
+        return qs.filter(user__in=users.order_by().values('pk'))
+
+    def has_module_permission(self, request):
+        return self.has_change_permission(request)
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        # whoever can change users can browse their history
+        return obj is None and self.admin_site._registry[User].has_change_permission(request)
+
+    def has_delete_permission(self, request, obj=None):
+        return False
@@ -0,0 +1,142 @@
+from django.conf import settings
+from django.contrib import admin
+from django.contrib.admin.options import IncorrectLookupParameters
+from django.contrib.auth import get_user_model
+from django.http import JsonResponse
+from django.views.decorators.http import require_GET
+
+from .changelist import CURSOR_VAR, decode_cursor, encode_cursor
+from .sync import InvalidCursor, get_changes, scoped_tombstones
+
+
+FIELDS_VAR = 'fields'
+LIMIT_VAR = 'limit'
+
+# fields readable by superusers through the API, relations are serialized as primary keys
+API_FIELDS = ('id', 'username', 'first_name', 'last_name', 'email', 'iban', 'is_active', 'is_staff',
+              'is_superuser', 'created_by', 'date_joined', 'last_login')
+
+
+class APIError(Exception):
+    def __init__(self, message, status=400):
+        super(APIError, self).__init__(message)
+        self.message = message
+        self.status = status
+
+
+def api_view(view):
+    """
+    Lets administrators who can change users in the admin call the view, errors are returned as JSON
+    """
+    def wrapper(request, *args, **kwargs):
+        user = request.user
+        model_admin = admin.site._registry[get_user_model()]
+        try:
+            if not user.is_authenticated:
+                raise APIError('Authentication credentials were not provided.', status=401)
+            if not user.is_active or not user.is_staff or not model_admin.has_change_permission(request):
+                raise APIError('You do not have permission to perform this action.', status=403)
+            return view(request, model_admin, *args, **kwargs)
+        except APIError as e:
+            return JsonResponse({'error': e.message}, status=e.status)
+    wrapper.__name__ = view.__name__
+    wrapper.__doc__ = view.__doc__
+    return require_GET(wrapper)
+
+
+def get_allowed_fields(request, model_admin):
+    """
+    Superusers read all `API_FIELDS`, other administrators only `id` and the columns they
+    see in the changelist and export
+    """
+    if request.user.is_superuser:
+        return list(API_FIELDS)
+    exported = model_admin.get_export_fields(request)
+    return [name for name in API_FIELDS if name == 'id' or name in exported]
+
+
+def get_fields(request, model_admin):
+    """
+    Fields selected by comma separated `fields` parameter, all allowed fields by default
+    """
+    allowed = get_allowed_fields(request, model_admin)
+    value = request.GET.get(FIELDS_VAR)
+    if not value:
+        return allowed
+    fields = []
+    for name in value.split(','):
+        name = name.strip()
+        if name not in allowed:
+            raise APIError('Unknown field "%s", choose from %s.' % (name, ', '.join(allowed)))
+        if name not in fields:
+            fields.append(name)
+    return fields
+
+
+def get_limit(request):
+    value = request.GET.get(LIMIT_VAR)
+    if not value:
+        return settings.API_PAGE_SIZE
+    try:
+        limit = int(value)
+    except ValueError:
+        limit = 0
+    if not 0 < limit <= settings.API_MAX_PAGE_SIZE:
+        raise APIError('%s must be a number from 1 to %d.' % (LIMIT_VAR, settings.API_MAX_PAGE_SIZE))
+    return limit
+
+
+@api_view
+def user_list(request, model_admin):
+    """
+    Users visible to the administrator in the admin ordered by primary key, paginated by an opaque
+    `cursor` of the last primary key, so every page is a single index range scan. Only selected
+    columns are read as tuples, no model instances are built.
+    """
+    fields = get_fields(request, model_admin)
+    limit = get_limit(request)
+    queryset = model_admin.get_queryset(request).order_by('pk')
+    cursor = request.GET.get(CURSOR_VAR)
+    if cursor:
+        try:
+            queryset = queryset.filter(pk__gt=int(decode_cursor(cursor)))
+        except (IncorrectLookupParameters, TypeError, ValueError):
+            raise APIError('Invalid cursor.')
+    # fetch one more row to know if there is a next page, its primary key is never serialized
+    rows = list(queryset.values_list('pk', *fields)[:limit + 1])
+    next_url = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        params = request.GET.copy()
+        params[CURSOR_VAR] = encode_cursor(rows[-1][0])
+        next_url = request.build_absolute_uri('%s?%s' % (request.path, params.urlencode()))
+    return JsonResponse({
+        'results': [dict(zip(fields, row[1:])) for row in rows],
+        'next': next_url,
+    })
+
+
+@api_view
+def user_detail(request, model_admin, pk):
+    fields = get_fields(request, model_admin)
+    row = model_admin.get_queryset(request).filter(pk=pk).values_list(*fields).first()
+    if row is None:
+        raise APIError('Not found.', status=404)
+    return JsonResponse(dict(zip(fields, row)))
+
+
+@api_view
+def user_changes(request, model_admin):
+    """
+    Users changed or deleted after `cursor`, oldest change first. Response `cursor` is stored by
+    the client and passed to the next call, which returns only what changed since.
+    """
+    fields = get_fields(request, model_admin)
+    limit = get_limit(request)
+    try:
+        rows, cursor, has_more = get_changes(
+            model_admin.get_queryset(request), scoped_tombstones(request.user), fields,
+            request.GET.get(CURSOR_VAR), limit)
+    except InvalidCursor as e:
+        raise APIError(str(e))
+    return JsonResponse({'results': rows, 'cursor': cursor, 'has_more': has_more})
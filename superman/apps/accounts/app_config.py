@@ -1,5 +1,28 @@
 from django.apps import AppConfig
+from django.core import checks
+from django.core.signals import setting_changed
+from django.db.models.signals import m2m_changed, post_delete, post_init, post_save, pre_delete
 
 
 class AccountsConfig(AppConfig):
     name = 'superman.apps.accounts'
+
+    def ready(self):
+        from . import signals
+        from .cache import check_shared_cache
+
+        checks.register(check_shared_cache, checks.Tags.caches, deploy=True)
+
+        User = self.get_model('User')
+        post_init.connect(signals.remember_original_values, sender=User)
+        post_save.connect(signals.invalidate_creators_cache, sender=User)
+        post_delete.connect(signals.invalidate_creators_cache, sender=User)
+        pre_delete.connect(signals.load_deleted_user_fields, sender=User)
+        pre_delete.connect(signals.detach_owned_users, sender=User)
+        post_save.connect(signals.audit_user_saved, sender=User)
+        post_delete.connect(signals.audit_user_deleted, sender=User)
+        post_delete.connect(signals.create_tombstone, sender=User)
+        post_save.connect(signals.publish_user_events, sender=User)
+        for name in signals.AUDIT_M2M_FIELDS:
+            m2m_changed.connect(signals.audit_m2m_changed, sender=getattr(User, name).through)
+        setting_changed.connect(signals.clear_backend_names)
@@ -0,0 +1,250 @@
+import atexit
+import json
+import logging
+import queue
+import threading
+import time
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .models import AuditEntry
+
+
+logger = logging.getLogger(__name__)
+
+# fields of User whose changes are audited, foreign keys by their column
+AUDIT_FIELDS = ('email', 'iban', 'is_active', 'is_staff', 'is_superuser', 'created_by_id')
+# many to many fields audited as added and removed primary keys
+AUDIT_M2M_FIELDS = ('groups', 'user_permissions')
+
+_local = threading.local()
+
+# queued by `AuditLogWriter.stop` to wake up the thread waiting for a batch to fill up
+_STOP = object()
+
+
+def get_actor_id():
+    """
+    Primary key of the user making changes in current request, see `AuditMiddleware`
+    """
+    user = getattr(_local, 'user', None)
+    if user is None or not user.is_authenticated:
+        return None
+    return user.pk
+
+
+def get_original_values(instance):
+    # deferred fields are not loaded just to remember them
+    return dict((name, instance.__dict__[name]) for name in AUDIT_FIELDS if name in instance.__dict__)
+
+
+def diff(original, instance):
+    """
+    Audited fields of `instance` which changed since `original` values were taken
+    :return: dict of {field: [old value, new value]}
+    """
+    changes = {}
+    for name, value in get_original_values(instance).items():
+        if name in original and original[name] != value:
+            changes[name] = [original[name], value]
+    return changes
+
+
+def make_entry(user_id, username, action, changes):
+    return AuditEntry(user_id=user_id, actor_id=get_actor_id(), username=username, action=action,
+                      changes=json.dumps(changes, cls=DjangoJSONEncoder, sort_keys=True),
+                      created_at=timezone.now())
+
+
+def make_create_entry(user):
+    return make_entry(user.pk, user.get_username(), AuditEntry.CREATE,
+                      dict((name, [None, value]) for name, value in get_original_values(user).items()))
+
+
+def audit_update(queryset, values):
+    """
+    Entries of a bulk `queryset.update(**values)` which doesn't send signals, call it before the update
+    :return: list of unsaved `AuditEntry` objects for users whose audited fields change
+    """
+    fields = [name for name in AUDIT_FIELDS if name in values]
+    if not fields:
+        return []
+    entries = []
+    for row in queryset.values_list('pk', queryset.model.USERNAME_FIELD, *fields):
+        changes = dict((name, [old, values[name]])
+                       for name, old in zip(fields, row[2:]) if old != values[name])
+        if changes:
+            entries.append(make_entry(row[0], row[1], AuditEntry.UPDATE, changes))
+    return entries
+
+
+def record(entries, using=None):
+    """
+    Queues unsaved `AuditEntry` objects once current transaction commits, entries of rolled back
+    changes are dropped. Entries are written by a background thread unless `AUDIT_LOG_ASYNC` is off.
+    """
+    entries = list(entries)
+    if not entries:
+        return
+    if settings.AUDIT_LOG_ASYNC:
+        transaction.on_commit(lambda: get_writer().put(entries), using=using)
+    else:
+        transaction.on_commit(lambda: write_entries(entries), using=using)
+
+
+def write_entries(entries):
+    AuditEntry.objects.bulk_create(entries)
+
+
+class AuditLogWriter(object):
+    """
+    Writes queued audit entries from a background thread with a single `bulk_create` per batch,
+    a batch is written when it has `batch_size` entries or `flush_interval` seconds after its
+    first entry was queued. Queued entries are written at shutdown too. When the queue is full
+    entries are written by the calling thread, so they are never lost. Failed batch is retried
+    `max_attempts` times after `retry_delay` seconds doubling with every attempt, the background
+    thread retries on a new connection while the calling thread's connection is left alone.
+    """
+    def __init__(self, batch_size=500, flush_interval=1.0, max_size=10000, max_attempts=3, retry_delay=0.5):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self.queue = queue.Queue(max_size)
+        self.lock = threading.Lock()
+        self.stopping = threading.Event()
+        self.thread = None
+
+    def put(self, entries):
+        self.start()
+        overflow = []
+        for entry in entries:
+            try:
+                self.queue.put_nowait(entry)
+            except queue.Full:
+                overflow.append(entry)
+        if overflow:
+            logger.warning('audit log queue is full, writing %d entries synchronously', len(overflow))
+            # caller's connection may be in use, e.g. by a transaction of the request
+            self.write(overflow, recycle=False)
+
+    def start(self):
+        if self.thread is not None:
+            return
+        with self.lock:
+            if self.thread is None:
+                self.stopping.clear()
+                self.thread = threading.Thread(target=self.run, name='audit-log-writer')
+                self.thread.daemon = True
+                self.thread.start()
+                atexit.register(self.stop)
+
+    def stop(self, timeout=None):
+        """
+        Stops the thread and writes entries left in the queue
+        """
+        with self.lock:
+            thread, self.thread = self.thread, None
+        if thread is not None:
+            self.stopping.set()
+            try:
+                self.queue.put(_STOP, timeout=timeout)
+            except queue.Full:
+                pass
+            thread.join(timeout)
+            atexit.unregister(self.stop)
+        self.flush()
+
+    def flush(self):
+        """
+        Writes all queued entries from the calling thread
+        """
+        while True:
+            batch = self.take(block=False)
+            if not batch:
+                return
+            self.write(batch, recycle=False)
+
+    def take(self, block=True):
+        """
+        Next batch of entries, waits for the first one at most `flush_interval` seconds and for
+        the batch to fill up until `flush_interval` seconds passed since the first one
+        """
+        batch = []
+        deadline = None
+        while len(batch) < self.batch_size:
+            timeout = self.flush_interval if deadline is None else deadline - time.time()
+            try:
+                entry = self.queue.get(block and timeout > 0, max(timeout, 0))
+            except queue.Empty:
+                break
+            if entry is _STOP:
+                break
+            batch.append(entry)
+            if deadline is None:
+                deadline = time.time() + self.flush_interval
+        return batch
+
+    def write(self, batch, recycle=True):
+        """
+        :param recycle: replace broken connection before every attempt, only the thread's own
+            connection can be closed
+        """
+        for attempt in range(1, self.max_attempts + 1):
+            # broken connection or one over `CONN_MAX_AGE` is replaced, as after a request
+            if recycle and not connection.in_atomic_block:
+                connection.close_if_unusable_or_obsolete()
+            try:
+                write_entries(batch)
+                return
+            except Exception:
+                if attempt == self.max_attempts:
+                    logger.exception('failed to write %d audit entries', len(batch))
+                    return
+                logger.warning('failed to write %d audit entries, attempt %d of %d', len(batch), attempt,
+                               self.max_attempts, exc_info=True)
+            if recycle and not connection.in_atomic_block:
+                connection.close()
+            time.sleep(self.retry_delay * 2 ** (attempt - 1))
+
+    def run(self):
+        try:
+            while not self.stopping.is_set():
+                batch = self.take()
+                if batch:
+                    self.write(batch)
+        finally:
+            # thread's own connection
+            connection.close()
+
+
+_writer = None
+_writer_lock = threading.Lock()
+
+
+def get_writer():
+    global _writer
+    if _writer is None:
+        with _writer_lock:
+            if _writer is None:
+                _writer = AuditLogWriter(settings.AUDIT_LOG_BATCH_SIZE, settings.AUDIT_LOG_FLUSH_INTERVAL,
+                                         settings.AUDIT_LOG_QUEUE_SIZE)
+    return _writer
+
+
+class AuditMiddleware(object):
+    """
+    Remembers who makes the request, audit entries of changes made in the request name them as actor
+    """
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        _local.user = getattr(request, 'user', None)
+        try:
+            return self.get_response(request)
+        finally:
+            _local.user = None
@@ -0,0 +1,47 @@
+import logging
+import time
+
+from django.db import transaction
+from django.db.models import Max, Min
+
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CHUNK_SIZE = 10000
+
+
+def batched_update(queryset, values, chunk_size=DEFAULT_CHUNK_SIZE, start_pk=None, progress=None):
+    """
+    Runs `queryset.update(**values)` as a series of set based UPDATEs over primary key ranges,
+    each range is committed in its own transaction so locks are held only for one chunk.
+    Update is resumable: pass `start_pk` reported by last progress, or simply run it again when
+    `queryset` excludes already updated rows (e.g. `filter(iban='')` when setting `iban=None`).
+    Use it from `RunPython` migrations with `atomic = False`.
+    :param queryset: rows to update, model must have an integer primary key
+    :param values: dict of field names and values or expressions to set
+    :param chunk_size: size of primary key range updated at once
+    :param start_pk: primary key to start from
+    :param progress: callable called with (next start pk, rows updated so far) after each chunk
+    :return: number of updated rows
+    """
+    db = queryset.db
+    model = queryset.model
+    # bounds of the whole table are resolved from primary key index without scanning rows
+    bounds = model._base_manager.using(db).aggregate(min_pk=Min('pk'), max_pk=Max('pk'))
+    if bounds['min_pk'] is None:
+        return 0
+    start = bounds['min_pk'] if start_pk is None else max(start_pk, bounds['min_pk'])
+    queryset = queryset.order_by()
+    updated = 0
+    started = time.time()
+    while start <= bounds['max_pk']:
+        end = start + chunk_size
+        with transaction.atomic(using=db):
+            updated += queryset.filter(pk__gte=start, pk__lt=end).update(**values)
+        logger.info('%s: updated %d rows, next pk %d of %d (%.0f rows/s)',
+                    model._meta.label, updated, end, bounds['max_pk'],
+                    updated / max(time.time() - started, 1e-6))
+        if progress:
+            progress(end, updated)
+        start = end
+    return updated
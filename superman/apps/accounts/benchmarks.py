@@ -0,0 +1,179 @@
+import math
+import random
+import time
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import Group, Permission
+from django.contrib.contenttypes.models import ContentType
+from django.db import connections, transaction, DEFAULT_DB_ALIAS
+from django.test.utils import CaptureQueriesContext
+
+from localflavor.generic.validators import IBANValidator
+
+from .cache import invalidate_creators
+from .utils import _existing_usernames, _username_candidates, chunked
+
+
+# seeded users are recognized by their email domain
+BENCH_EMAIL_DOMAIN = 'bench.invalid'
+BENCH_ROOT_USERNAME = 'bench_root'
+BENCH_GROUP_NAME = 'bench administrators'
+BENCH_PASSWORD = 'superman!@#'
+# seeded users are looked up by this many usernames or users per query, below 999 parameters
+# of a statement allowed by SQLite before 3.32 (32766 since)
+FETCH_CHUNK_SIZE = 500
+
+# small pools of names so generated usernames collide like real ones do
+FIRST_NAMES = ['John', 'Jane', 'Michael', 'Maria', 'David', 'Anna', 'James', 'Laura', 'Robert', 'Sarah',
+               'Thomas', 'Julia', 'Daniel', 'Emma', 'Peter', 'Sophie', 'Paul', 'Lena', 'Mark', 'Eva',
+               'Lucas', 'Mia', 'Jonas', 'Nina', 'Felix', 'Clara', 'Max', 'Hannah', 'Ben', 'Lea']
+LAST_NAMES = ['Smith', 'Doe', 'Muller', 'Schmidt', 'Schneider', 'Fischer', 'Weber', 'Meyer', 'Wagner',
+              'Becker', 'Schulz', 'Hoffmann', 'Koch', 'Richter', 'Klein', 'Wolf', 'Brown', 'Garcia']
+
+
+def make_iban(number):
+    """
+    Valid and unique German IBAN for given number
+    """
+    bban = '%018d' % number
+    return 'DE%s%s' % (IBANValidator.iban_checksum('DE00' + bban), bban)
+
+
+class UsernameAllocator(object):
+    """
+    Allocates unique usernames in memory the same way `generate_unique_usernames` does,
+    existing usernames are fetched once
+    """
+    def __init__(self, bases, max_length):
+        self.max_length = max_length
+        self.taken = _existing_usernames(set(bases), max_length)
+        self.next_index = {}
+
+    def allocate(self, base):
+        for i, username in _username_candidates(base, self.max_length, self.next_index.get(base, 0)):
+            if username not in self.taken:
+                break
+        self.next_index[base] = i + 1
+        self.taken.add(username)
+        return username
+
+
+def seed_users(count, batch_size=5000, rng=None, log=None):
+    """
+    Seeds synthetic population of `count` users: a superuser owning resellers (1 per 10k users),
+    who own administrators (1 per 100 users), who own the rest of the users
+    :return: dict with `root` superuser, `resellers` and `admins` lists of users
+    """
+    User = get_user_model()
+    rng = rng or random.Random()
+    log = log or (lambda message: None)
+    max_length = User._meta.get_field(User.USERNAME_FIELD).max_length
+    allocator = UsernameAllocator([name.lower() for name in FIRST_NAMES], max_length)
+    password = make_password(BENCH_PASSWORD)
+    iban_offset = User.objects.filter(email_lower__endswith='@' + BENCH_EMAIL_DOMAIN).count()
+
+    root, created = User.objects.get_or_create(username=BENCH_ROOT_USERNAME, defaults={
+        'is_superuser': True, 'is_staff': True, 'password': password,
+        'email': '%s@%s' % (BENCH_ROOT_USERNAME, BENCH_EMAIL_DOMAIN)})
+
+    def build(number, owner, **kwargs):
+        first_name = rng.choice(FIRST_NAMES)
+        username = allocator.allocate(first_name.lower())
+        email = '%s@%s' % (username, BENCH_EMAIL_DOMAIN)
+        return User(username=username, first_name=first_name, last_name=rng.choice(LAST_NAMES),
+                    email=email, email_lower=email, password=password, iban=make_iban(iban_offset + number),
+                    created_by_id=owner.pk, owner_path=owner.subtree_path, **kwargs)
+
+    def create(users):
+        for batch in chunked(users, batch_size):
+            with transaction.atomic():
+                User.objects.bulk_create(batch)
+            log('seeded %d users' % len(batch))
+
+    def fetch(users):
+        fetched = []
+        for usernames in chunked((u.username for u in users), FETCH_CHUNK_SIZE):
+            fetched.extend(User.objects.filter(username__in=usernames))
+        return sorted(fetched, key=lambda user: user.pk)
+
+    reseller_count = max(1, count // 10000)
+    admin_count = max(1, count // 100)
+    user_count = max(0, count - reseller_count - admin_count)
+
+    resellers = [build(n, root, is_staff=True) for n in range(reseller_count)]
+    create(resellers)
+    resellers = fetch(resellers)
+    admins = [build(reseller_count + n, rng.choice(resellers), is_staff=True) for n in range(admin_count)]
+    create(admins)
+    admins = fetch(admins)
+
+    # administrators can change and delete users they own
+    group, created = Group.objects.get_or_create(name=BENCH_GROUP_NAME)
+    if created:
+        content_type = ContentType.objects.get_for_model(User)
+        group.permissions.add(*Permission.objects.filter(
+            content_type=content_type, codename__in=['add_user', 'change_user', 'delete_user']))
+    Membership = User.groups.through
+    Membership.objects.bulk_create([Membership(user_id=admin.pk, group_id=group.pk)
+                                    for admin in resellers + admins])
+
+    offset = reseller_count + admin_count
+    create(build(offset + n, rng.choice(admins)) for n in range(user_count))
+    invalidate_creators()
+    return {'root': root, 'resellers': resellers, 'admins': admins}
+
+
+def delete_seeded_users():
+    """
+    Deletes seeded users with plain DELETE, they only reference each other
+    """
+    User = get_user_model()
+    queryset = User.objects.filter(email_lower__endswith='@' + BENCH_EMAIL_DOMAIN)
+    with transaction.atomic():
+        User.groups.through.objects.filter(user__in=queryset).delete()
+        User.user_permissions.through.objects.filter(user__in=queryset).delete()
+        User.objects.filter(created_by__in=queryset).exclude(
+            email_lower__endswith='@' + BENCH_EMAIL_DOMAIN).update(created_by=None, owner_path='')
+        count = queryset._raw_delete(queryset.db)
+    Group.objects.filter(name=BENCH_GROUP_NAME).delete()
+    return count
+
+
+def percentile(values, p):
+    """
+    `p` percentile of sorted `values` using nearest rank
+    """
+    if not values:
+        return None
+    return values[max(0, int(math.ceil(p / 100.0 * len(values))) - 1)]
+
+
+def measure(func, iterations, setup=None, using=DEFAULT_DB_ALIAS):
+    """
+    Calls `func(i)` `iterations` times and reports wall time statistics and SQL query count,
+    `setup(i)` is called before each call and is not measured
+    :return: dict of results, times are in milliseconds
+    """
+    connection = connections[using]
+    timings = []
+    queries = 0
+    for i in range(iterations):
+        if setup:
+            setup(i)
+        with CaptureQueriesContext(connection) as context:
+            start = time.time()
+            func(i)
+            timings.append((time.time() - start) * 1000)
+        queries += len(context.captured_queries)
+    timings.sort()
+    return {
+        'iterations': iterations,
+        'total_ms': round(sum(timings), 3),
+        'mean_ms': round(sum(timings) / len(timings), 3) if timings else None,
+        'p50_ms': round(percentile(timings, 50), 3) if timings else None,
+        'p99_ms': round(percentile(timings, 99), 3) if timings else None,
+        'max_ms': round(timings[-1], 3) if timings else None,
+        'queries': queries,
+        'queries_per_iteration': round(queries / float(iterations), 2) if iterations else None,
+    }
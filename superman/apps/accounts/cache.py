@@ -0,0 +1,112 @@
+import time
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core import checks
+from django.core.cache import caches
+from django.db import transaction
+
+from .metrics import record_cache
+
+
+CACHE_ALIAS = 'accounts'
+# cache backends local to a process serve stale creators to other workers
+LOCAL_BACKENDS = ('django.core.cache.backends.locmem.LocMemCache',
+                  'django.core.cache.backends.dummy.DummyCache')
+CREATORS_KEY = 'accounts:creators:%s'
+# rows of about 100 bytes, cached creators stay well below memcached's 1 MB limit of a value
+CREATORS_CACHE_LIMIT = 5000
+# bumping generation invalidates every cached value at once e.g. after queryset `update()`
+GENERATION_KEY = 'accounts:generation'
+
+
+def get_cache():
+    return caches[CACHE_ALIAS]
+
+
+def check_shared_cache(app_configs=None, **kwargs):
+    """
+    Deployment check, invalidation reaches only the cache of the worker which changed a user
+    so production needs a cache shared by all workers
+    """
+    backend = settings.CACHES.get(CACHE_ALIAS, {}).get('BACKEND')
+    if backend not in LOCAL_BACKENDS:
+        return []
+    return [checks.Warning(
+        '"%s" cache uses %s which is local to a process, other workers keep serving creators changed '
+        'or deleted until the cache times out.' % (CACHE_ALIAS, backend),
+        hint='Set ACCOUNTS_CACHE_BACKEND to a shared cache, e.g. memcached.',
+        id='accounts.W001')]
+
+
+def _get_generation(cache):
+    generation = cache.get(GENERATION_KEY)
+    if generation is None:
+        # start from current time so entries of an evicted generation are never reused
+        generation = int(time.time() * 1000)
+        cache.add(GENERATION_KEY, generation, None)
+        generation = cache.get(GENERATION_KEY, generation)
+    return generation
+
+
+def _invalidate(func):
+    """
+    Calls `func` invalidating cache right away and once more when the transaction commits,
+    other workers could cache rows of the previous commit in the meantime
+    """
+    func()
+    if transaction.get_connection().in_atomic_block:
+        transaction.on_commit(func)
+
+
+def invalidate_all():
+    def invalidate():
+        try:
+            get_cache().incr(GENERATION_KEY)
+        except ValueError:
+            # generation is not set yet, so nothing is cached
+            pass
+    _invalidate(invalidate)
+
+
+def creators_queryset():
+    """
+    Users who created at least one other user ordered by username
+    """
+    User = get_user_model()
+    creator_ids = User._default_manager.filter(
+        created_by__isnull=False).order_by().values('created_by').distinct()
+    return User._default_manager.filter(pk__in=creator_ids).order_by(User.USERNAME_FIELD)
+
+
+def creator_rows(queryset):
+    User = queryset.model
+    return queryset.values_list('pk', User.USERNAME_FIELD, 'first_name', 'last_name')
+
+
+def get_creators():
+    """
+    Users who created at least one other user, resolved with a single query and cached
+    until a user is created, deleted or changes their creator or name. At most
+    `CREATORS_CACHE_LIMIT` creators are cached as memcached drops values over 1 MB.
+    :return: list of (id, username, first name, last name) tuples ordered by username, `None`
+        when there are more creators and callers have to query `creators_queryset()` instead
+    """
+    cache = get_cache()
+    key = CREATORS_KEY % _get_generation(cache)
+    creators = cache.get(key)
+    record_cache('creators', int(creators is not None), int(creators is None))
+    if creators is None:
+        creators = list(creator_rows(creators_queryset())[:CREATORS_CACHE_LIMIT + 1])
+        if len(creators) > CREATORS_CACHE_LIMIT:
+            # remembered as well, so creators are not counted on every call
+            creators = False
+        cache.set(key, creators)
+    return creators if creators is not False else None
+
+
+def invalidate_creators():
+    def invalidate():
+        cache = get_cache()
+        cache.delete(CREATORS_KEY % _get_generation(cache))
+    _invalidate(invalidate)
@@ -0,0 +1,161 @@
+import base64
+import json
+
+from django.contrib.admin.options import IncorrectLookupParameters
+from django.contrib.admin.views.main import ChangeList
+from django.core.exceptions import FieldDoesNotExist
+from django.core.paginator import Paginator
+from django.db import connections
+from django.utils.encoding import force_bytes, force_text
+from django.utils.functional import cached_property
+
+
+# query string parameter of keyset pagination cursor
+CURSOR_VAR = 'cursor'
+
+
+def estimate_count(queryset):
+    """
+    Row count of queryset as estimated by PostgreSQL query planner, it's instant no matter
+    how big the table is but not exact
+    :return: estimated count or None if database doesn't support estimation
+    """
+    connection = connections[queryset.db]
+    if connection.vendor != 'postgresql':
+        return None
+    sql, params = queryset.query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute('EXPLAIN (FORMAT JSON) ' + sql, params)
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]['Plan']['Plan Rows'])
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Paginator which avoids `COUNT(*)` on big tables by using query planner estimate,
+    exact count is used for small results and on databases that can't estimate
+    """
+    exact_count_threshold = 10000
+
+    @cached_property
+    def count(self):
+        estimate = estimate_count(self.object_list)
+        if estimate is None or estimate < self.exact_count_threshold:
+            return super(EstimatedCountPaginator, self).count
+        return estimate
+
+
+def encode_cursor(value):
+    return force_text(base64.urlsafe_b64encode(force_bytes(json.dumps([value]))))
+
+
+def decode_cursor(cursor):
+    try:
+        return json.loads(force_text(base64.urlsafe_b64decode(force_bytes(cursor))))[0]
+    except (TypeError, ValueError, IndexError):
+        raise IncorrectLookupParameters('Invalid cursor.')
+
+
+class UserChangeList(ChangeList):
+    """
+    Changelist which only selects displayed columns and optionally paginates with keyset
+    (seek) pagination instead of OFFSET, keyset pagination is used when results are ordered
+    by a unique not null field e.g. username.
+    """
+    def __init__(self, request, *args, **kwargs):
+        self.cursor = request.GET.get(CURSOR_VAR)
+        self.next_cursor = None
+        self.keyset_pagination = False
+        super(UserChangeList, self).__init__(request, *args, **kwargs)
+
+    def get_filters_params(self, params=None):
+        lookup_params = super(UserChangeList, self).get_filters_params(params)
+        lookup_params.pop(CURSOR_VAR, None)
+        return lookup_params
+
+    def get_query_string(self, new_params=None, remove=None):
+        # changing filters or ordering starts from the first page
+        if not new_params or CURSOR_VAR not in new_params:
+            remove = list(remove or []) + [CURSOR_VAR]
+        return super(UserChangeList, self).get_query_string(new_params, remove)
+
+    def get_only_fields(self):
+        """
+        Model fields needed to render changelist, anything else e.g. password is deferred
+        """
+        fields = [self.lookup_opts.pk.name]
+        for name in self.list_display:
+            try:
+                field = self.lookup_opts.get_field(name)
+            except FieldDoesNotExist:
+                continue
+            if not field.concrete:
+                continue
+            fields.append(field.name)
+            if field.is_relation and name in (self.list_select_related or ()):
+                # related objects are displayed using their `__str__`
+                fields.extend('%s__%s' % (name, related_field)
+                              for related_field in getattr(field.related_model, 'STR_FIELDS', ()))
+        return fields
+
+    def get_queryset(self, request):
+        qs = super(UserChangeList, self).get_queryset(request)
+        return qs.only(*self.get_only_fields())
+
+    def get_keyset_field(self):
+        """
+        Field used for keyset pagination or None if current ordering doesn't allow it
+        """
+        ordering = self.queryset.query.order_by
+        if not ordering:
+            return None
+        name = ordering[0]
+        desc = name.startswith('-')
+        name = name.lstrip('-')
+        if name == 'pk':
+            name = self.lookup_opts.pk.name
+        try:
+            field = self.lookup_opts.get_field(name)
+        except FieldDoesNotExist:
+            return None
+        if not field.concrete or not field.unique or field.null:
+            return None
+        return field, desc
+
+    def get_results(self, request):
+        keyset_field = None
+        if self.model_admin.keyset_pagination_enabled(request) and not self.list_editable:
+            keyset_field = self.get_keyset_field()
+        if not keyset_field:
+            return super(UserChangeList, self).get_results(request)
+
+        field, desc = keyset_field
+        paginator = self.model_admin.get_paginator(request, self.queryset, self.list_per_page)
+        qs = self.queryset
+        if self.cursor:
+            lookup = '%s__%s' % (field.name, 'lt' if desc else 'gt')
+            qs = qs.filter(**{lookup: decode_cursor(self.cursor)})
+        # fetch one more row to know if there is a next page
+        result_list = list(qs[:self.list_per_page + 1])
+        if len(result_list) > self.list_per_page:
+            result_list = result_list[:self.list_per_page]
+            self.next_cursor = encode_cursor(field.value_from_object(result_list[-1]))
+
+        self.keyset_pagination = True
+        self.result_count = paginator.count
+        self.show_full_result_count = False
+        self.show_admin_actions = True
+        self.full_result_count = None
+        self.result_list = result_list
+        self.can_show_all = False
+        self.multi_page = bool(self.cursor or self.next_cursor)
+        self.paginator = paginator
+
+    def get_first_page_url(self):
+        return self.get_query_string()
+
+    def get_next_page_url(self):
+        if self.next_cursor:
+            return self.get_query_string({CURSOR_VAR: self.next_cursor})
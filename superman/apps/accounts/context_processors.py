@@ -1,5 +1,63 @@
 from django.conf import settings
+from django.utils.functional import cached_property
+from django.utils.lru_cache import lru_cache
+
+
+# social auth is imported only when its context processors are used, see `SOCIAL_AUTH_ENABLED`
 
 
 def accounts(request):
     return {'SOCIAL_AUTH_ENABLED': settings.SOCIAL_AUTH_ENABLED}
+
+
+@lru_cache()
+def get_backend_names():
+    """
+    Names of social auth backends of `AUTHENTICATION_BACKENDS`, loaded once per process
+    """
+    from social.backends.utils import load_backends
+    return tuple(load_backends(settings.AUTHENTICATION_BACKENDS, force_load=True))
+
+
+class SocialBackends(object):
+    """
+    Same data as `backends` of social auth context processor: all `backends` names, `associated`
+    UserSocialAuth objects of the user and `not_associated` backend names. Nothing is computed until
+    a template uses it, associations are queried once per request.
+    """
+    def __init__(self, request):
+        self.request = request
+
+    def __getitem__(self, key):
+        if key not in ('backends', 'associated', 'not_associated'):
+            raise KeyError(key)
+        return getattr(self, key)
+
+    @cached_property
+    def backends(self):
+        return list(get_backend_names())
+
+    @cached_property
+    def associated(self):
+        user = self.request.user
+        if not user.is_authenticated:
+            return []
+        from social.apps.django_app.utils import Storage
+        return list(Storage.user.get_social_auth_for_user(user))
+
+    @cached_property
+    def not_associated(self):
+        providers = set(association.provider for association in self.associated)
+        return [name for name in self.backends if name not in providers]
+
+
+def backends(request):
+    """
+    Cached replacement of `social.apps.django_app.context_processors.backends`, pages which don't
+    show social login pay nothing but an attribute lookup
+    """
+    try:
+        return {'backends': request._social_backends}
+    except AttributeError:
+        request._social_backends = SocialBackends(request)
+        return {'backends': request._social_backends}
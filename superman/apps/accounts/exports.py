@@ -0,0 +1,81 @@
+from .utils import CSV, JSONL, RowWriter
+
+
+EXPORT_CHUNK_SIZE = 2000
+
+CONTENT_TYPES = {
+    CSV: 'text/csv; charset=utf-8',
+    JSONL: 'application/x-ndjson; charset=utf-8',
+}
+
+
+class _Buffer(object):
+    """
+    File-like object which keeps written data until it's consumed
+    """
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, value):
+        self.chunks.append(value)
+
+    def consume(self):
+        data = ''.join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def get_lookups(queryset, fields):
+    """
+    Maps field names to `values()` lookups, relations are exported by their username or pk
+    """
+    lookups = []
+    for name in fields:
+        field = queryset.model._meta.get_field(name)
+        if field.is_relation:
+            related_model = field.related_model
+            name = '%s__%s' % (name, getattr(related_model, 'USERNAME_FIELD', related_model._meta.pk.name))
+        lookups.append(name)
+    return lookups
+
+
+def iter_chunks(queryset, fields, chunk_size=EXPORT_CHUNK_SIZE):
+    """
+    Reads queryset in chunks of rows using keyset pagination on primary key, so only
+    one chunk is held in memory at a time and no model instances are built
+    :param queryset: queryset to export
+    :param fields: list of model field names
+    :param chunk_size: number of rows fetched per query
+    :return: generator of lists of row dicts
+    """
+    lookups = get_lookups(queryset, fields)
+    queryset = queryset.order_by('pk').values_list('pk', *lookups)
+    last_pk = None
+    while True:
+        qs = queryset
+        if last_pk is not None:
+            qs = qs.filter(pk__gt=last_pk)
+        rows = list(qs[:chunk_size])
+        if not rows:
+            return
+        yield [dict(zip(fields, row[1:])) for row in rows]
+        if len(rows) < chunk_size:
+            return
+        last_pk = rows[-1][0]
+
+
+def stream_rows(queryset, fields, fmt, chunk_size=EXPORT_CHUNK_SIZE):
+    """
+    Serializes queryset to CSV or JSONL lazily, suitable for `StreamingHttpResponse`
+    :return: generator of strings, one per chunk of rows
+    """
+    buf = _Buffer()
+    writer = RowWriter(buf, fmt, fieldnames=fields)
+    writer.writeheader()
+    header = buf.consume()
+    if header:
+        yield header
+    for rows in iter_chunks(queryset, fields, chunk_size):
+        for row in rows:
+            writer.writerow(row)
+        yield buf.consume()
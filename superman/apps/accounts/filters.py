@@ -0,0 +1,112 @@
+from django.contrib import admin
+from django.contrib.admin.options import IncorrectLookupParameters
+from django.core.urlresolvers import reverse
+from django.db.models import Q, Value
+from django.db.models.functions import Concat
+from django.utils.translation import ugettext_lazy as _
+
+from .cache import creator_rows, creators_queryset, get_creators
+
+
+# max number of creators returned by a single search
+CREATORS_SEARCH_LIMIT = 20
+# placeholder of creator id in query string template used by filter search
+CREATOR_PLACEHOLDER = '__creator__'
+
+
+def creator_from_row(model, row):
+    """
+    Unsaved user built from cached (id, username, first name, last name) row, to be displayed
+    """
+    pk, username, first_name, last_name = row
+    return model(pk=pk, username=username, first_name=first_name, last_name=last_name)
+
+
+def find_creator(pk):
+    """
+    Cached creator row of `pk`, queried when there are too many creators to cache
+    :return: (id, username, first name, last name) tuple or `None` for users who created no one
+    """
+    creators = get_creators()
+    if creators is None:
+        return creator_rows(creators_queryset().filter(pk=pk)).first()
+    for row in creators:
+        if row[0] == pk:
+            return row
+    return None
+
+
+def search_creators(model, query, limit=CREATORS_SEARCH_LIMIT):
+    """
+    Cached creators whose username or full name contains `query` (case insensitive), searched
+    by a query when there are too many creators to cache
+    :return: list of dicts with `id`, `username` and `label`
+    """
+    query = query.strip().lower()
+    creators = get_creators()
+    if creators is None:
+        queryset = creators_queryset()
+        if query:
+            queryset = queryset.annotate(name=Concat('first_name', Value(' '), 'last_name')).filter(
+                Q(**{model.USERNAME_FIELD + '__icontains': query}) | Q(name__icontains=query))
+        creators = creator_rows(queryset)[:limit]
+    results = []
+    for row in creators:
+        pk, username, first_name, last_name = row
+        name = '%s %s' % (first_name, last_name)
+        if query and query not in username.lower() and query not in name.lower():
+            continue
+        results.append({'id': pk, 'username': username, 'label': str(creator_from_row(model, row))})
+        if len(results) >= limit:
+            break
+    return results
+
+
+class CreatedByFilter(admin.SimpleListFilter):
+    """
+    Filter by creator which doesn't list every user in the sidebar, only the selected creator
+    is listed and the others are searched lazily from cached creators (see `UserAdmin.creators_view`)
+    """
+    title = _('created by')
+    parameter_name = 'created_by__id__exact'
+    template = 'admin/accounts/user/created_by_filter.html'
+    placeholder = CREATOR_PLACEHOLDER
+
+    def __init__(self, request, params, model, model_admin):
+        super(CreatedByFilter, self).__init__(request, params, model, model_admin)
+        opts = model._meta
+        self.search_url = reverse('%s:%s_%s_creators' % (model_admin.admin_site.name, opts.app_label,
+                                                         opts.model_name))
+        self.query_string_template = ''
+
+    def creator_id(self):
+        value = self.value()
+        if not value:
+            return None
+        try:
+            return int(value)
+        except ValueError:
+            raise IncorrectLookupParameters('Invalid creator "%s".' % value)
+
+    def lookups(self, request, model_admin):
+        creator_id = self.creator_id()
+        if creator_id is None:
+            return []
+        row = find_creator(creator_id)
+        if row is not None:
+            return [(str(creator_id), str(creator_from_row(model_admin.model, row)))]
+        return [(str(creator_id), str(creator_id))]
+
+    def has_output(self):
+        return True
+
+    def queryset(self, request, queryset):
+        creator_id = self.creator_id()
+        if creator_id is not None:
+            return queryset.filter(created_by_id=creator_id)
+        return queryset
+
+    def choices(self, changelist):
+        self.query_string_template = changelist.get_query_string(
+            {self.parameter_name: CREATOR_PLACEHOLDER})
+        return super(CreatedByFilter, self).choices(changelist)
@@ -3,8 +3,12 @@ from django.contrib.auth.forms import (
     UserCreationForm as BaseUserCreationForm,
     UserChangeForm as BaseUserChangeForm)
 from django.contrib.auth import get_user_model
+from django.core.exceptions import ValidationError
 from django.utils.translation import ugettext_lazy as _
 
+from localflavor.generic.validators import IBANValidator
+
+from .iban import BatchIBANValidator
 from .utils import generate_unique_username
 
 
@@ -15,6 +19,10 @@ class BaseUserForm(forms.ModelForm):
         self.fields['last_name'].required = True
 
         self.fields['iban'].label = _('IBAN')
+        # IBAN is validated by `clean_iban` with the batch validator instead
+        iban_field = self.fields['iban']
+        self.iban_validator = BatchIBANValidator.for_field(iban_field)
+        iban_field.validators = [v for v in iban_field.validators if not isinstance(v, IBANValidator)]
         if not self.user.is_superuser:
             # non superuser can't add users without IBAN
             self.fields['iban'].required = True
@@ -29,7 +37,25 @@ class BaseUserForm(forms.ModelForm):
         """
         if IBAN is empty string return None instead
         """
-        return self.cleaned_data.get('iban') or None
+        iban = self.cleaned_data.get('iban') or None
+        if iban:
+            self.iban_validator(iban)
+        return iban
+
+    def _get_validation_exclusions(self):
+        exclude = super(BaseUserForm, self)._get_validation_exclusions()
+        # IBAN passed `clean_iban`, model validation would run localflavor's validator once more
+        if 'iban' in self.cleaned_data:
+            exclude.append('iban')
+        return exclude
+
+    def validate_unique(self):
+        # IBAN excluded from model validation must still be unique
+        exclude = [name for name in self._get_validation_exclusions() if name != 'iban']
+        try:
+            self.instance.validate_unique(exclude=exclude)
+        except ValidationError as e:
+            self._update_errors(e)
 
 
 class UserCreationForm(BaseUserCreationForm, BaseUserForm):
@@ -64,9 +90,45 @@ class UserChangeForm(BaseUserChangeForm, BaseUserForm):
         email = self.cleaned_data.get('email')
         if email:
             if not self.old_email or self.old_email.lower() != email.lower():
-                if get_user_model().objects.filter(email__iexact=email).exists():
+                if get_user_model().objects.filter(email_lower=email.lower()).exists():
                     raise forms.ValidationError(_('User with this email already exists.'))
         return email
 
     class Meta(BaseUserChangeForm.Meta):
         model = get_user_model()
+
+
+class UserImportForm(BaseUserForm):
+    """
+    Validates a single imported row with the same rules as admin forms. Uniqueness is not
+    checked per row, importer checks it once for a whole batch of rows.
+    """
+    def __init__(self, *args, **kwargs):
+        self.user = kwargs.pop('user')
+        super(UserImportForm, self).__init__(*args, **kwargs)
+
+    def validate_unique(self):
+        pass
+
+    class Meta:
+        model = get_user_model()
+        fields = ('first_name', 'last_name', 'iban')
+
+
+class ReassignForm(forms.Form):
+    """
+    Picks the new creator of users selected in the admin changelist
+    """
+    created_by = forms.CharField(label=_('New owner'), required=False,
+                                 help_text=_('Username of the user who will own selected users, '
+                                             'leave empty to remove their owner.'))
+
+    def clean_created_by(self):
+        username = self.cleaned_data.get('created_by')
+        if not username:
+            return None
+        User = get_user_model()
+        try:
+            return User.objects.get(**{User.USERNAME_FIELD: username})
+        except User.DoesNotExist:
+            raise forms.ValidationError(_('User does not exist.'))
@@ -0,0 +1,122 @@
+import re
+import string
+
+from django.core.exceptions import ValidationError
+from django.utils.translation import ugettext_lazy as _
+
+from localflavor.generic.validators import IBANValidator
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+# letters of IBAN are replaced by two digits, A = 10, B = 11, ..., Z = 35
+LETTER_DIGITS = dict((ord(letter), str(ord(letter) - 55)) for letter in string.ascii_uppercase)
+INVALID_CHARACTER_RE = re.compile('[^0-9A-Z]')
+# below this many IBANs plain python big integers are faster than setting up arrays
+NUMPY_MIN_BATCH = 256
+
+
+def normalize_iban(value):
+    """
+    Normalizes IBAN the same way `IBANField` does
+    """
+    if value is None:
+        return None
+    return value.upper().replace(' ', '').replace('-', '')
+
+
+def _mod97(values):
+    """
+    Remainders of division by 97 of rearranged IBANs (digits and uppercase letters only)
+    """
+    if numpy is None or len(values) < NUMPY_MIN_BATCH:
+        return [int(value.translate(LETTER_DIGITS)) % 97 for value in values]
+
+    # IBANs are left padded with zeros to the same width, leading zeros don't change the remainder
+    width = max(len(value) for value in values)
+    data = numpy.frombuffer(''.join(value.rjust(width, '0') for value in values).encode('ascii'),
+                            dtype=numpy.uint8).reshape(len(values), width)
+    letters = data >= ord('A')
+    digits = numpy.where(letters, data - 55, data - ord('0')).astype(numpy.int64)
+    remainders = numpy.zeros(len(values), dtype=numpy.int64)
+    # Horner's scheme column by column, letters take two decimal places
+    for column in range(width):
+        remainders = numpy.where(letters[:, column], remainders * 100, remainders * 10)
+        remainders = (remainders + digits[:, column]) % 97
+    return remainders.tolist()
+
+
+class BatchIBANValidator(object):
+    """
+    Validates whole lists of IBANs with the same rules and messages as `IBANValidator` of
+    `IBANField`, checksums are computed at once (vectorized with NumPy when installed).
+    Instance is also a drop-in replacement of `IBANValidator` for single values.
+    """
+    def __init__(self, use_nordea_extensions=False, include_countries=None):
+        # country tables and configuration checks are shared with `IBANValidator`
+        validator = IBANValidator(use_nordea_extensions, include_countries)
+        self.use_nordea_extensions = validator.use_nordea_extensions
+        self.include_countries = validator.include_countries
+        self.validation_countries = validator.validation_countries
+
+    @classmethod
+    def for_field(cls, field):
+        """
+        Validator with the configuration of given `IBANField` (model or form field)
+        """
+        for validator in field.validators:
+            if isinstance(validator, IBANValidator):
+                return cls(validator.use_nordea_extensions, validator.include_countries)
+        return cls(field.use_nordea_extensions, field.include_countries)
+
+    def __call__(self, value):
+        error = self.validate([value])[0]
+        if error is not None:
+            raise error
+
+    def validate(self, values):
+        """
+        :param values: list of IBANs, normalized or not, `None` is valid
+        :return: list of `ValidationError` or `None` for valid IBANs in the same order
+        """
+        errors = [None] * len(values)
+        checked = []
+        # hot loop, attributes are looked up once
+        lengths = self.validation_countries
+        include_countries = self.include_countries
+        find_invalid = INVALID_CHARACTER_RE.search
+        for i, value in enumerate(values):
+            if value is None:
+                continue
+            value = value.upper().replace(' ', '').replace('-', '')
+            country_code = value[:2]
+            length = lengths.get(country_code)
+            if length is None:
+                errors[i] = ValidationError(_('%s is not a valid country code for IBAN.') % country_code)
+            elif length != len(value):
+                errors[i] = ValidationError(_('%(country_code)s IBANs must contain %(number)s characters.') % {
+                    'country_code': country_code, 'number': length})
+            elif include_countries and country_code not in include_countries:
+                errors[i] = ValidationError(_('%s IBANs are not allowed in this field.') % country_code)
+            else:
+                rearranged = value[4:] + country_code + '00'
+                invalid = find_invalid(rearranged)
+                if invalid:
+                    errors[i] = ValidationError(_('%s is not a valid character for IBAN.') % invalid.group())
+                else:
+                    checked.append((i, value[2:4], rearranged))
+
+        remainders = _mod97([rearranged for i, check_digits, rearranged in checked])
+        for (i, check_digits, rearranged), remainder in zip(checked, remainders):
+            if '%02d' % (98 - remainder) != check_digits:
+                errors[i] = ValidationError(_('Not a valid IBAN.'))
+        return errors
+
+    def is_valid(self, values):
+        """
+        :return: list of booleans in the same order as `values`
+        """
+        return [error is None for error in self.validate(values)]
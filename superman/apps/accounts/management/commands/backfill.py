@@ -0,0 +1,58 @@
+import json
+
+from django.apps import apps
+from django.core.exceptions import FieldDoesNotExist, FieldError, ValidationError
+from django.core.management.base import BaseCommand, CommandError
+
+from ...backfill import DEFAULT_CHUNK_SIZE, batched_update
+
+
+class Command(BaseCommand):
+    help = ('Updates rows of a model in primary key chunks, e.g. '
+            '`backfill accounts.User --filter \'{"iban": ""}\' --set \'{"iban": null}\'`')
+
+    def add_arguments(self, parser):
+        parser.add_argument('model', help='Model to update as app_label.ModelName')
+        parser.add_argument('--set', dest='values', default=None,
+                            help='JSON object of fields and values to set')
+        parser.add_argument('--filter', dest='filters', default='{}',
+                            help='JSON object of lookups selecting rows to update')
+        parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE,
+                            help='Size of primary key range updated in a single transaction')
+        parser.add_argument('--start-pk', type=int, default=None,
+                            help='Primary key to start from, to resume interrupted backfill')
+
+    def handle(self, *args, **options):
+        try:
+            model = apps.get_model(options['model'])
+        except (LookupError, ValueError) as e:
+            raise CommandError(str(e))
+        if options['chunk_size'] < 1:
+            raise CommandError('--chunk-size must be a positive number.')
+        values = self.load_json('--set', options['values'])
+        filters = self.load_json('--filter', options['filters'])
+        if not values:
+            raise CommandError('--set is required.')
+
+        def progress(next_pk, updated):
+            self.stdout.write('%d rows updated, resume with --start-pk=%d' % (updated, next_pk))
+
+        try:
+            queryset = model._default_manager.filter(**filters)
+            updated = batched_update(queryset, values, chunk_size=options['chunk_size'],
+                                     start_pk=options['start_pk'],
+                                     progress=progress if options['verbosity'] >= 1 else None)
+        except (FieldDoesNotExist, FieldError, ValidationError, ValueError) as e:
+            raise CommandError('Backfill failed: %s' % e)
+        self.stdout.write(self.style.SUCCESS('Updated %d rows.' % updated))
+
+    def load_json(self, name, value):
+        if value is None:
+            return {}
+        try:
+            data = json.loads(value)
+        except ValueError:
+            raise CommandError('%s must be a JSON object.' % name)
+        if not isinstance(data, dict):
+            raise CommandError('%s must be a JSON object.' % name)
+        return data
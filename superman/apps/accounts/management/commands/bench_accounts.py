@@ -0,0 +1,218 @@
+import io
+import json
+import platform
+import random
+
+import django
+from django.conf import settings
+from django.contrib import admin
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.core.urlresolvers import reverse
+from django.db import connection, transaction
+from django.forms import MultiWidget
+from django.http import HttpRequest
+from django.test import Client
+
+from ...benchmarks import (
+    BENCH_EMAIL_DOMAIN, BENCH_GROUP_NAME, BENCH_PASSWORD, BENCH_ROOT_USERNAME, FETCH_CHUNK_SIZE, FIRST_NAMES,
+    LAST_NAMES, delete_seeded_users, make_iban, measure, seed_users)
+from ...iban import BatchIBANValidator
+from ...pipeline import load_user
+from ...utils import chunked, generate_unique_username
+
+
+def form_data(form):
+    """
+    POST data of unbound `form` as it would be submitted by the browser
+    """
+    data = {}
+    for bound_field in form:
+        value = bound_field.value()
+        widget = bound_field.field.widget
+        if isinstance(widget, MultiWidget):
+            for i, part in enumerate(widget.decompress(value)):
+                data['%s_%d' % (bound_field.html_name, i)] = part
+        elif value is not None and value is not False:
+            data[bound_field.html_name] = value
+    return data
+
+
+class Command(BaseCommand):
+    help = ('Seeds a synthetic population of users and measures hot paths of accounts app, '
+            'reports wall time, p50/p99 and SQL query counts as JSON')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=10000,
+                            help='Number of users to seed')
+        parser.add_argument('--iterations', type=int, default=100,
+                            help='Number of measured calls of each benchmark')
+        parser.add_argument('--iban-count', type=int, default=10000,
+                            help='Number of IBANs validated by a single call of IBAN benchmarks')
+        parser.add_argument('--batch-size', type=int, default=5000,
+                            help='Number of users created by a single INSERT while seeding')
+        parser.add_argument('--seed', type=int, default=0,
+                            help='Random seed, same seed gives the same population and calls')
+        parser.add_argument('--skip-seed', action='store_true', default=False,
+                            help='Reuse population seeded by a previous run')
+        parser.add_argument('--reset', action='store_true', default=False,
+                            help='Delete previously seeded users before seeding')
+        parser.add_argument('--output', default='-',
+                            help='File to write JSON report to, stdout by default')
+
+    def handle(self, *args, **options):
+        for name in ('users', 'iterations', 'batch_size', 'iban_count'):
+            if options[name] < 1:
+                raise CommandError('--%s must be a positive number.' % name.replace('_', '-'))
+        self.rng = random.Random(options['seed'])
+        self.iterations = options['iterations']
+        self.verbosity = options['verbosity']
+
+        if options['reset']:
+            self.log('deleted %d seeded users' % delete_seeded_users())
+        if options['skip_seed']:
+            population = self.load_population()
+        else:
+            population = seed_users(options['users'], batch_size=options['batch_size'],
+                                    rng=self.rng, log=self.log)
+        User = get_user_model()
+        seeded = User.objects.filter(email_lower__endswith='@' + BENCH_EMAIL_DOMAIN)
+
+        root = population['root']
+        # scoped administrator and one of the users owned by them
+        target = None
+        for admins in chunked(population['admins'], FETCH_CHUNK_SIZE):
+            target = seeded.filter(created_by__in=admins).select_related('created_by').first()
+            if target is not None:
+                break
+        if target is None:
+            raise CommandError('Seeded population has no users owned by administrators.')
+        scoped_admin = target.created_by
+        emails = list(seeded.exclude(pk=root.pk).values_list('email', flat=True)[:1000])
+
+        benchmarks = [
+            ('generate_unique_username', self.bench_generate_unique_username()),
+            ('iban_validation_per_value', self.bench_iban_validation(options['iban_count'], batch=False)),
+            ('iban_validation_batch', self.bench_iban_validation(options['iban_count'], batch=True)),
+            ('user_creation_form', self.bench_creation_form(scoped_admin)),
+            ('user_change_form', self.bench_change_form(scoped_admin, target)),
+            ('load_user', self.bench_load_user(emails)),
+            ('changelist_superuser', self.bench_view(root, reverse('admin:accounts_user_changelist'))),
+            ('changelist_scoped_admin', self.bench_view(
+                scoped_admin, reverse('admin:accounts_user_changelist'))),
+            ('changelist_search_superuser', self.bench_view(
+                root, '%s?q=%s' % (reverse('admin:accounts_user_changelist'), target.last_name[:4]))),
+            ('changelist_search_scoped_admin', self.bench_view(
+                scoped_admin, '%s?q=%s' % (reverse('admin:accounts_user_changelist'), target.last_name[:4]))),
+            ('change_view_superuser', self.bench_view(
+                root, reverse('admin:accounts_user_change', args=(target.pk,)))),
+            ('change_view_scoped_admin', self.bench_view(
+                scoped_admin, reverse('admin:accounts_user_change', args=(target.pk,)))),
+        ]
+        results = {}
+        for name, (func, setup) in benchmarks:
+            self.log('running %s' % name)
+            results[name] = measure(func, self.iterations, setup=setup)
+
+        report = json.dumps({
+            'users': seeded.count(),
+            'database': connection.vendor,
+            'django': django.get_version(),
+            'python': platform.python_version(),
+            'results': results,
+        }, indent=2, sort_keys=True)
+        if options['output'] == '-':
+            self.stdout.write(report)
+        else:
+            with io.open(options['output'], 'w', encoding='utf-8') as fp:
+                fp.write(report)
+
+    def log(self, message):
+        if self.verbosity >= 2:
+            self.stderr.write(message)
+
+    def load_population(self):
+        User = get_user_model()
+        try:
+            root = User.objects.get(username=BENCH_ROOT_USERNAME)
+        except User.DoesNotExist:
+            raise CommandError('No seeded population found, run without --skip-seed first.')
+        admins = list(User.objects.filter(groups__name=BENCH_GROUP_NAME,
+                                          email_lower__endswith='@' + BENCH_EMAIL_DOMAIN))
+        return {'root': root, 'admins': admins}
+
+    def request(self, user):
+        request = HttpRequest()
+        request.user = user
+        return request
+
+    def bench_generate_unique_username(self):
+        def func(i):
+            generate_unique_username([self.rng.choice(FIRST_NAMES), self.rng.choice(LAST_NAMES)])
+        return func, None
+
+    def bench_iban_validation(self, count, batch):
+        """
+        Validation of `count` IBANs one by one with `IBANField` validators or with the batch validator
+        """
+        field = get_user_model()._meta.get_field('iban')
+        ibans = [make_iban(self.rng.randint(0, 10 ** 15)) for i in range(count)]
+        if batch:
+            validator = BatchIBANValidator.for_field(field)
+
+            def func(i):
+                validator.validate(ibans)
+        else:
+            def func(i):
+                for iban in ibans:
+                    field.run_validators(iban)
+        return func, None
+
+    def bench_creation_form(self, user):
+        form_class = admin.site._registry[get_user_model()].get_form(self.request(user))
+
+        def func(i):
+            form = form_class(data={
+                'first_name': self.rng.choice(FIRST_NAMES), 'last_name': self.rng.choice(LAST_NAMES),
+                'iban': make_iban(10 ** 15 + i), 'password1': BENCH_PASSWORD, 'password2': BENCH_PASSWORD})
+            # nothing is left behind, changes are rolled back
+            with transaction.atomic():
+                if not form.is_valid():
+                    raise CommandError('User creation form is invalid: %s' % form.errors.as_json())
+                form.save(commit=True)
+                transaction.set_rollback(True)
+        return func, None
+
+    def bench_change_form(self, user, obj):
+        form_class = admin.site._registry[get_user_model()].get_form(self.request(user), obj)
+        data = form_data(form_class(instance=obj))
+        first_name = obj.first_name
+
+        def func(i):
+            form = form_class(instance=obj, data=dict(data, first_name='%s%d' % (first_name, i)))
+            with transaction.atomic():
+                if not form.is_valid():
+                    raise CommandError('User change form is invalid: %s' % form.errors.as_json())
+                form.save(commit=True)
+                transaction.set_rollback(True)
+        return func, None
+
+    def bench_load_user(self, emails):
+        responses = [{'emails': [{'type': 'account', 'value': email}]} for email in emails]
+
+        def func(i):
+            load_user(response=responses[i % len(responses)])
+        return func, None
+
+    def bench_view(self, user, url):
+        kwargs = {}
+        if '*' not in settings.ALLOWED_HOSTS and settings.ALLOWED_HOSTS:
+            kwargs['HTTP_HOST'] = settings.ALLOWED_HOSTS[0].lstrip('.')
+        client = Client(**kwargs)
+        client.force_login(user)
+
+        def func(i):
+            response = client.get(url)
+            if response.status_code != 200:
+                raise CommandError('GET %s returned %d.' % (url, response.status_code))
+        return func, None
@@ -0,0 +1,100 @@
+import argparse
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+
+import django
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.core.urlresolvers import reverse
+
+from ...benchmarks import measure, percentile
+
+
+class Command(BaseCommand):
+    help = ('Measures start up time of a worker and time of anonymous requests with social login '
+            'enabled and disabled, every run is a fresh process, reports JSON')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--runs', type=int, default=5,
+                            help='Number of processes started for each configuration')
+        parser.add_argument('--requests', type=int, default=200,
+                            help='Number of measured requests in every process')
+        parser.add_argument('--output', default='-',
+                            help='File to write JSON report to, stdout by default')
+        # measured child process, reports its own results
+        parser.add_argument('--probe', action='store_true', default=False, help=argparse.SUPPRESS)
+        parser.add_argument('--started', type=float, default=None, help=argparse.SUPPRESS)
+
+    def handle(self, *args, **options):
+        for name in ('runs', 'requests'):
+            if options[name] < 1:
+                raise CommandError('--%s must be a positive number.' % name)
+        if options['probe']:
+            return self.probe(options['started'], options['requests'])
+
+        results = {}
+        for enabled in (True, False):
+            probes = [self.run_probe(enabled, options['requests']) for i in range(options['runs'])]
+            startup = sorted(probe['startup_ms'] for probe in probes)
+            p50 = sorted(probe['request']['p50_ms'] for probe in probes)
+            results['social_auth_enabled' if enabled else 'social_auth_disabled'] = {
+                'runs': len(probes),
+                'startup_p50_ms': percentile(startup, 50),
+                'startup_max_ms': startup[-1],
+                'modules': probes[0]['modules'],
+                'social_modules': probes[0]['social_modules'],
+                'request_p50_ms': percentile(p50, 50),
+                'request_p99_ms': max(probe['request']['p99_ms'] for probe in probes),
+            }
+
+        report = json.dumps({
+            'requests': options['requests'],
+            'django': django.get_version(),
+            'python': platform.python_version(),
+            'results': results,
+        }, indent=2, sort_keys=True)
+        if options['output'] == '-':
+            self.stdout.write(report)
+        else:
+            with io.open(options['output'], 'w', encoding='utf-8') as fp:
+                fp.write(report)
+
+    def run_probe(self, social_auth_enabled, requests):
+        env = dict(os.environ, SOCIAL_AUTH_ENABLED=str(social_auth_enabled),
+                   DJANGO_SETTINGS_MODULE=os.environ.get('DJANGO_SETTINGS_MODULE', 'superman.settings'))
+        command = [sys.executable, os.path.join(settings.BASE_DIR, 'manage.py'), 'bench_startup', '--probe',
+                   '--requests=%d' % requests, '--started=%r' % time.time()]
+        try:
+            output = subprocess.check_output(command, env=env, cwd=settings.BASE_DIR)
+        except subprocess.CalledProcessError as e:
+            raise CommandError('Probe with SOCIAL_AUTH_ENABLED=%s failed with exit code %d.' % (
+                social_auth_enabled, e.returncode))
+        return json.loads(output.decode('utf-8'))
+
+    def probe(self, started, requests):
+        from django.core.wsgi import get_wsgi_application
+        from django.test import Client
+
+        # interpreter, settings, apps and middleware of the first request are loaded by now
+        get_wsgi_application()
+        startup = (time.time() - started) * 1000 if started else None
+        modules = list(sys.modules)
+        client = Client()
+        url = reverse('admin:login')
+
+        def func(i):
+            response = client.get(url)
+            if response.status_code != 200:
+                raise CommandError('GET %s returned %d.' % (url, response.status_code))
+        self.stdout.write(json.dumps({
+            'social_auth_enabled': settings.SOCIAL_AUTH_ENABLED,
+            'startup_ms': round(startup, 3) if startup is not None else None,
+            'modules': len(modules),
+            'social_modules': len([name for name in modules if name.split('.')[0] == 'social']),
+            'request': measure(func, requests),
+        }))
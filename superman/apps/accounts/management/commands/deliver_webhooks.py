@@ -0,0 +1,51 @@
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.utils import timezone
+
+from ...outbox import WebhookSender, purge_messages
+
+
+class Command(BaseCommand):
+    help = ('Delivers user events waiting in the outbox to `WEBHOOK_URLS`, drains due events once '
+            'or keeps polling with --interval')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Number of outbox messages read per query')
+        parser.add_argument('--events-per-request', type=int, default=None,
+                            help='Events sent in a single request, WEBHOOK_EVENTS_PER_REQUEST by default')
+        parser.add_argument('--concurrency', type=int, default=None,
+                            help='Concurrent requests per endpoint, WEBHOOK_CONCURRENCY by default')
+        parser.add_argument('--interval', type=float, default=None,
+                            help='Seconds to wait between polls, the outbox is drained just once without it')
+        parser.add_argument('--purge-after', type=float, default=None,
+                            help='Days to keep delivered and given up messages, kept forever without it')
+
+    def handle(self, *args, **options):
+        for name in ('batch_size', 'events_per_request', 'concurrency'):
+            if options[name] is not None and options[name] < 1:
+                raise CommandError('--%s must be a positive number.' % name.replace('_', '-'))
+        for name in ('interval', 'purge_after'):
+            if options[name] is not None and options[name] <= 0:
+                raise CommandError('--%s must be a positive number.' % name.replace('_', '-'))
+
+        with WebhookSender(batch_size=options['batch_size'], events_per_request=options['events_per_request'],
+                           concurrency=options['concurrency']) as sender:
+            while True:
+                sent = sender.drain()
+                if options['verbosity'] >= 1 and (sent or options['interval'] is None):
+                    self.stderr.write('%d messages sent, %d delivered and %d failed so far' % (
+                        sent, sender.delivered, sender.failed))
+                if options['purge_after'] is not None:
+                    purged = purge_messages(timezone.now() - timedelta(days=options['purge_after']),
+                                            options['batch_size'])
+                    if purged and options['verbosity'] >= 1:
+                        self.stderr.write('%d old messages purged' % purged)
+                if options['interval'] is None:
+                    return
+                # connection is not held open while idle
+                connection.close()
+                time.sleep(options['interval'])
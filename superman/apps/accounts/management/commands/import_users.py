@@ -0,0 +1,178 @@
+import io
+import sys
+import time
+
+from django.contrib.auth import get_user_model, password_validation
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.encoding import force_text
+from django.utils.translation import ugettext as _
+
+from ...forms import UserImportForm
+from ...passwords import HashingPool, bulk_create_users
+from ...utils import (
+    CSV, FORMATS, RowWriter, chunked, generate_unique_usernames, guess_format, iter_rows)
+
+
+# columns never written to the rejected file
+SECRET_COLUMNS = {'password'}
+# columns of the rejected file, in CSV other columns of the input are left out
+REJECTED_COLUMNS = ('line', 'first_name', 'last_name', 'iban', 'errors')
+
+
+class Command(BaseCommand):
+    help = ('Imports users from a CSV or JSONL file with `first_name`, `last_name`, `iban` '
+            'and optional `password` columns')
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='File to import, use "-" to read from stdin')
+        parser.add_argument('--format', choices=FORMATS, default=None,
+                            help='Input format, guessed from file extension by default')
+        parser.add_argument('--created-by', default=None,
+                            help='Username of the administrator who owns imported users')
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Number of rows validated and created in a single transaction')
+        parser.add_argument('--rejected', default=None,
+                            help='File to write rejected rows to along with their errors')
+        parser.add_argument('--processes', type=int, default=None,
+                            help='Number of processes hashing passwords, number of CPUs by default')
+
+    def handle(self, *args, **options):
+        User = get_user_model()
+        path = options['path']
+        fmt = options['format'] or guess_format(path)
+        batch_size = options['batch_size']
+        if batch_size < 1:
+            raise CommandError('--batch-size must be a positive number.')
+        if options['processes'] is not None and options['processes'] < 1:
+            raise CommandError('--processes must be a positive number.')
+        if not options['created_by']:
+            raise CommandError('--created-by is required.')
+        try:
+            created_by = User.objects.get(**{User.USERNAME_FIELD: options['created_by']})
+        except User.DoesNotExist:
+            raise CommandError('User "%s" does not exist.' % options['created_by'])
+
+        if path == '-':
+            fp = sys.stdin
+        else:
+            fp = io.open(path, encoding='utf-8', newline='')
+        rejected_fp = None
+        rejected_writer = None
+        if options['rejected']:
+            rejected_fp = io.open(options['rejected'], 'w', encoding='utf-8', newline='')
+            rejected_writer = RowWriter(rejected_fp, fmt, fieldnames=REJECTED_COLUMNS)
+
+        processed = created = rejected = 0
+        start = time.time()
+        pool = HashingPool(processes=options['processes'])
+        try:
+            for batch in chunked(iter_rows(fp, fmt), batch_size):
+                users, errors = self.import_batch(batch, created_by, pool=pool)
+                processed += len(batch)
+                created += len(users)
+                rejected += len(errors)
+                if rejected_writer:
+                    for line, row, row_errors in errors:
+                        rejected_writer.writerow(self.rejected_row(fmt, line, row, row_errors))
+                if options['verbosity'] >= 1:
+                    self.stdout.write('%d rows processed, %d created, %d rejected (%.0f rows/s)' % (
+                        processed, created, rejected, processed / max(time.time() - start, 1e-6)))
+        finally:
+            pool.close()
+            if fp is not sys.stdin:
+                fp.close()
+            if rejected_fp:
+                rejected_fp.close()
+
+        elapsed = time.time() - start
+        self.stdout.write(self.style.SUCCESS(
+            'Imported %d users, rejected %d rows in %.2fs (%.0f rows/s)' % (
+                created, rejected, elapsed, processed / max(elapsed, 1e-6))))
+        if pool.hashed and options['verbosity'] >= 1:
+            self.stdout.write('Hashed %d passwords with %d processes (%.0f passwords/s)' % (
+                pool.hashed, pool.processes, pool.throughput))
+
+    def import_batch(self, batch, created_by, pool=None):
+        """
+        Validates and creates users of a single batch of rows in one transaction
+        :param batch: list of (line number, row dict) tuples
+        :param created_by: accounts.User object who owns imported users
+        :param pool: `HashingPool` hashing passwords of the batch, in this process by default
+        :return: tuple of created users and list of (line number, row, errors) of rejected rows
+        """
+        users = []
+        errors = []
+        for line, row in batch:
+            if row is None:
+                errors.append((line, row, {'__all__': [_('Malformed row.')]}))
+                continue
+            form = UserImportForm(row, user=created_by)
+            if not form.is_valid():
+                errors.append((line, row, form.errors))
+                continue
+            user = form.save(commit=False)
+            password = row.get('password') or None
+            if password is not None:
+                try:
+                    password_validation.validate_password(password, user)
+                except ValidationError as e:
+                    errors.append((line, row, {'password': e.messages}))
+                    continue
+            users.append((line, row, user, password))
+        # rows with taken IBANs are rejected before their passwords are hashed
+        users = self.reject_taken_ibans(users, errors)
+
+        def prepare(hashed_users):
+            # `hashed_users` are users of the batch with their passwords set, IBANs taken by users
+            # created since the check above are rejected as well
+            valid = [user for line, row, user, password in self.reject_taken_ibans(users, errors)]
+            usernames = generate_unique_usernames([(user.first_name, user.last_name) for user in valid])
+            for user, username in zip(valid, usernames):
+                user.username = username
+                user.created_by = created_by
+            return valid
+
+        # hashing is CPU bound, done in parallel and outside of the transaction
+        stats = bulk_create_users([user for line, row, user, password in users],
+                                  [password for line, row, user, password in users],
+                                  pool=pool, prepare=prepare)
+        errors.sort(key=lambda error: error[0])
+        return stats['users'], errors
+
+    def reject_taken_ibans(self, users, errors):
+        """
+        IBAN must be unique among existing users and within the batch, rows of taken IBANs are
+        added to `errors`
+        :param users: list of (line number, row, user, password) tuples
+        :return: list of `users` whose IBANs are not taken
+        """
+        ibans = [user.iban for line, row, user, password in users if user.iban]
+        taken = set()
+        if ibans:
+            taken = set(get_user_model().objects.filter(iban__in=ibans).values_list('iban', flat=True))
+        valid = []
+        for line, row, user, password in users:
+            if user.iban:
+                if user.iban in taken:
+                    errors.append((line, row, {'iban': [_('User with this IBAN already exists.')]}))
+                    continue
+                taken.add(user.iban)
+            valid.append((line, row, user, password))
+        return valid
+
+    def rejected_row(self, fmt, line, row, errors):
+        """
+        Rejected row as it was read from input without secret columns and with additional `line`
+        and `errors` columns
+        """
+        errors = sorted((field, [force_text(e) for e in field_errors])
+                        for field, field_errors in errors.items())
+        data = dict((key, value) for key, value in (row or {}).items() if key not in SECRET_COLUMNS)
+        data['line'] = line
+        if fmt == CSV:
+            data['errors'] = '; '.join('%s: %s' % (field, ' '.join(field_errors))
+                                       for field, field_errors in errors)
+        else:
+            data['errors'] = dict(errors)
+        return data
@@ -0,0 +1,80 @@
+import io
+import sys
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from ...reconciliation import INVALID, MATCHED, RECONCILE_CHUNK_SIZE, UNMATCHED, get_scope, reconcile_ibans
+from ...utils import CSV, FORMATS, RowWriter, chunked, guess_format, iter_rows
+
+
+RESULT_FIELDS = ['iban_normalized', 'status', 'user_id', 'username', 'error']
+
+
+class Command(BaseCommand):
+    help = ('Matches IBANs of a CSV or JSONL file (e.g. a bank statement) against users visible to '
+            'the given administrator, every row is written out with its status and matched user')
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='File with IBANs, use "-" to read from stdin')
+        parser.add_argument('--user', default=None,
+                            help='Username of the administrator whose users are matched')
+        parser.add_argument('--format', choices=FORMATS, default=None,
+                            help='Input and output format, guessed from file extension by default')
+        parser.add_argument('--column', default='iban',
+                            help='Column (or JSONL key) with IBANs')
+        parser.add_argument('--output', default='-',
+                            help='File to write results to, stdout by default')
+        parser.add_argument('--chunk-size', type=int, default=RECONCILE_CHUNK_SIZE,
+                            help='Number of IBANs resolved per query')
+
+    def handle(self, *args, **options):
+        User = get_user_model()
+        path = options['path']
+        fmt = options['format'] or guess_format(path)
+        column = options['column']
+        chunk_size = options['chunk_size']
+        if chunk_size < 1:
+            raise CommandError('--chunk-size must be a positive number.')
+        if not options['user']:
+            raise CommandError('--user is required.')
+        try:
+            user = User.objects.get(**{User.USERNAME_FIELD: options['user']})
+        except User.DoesNotExist:
+            raise CommandError('User "%s" does not exist.' % options['user'])
+
+        queryset = get_scope(user)
+        counts = {MATCHED: 0, UNMATCHED: 0, INVALID: 0}
+        start = time.time()
+        fp = sys.stdin if path == '-' else io.open(path, encoding='utf-8', newline='')
+        output = options['output']
+        output_fp = self.stdout if output == '-' else io.open(output, 'w', encoding='utf-8', newline='')
+        try:
+            writer = None
+            for chunk in chunked(iter_rows(fp, fmt), chunk_size):
+                rows = [row or {} for line, row in chunk]
+                if writer is None:
+                    fieldnames = None
+                    if fmt == CSV:
+                        header = next((row for row in rows if row), {})
+                        fieldnames = [name for name in header if name not in RESULT_FIELDS] + RESULT_FIELDS
+                    writer = RowWriter(output_fp, fmt, fieldnames)
+                ibans = [row.get(column) or None for row in rows]
+                for row, result in zip(rows, reconcile_ibans(ibans, queryset, chunk_size)):
+                    counts[result.status] += 1
+                    row = dict(row, iban_normalized=result.normalized, status=result.status,
+                               user_id=result.user and result.user.pk,
+                               username=result.user and result.user.get_username(), error=result.error)
+                    writer.writerow(row)
+        finally:
+            if fp is not sys.stdin:
+                fp.close()
+            if output_fp is not self.stdout:
+                output_fp.close()
+
+        if options['verbosity'] >= 1:
+            total = sum(counts.values())
+            self.stderr.write('%d IBANs reconciled, %d matched, %d unmatched, %d invalid (%.0f IBANs/s)' % (
+                total, counts[MATCHED], counts[UNMATCHED], counts[INVALID],
+                total / max(time.time() - start, 1e-6)))
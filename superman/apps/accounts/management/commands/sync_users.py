@@ -0,0 +1,86 @@
+import io
+import os
+
+from django.contrib import admin
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.http import HttpRequest
+
+from ...api import API_FIELDS
+from ...sync import SYNC_BATCH_SIZE, InvalidCursor, iter_changes, scoped_tombstones
+from ...utils import FORMATS, JSONL, RowWriter, guess_format
+
+
+class Command(BaseCommand):
+    help = ('Exports users changed or deleted since the last sync as CSV or JSONL, deleted users '
+            'are rows with `deleted` set, the cursor to continue from is kept in --cursor-file')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', default=None,
+                            help='Username of the administrator whose users are synced')
+        parser.add_argument('--cursor', default=None,
+                            help='Cursor returned by the previous sync, all users are exported without it')
+        parser.add_argument('--cursor-file', default=None,
+                            help='File the cursor is read from and written to after a successful sync')
+        parser.add_argument('--fields', default=','.join(API_FIELDS),
+                            help='Comma separated user fields to export')
+        parser.add_argument('--output', default='-',
+                            help='File to export to, stdout by default')
+        parser.add_argument('--format', choices=FORMATS, default=None,
+                            help='Output format, guessed from file extension by default (JSONL for stdout)')
+        parser.add_argument('--batch-size', type=int, default=SYNC_BATCH_SIZE,
+                            help='Number of changes fetched per query')
+
+    def handle(self, *args, **options):
+        User = get_user_model()
+        if not options['user']:
+            raise CommandError('--user is required.')
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be a positive number.')
+        fields = [name.strip() for name in options['fields'].split(',') if name.strip()]
+        unknown = [name for name in fields if name not in API_FIELDS]
+        if unknown:
+            raise CommandError('Unknown fields: %s.' % ', '.join(unknown))
+        try:
+            user = User.objects.get(**{User.USERNAME_FIELD: options['user']})
+        except User.DoesNotExist:
+            raise CommandError('User "%s" does not exist.' % options['user'])
+
+        cursor = options['cursor']
+        cursor_file = options['cursor_file']
+        if cursor is None and cursor_file and os.path.exists(cursor_file):
+            with io.open(cursor_file, encoding='utf-8') as fp:
+                cursor = fp.read().strip() or None
+
+        request = HttpRequest()
+        request.user = user
+        users = admin.site._registry[User].get_queryset(request)
+        output = options['output']
+        fmt = options['format'] or (JSONL if output == '-' else guess_format(output))
+        fp = self.stdout if output == '-' else io.open(output, 'w', encoding='utf-8', newline='')
+        writer = RowWriter(fp, fmt, fieldnames=['id', 'deleted', 'updated_at'] + [
+            name for name in fields if name not in ('id', 'updated_at')])
+        writer.writeheader()
+        changed = deleted = 0
+        try:
+            changes = iter_changes(users, scoped_tombstones(user), fields, cursor, options['batch_size'])
+            for rows, cursor in changes:
+                for row in rows:
+                    writer.writerow(row)
+                    if row['deleted']:
+                        deleted += 1
+                    else:
+                        changed += 1
+        except InvalidCursor as e:
+            raise CommandError(str(e))
+        finally:
+            if fp is not self.stdout:
+                fp.close()
+
+        # cursor is saved only once all changes were written
+        if cursor_file:
+            with io.open(cursor_file, 'w', encoding='utf-8') as cursor_fp:
+                cursor_fp.write(cursor)
+        if options['verbosity'] >= 1:
+            self.stderr.write('%d changed and %d deleted users synced, next cursor: %s' % (
+                changed, deleted, cursor))
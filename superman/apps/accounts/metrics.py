@@ -0,0 +1,365 @@
+import functools
+import json
+import mmap
+import os
+import struct
+import threading
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.http import Http404, HttpResponse
+from django.utils.crypto import constant_time_compare
+
+from .queries import QueryCounter
+
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500)
+INF = float('inf')
+
+# metrics file starts with number of used bytes, entries are key length, key padded to 8 bytes and value
+HEADER = struct.Struct('<I4x')
+KEY_LENGTH = struct.Struct('<I')
+VALUE = struct.Struct('<d')
+INITIAL_FILE_SIZE = 64 * 1024
+
+
+def _entry_size(key_length):
+    return KEY_LENGTH.size + key_length + (-(KEY_LENGTH.size + key_length) % 8) + VALUE.size
+
+
+def read_file(path):
+    """
+    Values of a metrics file written by any process
+    :return: list of (key, value) tuples
+    """
+    with open(path, 'rb') as fp:
+        data = fp.read()
+    if len(data) < HEADER.size:
+        return []
+    used = HEADER.unpack_from(data)[0]
+    items = []
+    offset = HEADER.size
+    while offset < used:
+        key_length = KEY_LENGTH.unpack_from(data, offset)[0]
+        key = data[offset + KEY_LENGTH.size:offset + KEY_LENGTH.size + key_length].decode('utf-8')
+        offset += _entry_size(key_length)
+        items.append((key, VALUE.unpack_from(data, offset - VALUE.size)[0]))
+    return items
+
+
+class MmapValues(object):
+    """
+    Values of metrics of one process in a memory mapped file, other processes read the file to
+    aggregate metrics of all workers. Entries are only appended and the used size is updated
+    after an entry is written, so readers never see partial entries.
+    """
+    def __init__(self, path):
+        self.path = path
+        self.fp = open(path, 'a+b')
+        if os.fstat(self.fp.fileno()).st_size < INITIAL_FILE_SIZE:
+            self.fp.truncate(INITIAL_FILE_SIZE)
+        self.size = os.fstat(self.fp.fileno()).st_size
+        self.map = mmap.mmap(self.fp.fileno(), self.size)
+        self.used = HEADER.unpack_from(self.map)[0] or HEADER.size
+        self.positions = {}
+        offset = HEADER.size
+        while offset < self.used:
+            key_length = KEY_LENGTH.unpack_from(self.map, offset)[0]
+            key = self.map[offset + KEY_LENGTH.size:offset + KEY_LENGTH.size + key_length].decode('utf-8')
+            offset += _entry_size(key_length)
+            self.positions[key] = offset - VALUE.size
+
+    def _append(self, key):
+        encoded = key.encode('utf-8')
+        size = _entry_size(len(encoded))
+        while self.used + size > self.size:
+            self.size *= 2
+            self.map.close()
+            self.fp.truncate(self.size)
+            self.map = mmap.mmap(self.fp.fileno(), self.size)
+        KEY_LENGTH.pack_into(self.map, self.used, len(encoded))
+        self.map[self.used + KEY_LENGTH.size:self.used + KEY_LENGTH.size + len(encoded)] = encoded
+        position = self.used + size - VALUE.size
+        VALUE.pack_into(self.map, position, 0.0)
+        self.used += size
+        HEADER.pack_into(self.map, 0, self.used)
+        self.positions[key] = position
+        return position
+
+    def inc(self, key, amount):
+        position = self.positions.get(key)
+        if position is None:
+            position = self._append(key)
+        VALUE.pack_into(self.map, position, VALUE.unpack_from(self.map, position)[0] + amount)
+
+    def items(self):
+        return [(key, VALUE.unpack_from(self.map, position)[0]) for key, position in self.positions.items()]
+
+    def close(self):
+        self.map.close()
+        self.fp.close()
+
+
+class MemoryValues(object):
+    """
+    Values of metrics of a single process server
+    """
+    def __init__(self):
+        self.values = defaultdict(float)
+
+    def inc(self, key, amount):
+        self.values[key] += amount
+
+    def items(self):
+        return list(self.values.items())
+
+    def close(self):
+        pass
+
+
+class Registry(object):
+    """
+    Metrics of all workers. With `METRICS_DIR` every process writes to its own memory mapped file
+    in it and collected values are summed across all files, otherwise values are kept in memory of
+    the process. Clear the directory when the server is (re)started.
+    """
+    def __init__(self):
+        self.metrics = []
+        self.lock = threading.Lock()
+        self.pid = None
+        self.values = None
+
+    def register(self, metric):
+        self.metrics.append(metric)
+
+    def get_values(self):
+        # forked workers must not write to the file of their parent
+        if self.pid != os.getpid():
+            if self.values is not None:
+                self.values.close()
+            directory = getattr(settings, 'METRICS_DIR', None)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+                self.values = MmapValues(os.path.join(directory, 'metrics_%d.db' % os.getpid()))
+            else:
+                self.values = MemoryValues()
+            self.pid = os.getpid()
+        return self.values
+
+    def inc(self, key, amount):
+        if not getattr(settings, 'METRICS_ENABLED', False):
+            return
+        with self.lock:
+            self.get_values().inc(key, amount)
+
+    def reset(self):
+        with self.lock:
+            if self.values is not None:
+                self.values.close()
+            self.pid = self.values = None
+
+    def collect(self):
+        """
+        :return: dict of keys and values summed across processes
+        """
+        totals = defaultdict(float)
+        directory = getattr(settings, 'METRICS_DIR', None)
+        with self.lock:
+            if directory:
+                self.get_values()
+                items = [item for name in sorted(os.listdir(directory)) if name.endswith('.db')
+                         for item in read_file(os.path.join(directory, name))]
+            else:
+                items = self.get_values().items()
+        for key, value in items:
+            totals[key] += value
+        return totals
+
+    def generate(self):
+        """
+        Metrics in Prometheus text format
+        """
+        samples = defaultdict(list)
+        for key, value in self.collect().items():
+            name, sample, labels = json.loads(key)
+            samples[name].append((sample, labels, value))
+        lines = []
+        for metric in self.metrics:
+            lines.append('# HELP %s %s' % (metric.name, metric.documentation))
+            lines.append('# TYPE %s %s' % (metric.name, metric.type))
+            for sample, labels, value in metric.expose(samples.get(metric.name, [])):
+                lines.append('%s%s %s' % (sample, format_labels(labels), format_value(value)))
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+
+def format_labels(labels):
+    if not labels:
+        return ''
+    return '{%s}' % ','.join('%s="%s"' % (name, escape_label(value)) for name, value in labels)
+
+
+def escape_label(value):
+    return value.replace('\\', r'\\').replace('\n', r'\n').replace('"', r'\"')
+
+
+def format_value(value):
+    if value == INF:
+        return '+Inf'
+    if value == int(value):
+        return str(int(value))
+    return repr(value)
+
+
+class Metric(object):
+    type = None
+
+    def __init__(self, name, documentation, labelnames=(), registry=REGISTRY):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.registry = registry
+        registry.register(self)
+
+    def get_key(self, sample, labels, extra=()):
+        """
+        Key of a sample in stored values, `extra` labels like `le` of buckets go last
+        """
+        if set(labels) != set(self.labelnames):
+            raise ValueError('%s expects labels %s, got %s.' % (
+                self.name, ', '.join(self.labelnames), ', '.join(sorted(labels))))
+        return json.dumps([self.name, sample, [[name, str(labels[name])] for name in self.labelnames] +
+                           [list(label) for label in extra]])
+
+    def expose(self, samples):
+        return sorted(samples, key=lambda sample: (sample[1], sample[0]))
+
+
+class Counter(Metric):
+    type = 'counter'
+
+    def inc(self, amount=1, **labels):
+        self.registry.inc(self.get_key(self.name, labels), amount)
+
+
+class Histogram(Metric):
+    """
+    Counts of observed values in `buckets`, bucket of each observation is stored on its own and
+    buckets are made cumulative when exposed
+    """
+    type = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS, registry=REGISTRY):
+        super(Histogram, self).__init__(name, documentation, labelnames, registry)
+        self.buckets = tuple(buckets) + (INF,)
+
+    def observe(self, value, **labels):
+        bound = next(bound for bound in self.buckets if value <= bound)
+        self.registry.inc(self.get_key(self.name + '_bucket', labels, [('le', format_value(bound))]), 1)
+        self.registry.inc(self.get_key(self.name + '_sum', labels), value)
+        self.registry.inc(self.get_key(self.name + '_count', labels), 1)
+
+    def expose(self, samples):
+        buckets = defaultdict(dict)
+        other = []
+        for sample, labels, value in samples:
+            if sample.endswith('_bucket'):
+                buckets[tuple(tuple(label) for label in labels[:-1])][labels[-1][1]] = value
+            else:
+                other.append((sample, [tuple(label) for label in labels], value))
+        exposed = []
+        for labels in sorted(buckets):
+            total = 0
+            for bound in self.buckets:
+                total += buckets[labels].get(format_value(bound), 0)
+                exposed.append((self.name + '_bucket', list(labels) + [('le', format_value(bound))], total))
+        return exposed + sorted(other, key=lambda sample: (sample[1], sample[0]))
+
+    def time(self, **labels):
+        """
+        Decorator observing duration of calls in seconds
+        """
+        def decorator(func):
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                started = time.time()
+                try:
+                    return func(*args, **kwargs)
+                finally:
+                    self.observe(time.time() - started, **labels)
+            return wrapper
+        return decorator
+
+
+REQUEST_DURATION = Histogram('superman_request_duration_seconds', 'Request latency by resolved view.',
+                             ['view'])
+REQUESTS = Counter('superman_requests_total', 'Requests by resolved view and status code.',
+                   ['view', 'status'])
+REQUEST_QUERIES = Histogram('superman_request_queries', 'SQL queries per request by resolved view.',
+                            ['view'], buckets=QUERY_COUNT_BUCKETS)
+REQUEST_QUERY_DURATION = Histogram('superman_request_query_duration_seconds',
+                                   'Time spent in SQL queries per request by resolved view.', ['view'])
+LOAD_USER_DURATION = Histogram('superman_login_load_user_duration_seconds',
+                               'Latency of looking up the user in social login pipeline.')
+CACHE_REQUESTS = Counter('superman_cache_requests_total', 'Cache lookups by cache and result (hit or miss).',
+                         ['cache', 'result'])
+
+
+def record_cache(cache, hits, misses):
+    if hits:
+        CACHE_REQUESTS.inc(hits, cache=cache, result='hit')
+    if misses:
+        CACHE_REQUESTS.inc(misses, cache=cache, result='miss')
+
+
+class MetricsMiddleware(object):
+    """
+    Records latency, status and SQL queries of requests by resolved view name
+    (e.g. `admin:accounts_user_changelist`), requests which don't resolve are `unresolved`.
+    Enabled by `METRICS_ENABLED` setting, place it first to measure other middleware too.
+    Queries are counted by `QueryCounter`, they are not recorded.
+    """
+    def __init__(self, get_response):
+        if not getattr(settings, 'METRICS_ENABLED', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        counters = [QueryCounter.get(connections[alias]) for alias in connections]
+        before = [(counter.count, counter.time) for counter in counters]
+        started = time.time()
+        response = self.get_response(request)
+        duration = time.time() - started
+        match = getattr(request, 'resolver_match', None)
+        view = match.view_name if match is not None else 'unresolved'
+        REQUEST_DURATION.observe(duration, view=view)
+        REQUESTS.inc(view=view, status=str(response.status_code))
+        REQUEST_QUERIES.observe(sum(counter.count - count for counter, (count, query_time)
+                                    in zip(counters, before)), view=view)
+        REQUEST_QUERY_DURATION.observe(sum(counter.time - query_time for counter, (count, query_time)
+                                           in zip(counters, before)), view=view)
+        return response
+
+
+def metrics_view(request):
+    """
+    Metrics of all workers in Prometheus text format, for superusers or with
+    `Authorization: Bearer <METRICS_TOKEN>` header
+    """
+    if not getattr(settings, 'METRICS_ENABLED', False):
+        raise Http404
+    token = getattr(settings, 'METRICS_TOKEN', None)
+    authorized = token and constant_time_compare(request.META.get('HTTP_AUTHORIZATION', ''),
+                                                 'Bearer %s' % token)
+    if not authorized and not request.user.is_superuser:
+        response = HttpResponse('Authentication required.', status=401, content_type='text/plain')
+        response['WWW-Authenticate'] = 'Bearer'
+        return response
+    return HttpResponse(REGISTRY.generate(), content_type=CONTENT_TYPE)
@@ -4,19 +4,19 @@ from __future__ import unicode_literals
 
 from django.db import migrations
 
+from superman.apps.accounts.backfill import batched_update
+
 
 def forwards(apps, schema_editor):
     """
     Set IBAN as NULL instead of empty string to enforce uniqueness at db level
     """
     User = apps.get_model('accounts', 'User')
-    for user in User.objects.all():
-        if not user.iban:
-            user.iban = None
-            user.save()
+    batched_update(User.objects.using(schema_editor.connection.alias).filter(iban=''), {'iban': None})
 
 
 class Migration(migrations.Migration):
+    atomic = False
 
     dependencies = [
         ('accounts', '0001_initial'),
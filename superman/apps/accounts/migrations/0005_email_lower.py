@@ -0,0 +1,35 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.10.3 on 2026-10-18 19:44
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+from django.db.models.functions import Lower
+
+from superman.apps.accounts.backfill import batched_update
+
+
+def forwards(apps, schema_editor):
+    """
+    Backfill lowercased email in primary key ranges, each range is committed separately
+    so the table is never locked as a whole
+    """
+    User = apps.get_model('accounts', 'User')
+    batched_update(User.objects.using(schema_editor.connection.alias).exclude(email=''),
+                   {'email_lower': Lower('email')})
+
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ('accounts', '0004_auto_20261018_1943'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='email_lower',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=254),
+        ),
+        migrations.RunPython(forwards, lambda *args: None),
+    ]
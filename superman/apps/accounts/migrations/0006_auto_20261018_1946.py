@@ -0,0 +1,22 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.10.3 on 2026-10-18 19:46
+from __future__ import unicode_literals
+
+from django.db import migrations
+import superman.apps.accounts.models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0005_email_lower'),
+    ]
+
+    operations = [
+        migrations.AlterModelManagers(
+            name='user',
+            managers=[
+                ('objects', superman.apps.accounts.models.UserManager()),
+            ],
+        ),
+    ]
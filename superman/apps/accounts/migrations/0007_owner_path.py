@@ -0,0 +1,51 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.10.3 on 2026-10-18 19:47
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+# marks users whose parent's path is not known yet
+PENDING = '?'
+
+
+def forwards(apps, schema_editor):
+    """
+    Build `owner_path` one tree level at a time, each level is a single set based UPDATE
+    which copies parent's path. Users left in cycles are treated as roots.
+    """
+    db_alias = schema_editor.connection.alias
+    User = apps.get_model('accounts', 'User')
+    User._base_manager.using(db_alias).filter(created_by__isnull=False).update(owner_path=PENDING)
+
+    qn = schema_editor.quote_name
+    table = qn(User._meta.db_table)
+    sql = (
+        "UPDATE {table} SET {path} = ("
+        "  SELECT p.{path} || CAST(p.{id} AS VARCHAR(20)) || '/' FROM {table} p"
+        "  WHERE p.{id} = {table}.{created_by_id}) "
+        "WHERE {path} = %s AND {created_by_id} IN ("
+        "  SELECT p.{id} FROM {table} p WHERE p.{path} <> %s)"
+    ).format(table=table, path=qn('owner_path'), id=qn('id'), created_by_id=qn('created_by_id'))
+    with schema_editor.connection.cursor() as cursor:
+        while True:
+            cursor.execute(sql, [PENDING, PENDING])
+            if not cursor.rowcount:
+                break
+    User._base_manager.using(db_alias).filter(owner_path=PENDING).update(owner_path='')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0006_auto_20261018_1946'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='owner_path',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=255),
+        ),
+        migrations.RunPython(forwards, lambda *args: None),
+    ]
@@ -0,0 +1,42 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations
+
+
+# trigram GIN indexes serving `LIKE '%term%'` lookups of admin search, see `search.search_filter`
+SEARCH_INDEXES = (
+    ('accounts_user_username_trgm', 'UPPER("username"::text)'),
+    ('accounts_user_first_name_trgm', 'UPPER("first_name"::text)'),
+    ('accounts_user_last_name_trgm', 'UPPER("last_name"::text)'),
+    ('accounts_user_email_lower_trgm', '"email_lower"'),
+    ('accounts_user_iban_trgm', '"iban"'),
+)
+
+
+def create_indexes(apps, schema_editor):
+    # other databases e.g. SQLite of tests search without indexes
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    for name, expression in SEARCH_INDEXES:
+        schema_editor.execute('CREATE INDEX %s ON "accounts_user" USING gin ((%s) gin_trgm_ops)' % (
+            name, expression))
+
+
+def drop_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for name, expression in SEARCH_INDEXES:
+        schema_editor.execute('DROP INDEX IF EXISTS %s' % name)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0007_owner_path'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_indexes, drop_indexes),
+    ]
@@ -0,0 +1,44 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.10.3 on 2026-10-18 20:25
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0009_audit_entry'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserTombstone',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('user_id', models.IntegerField(verbose_name='user id')),
+                ('username', models.CharField(max_length=150, verbose_name='username')),
+                ('created_by_id', models.IntegerField(db_index=True, null=True)),
+                ('owner_path', models.CharField(blank=True, db_index=True, max_length=255)),
+                ('deleted_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='deleted at')),
+            ],
+            options={
+                'verbose_name': 'deleted user',
+                'verbose_name_plural': 'deleted users',
+            },
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='updated_at',
+            field=models.DateTimeField(default=django.utils.timezone.now, editable=False, verbose_name='updated at'),
+        ),
+        migrations.AlterIndexTogether(
+            name='user',
+            index_together=set([('is_active', 'date_joined'), ('created_by', 'updated_at'), ('created_by', 'is_active'), ('created_by', 'username'), ('created_by', 'date_joined'), ('updated_at', 'id')]),
+        ),
+        migrations.AlterIndexTogether(
+            name='usertombstone',
+            index_together=set([('deleted_at', 'id')]),
+        ),
+    ]
@@ -0,0 +1,20 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.10.3 on 2026-10-18 21:15
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0011_outbox_message'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='outboxmessage',
+            name='event',
+            field=models.CharField(choices=[('user.created', 'User created'), ('user.deactivated', 'User deactivated'), ('user.iban_changed', 'User IBAN changed'), ('user.reassigned', 'User reassigned')], max_length=50, verbose_name='event'),
+        ),
+    ]
@@ -0,0 +1,34 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations
+
+
+# btree index serving `UPPER(username) LIKE 'prefix%'` lookups of `utils._existing_usernames`,
+# trigram index of admin search needs 3 characters and can't serve short prefixes
+INDEX_NAME = 'accounts_user_username_upper_like'
+
+
+def create_index(apps, schema_editor):
+    # other databases e.g. SQLite of tests look usernames up without the index
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('CREATE INDEX %s ON "accounts_user" ((UPPER("username"::text)) text_pattern_ops)' % (
+        INDEX_NAME))
+
+
+def drop_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('DROP INDEX IF EXISTS %s' % INDEX_NAME)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0012_outbox_user_reassigned'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_index, drop_index),
+    ]
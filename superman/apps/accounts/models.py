@@ -1,14 +1,268 @@
+import json
+
+from django.core.exceptions import ValidationError
 from django.db import models
-from django.contrib.auth.models import AbstractUser
+from django.db.models import Value
+from django.db.models.functions import Concat, Substr
+from django.contrib.auth.models import AbstractUser, UserManager as BaseUserManager
+from django.utils import timezone
 from django.utils.translation import ugettext_lazy as _
 
 from localflavor.generic.models import IBANField
 
+from .cache import invalidate_all
+
+
+class UserQuerySet(models.QuerySet):
+    def update(self, **kwargs):
+        kwargs.setdefault('updated_at', timezone.now())
+        rows = super(UserQuerySet, self).update(**kwargs)
+        # signals are not sent for updated users, so drop all cached creators instead
+        invalidate_all()
+        return rows
+    update.alters_data = True
+
+    def descendants_of(self, user, include_self=False):
+        """
+        Users created by `user` directly or by any of his descendants
+        """
+        qs = self.filter(owner_path__startswith=user.subtree_path)
+        if include_self:
+            qs = qs | self.filter(pk=user.pk)
+        return qs
+
+    def ancestors_of(self, user):
+        """
+        Users who created `user` directly or by any of their descendants
+        """
+        return self.filter(pk__in=user.ancestor_ids)
+
+    def reassign(self, created_by):
+        """
+        Sets `created_by` of all users of this queryset with a single UPDATE, subtrees of users
+        who created other users are moved along with them
+        :param created_by: new creator, `None` makes the users roots
+        :return: number of reassigned users
+        """
+        new_path = created_by.subtree_path if created_by else ''
+        if created_by and self.filter(pk__in=created_by.ancestor_ids + [created_by.pk]).exists():
+            raise ValueError('User can not be created by himself or his descendants.')
+        # deeper subtrees first, so nested reassigned users are moved under the new creator
+        creators = self.filter(owned_users__isnull=False).order_by().distinct()
+        moved = sorted(creators.values_list('pk', 'owner_path'), key=lambda user: -len(user[1]))
+        rows = self.update(created_by=created_by, owner_path=new_path)
+        for pk, old_path in moved:
+            old_subtree_path = '%s%s/' % (old_path, pk)
+            new_subtree_path = '%s%s/' % (new_path, pk)
+            if old_subtree_path != new_subtree_path:
+                self.model._default_manager.filter(owner_path__startswith=old_subtree_path).update(
+                    owner_path=Concat(Value(new_subtree_path),
+                                      Substr('owner_path', len(old_subtree_path) + 1),
+                                      output_field=models.CharField()))
+        return rows
+    reassign.alters_data = True
+
+
+class UserManager(BaseUserManager.from_queryset(UserQuerySet)):
+    pass
+
 
 class User(AbstractUser):
+    # fields needed by `__str__`, the only ones loaded when user is displayed as related object
+    STR_FIELDS = ('username', 'first_name', 'last_name')
+
     iban = IBANField(_('IBAN'), null=True, unique=True)
     created_by = models.ForeignKey('self', null=True, blank=True,
                                    on_delete=models.SET_NULL, related_name='owned_users')
+    # lowercased `email` for indexed case insensitive lookups, maintained on save
+    email_lower = models.CharField(max_length=254, blank=True, db_index=True, editable=False)
+    # ids of `created_by` ancestors from the root e.g. `1/5/`, maintained on save and delete
+    owner_path = models.CharField(max_length=255, blank=True, db_index=True, editable=False)
+    # time of the last write, maintained by `save` and `update` for incremental sync
+    updated_at = models.DateTimeField(_('updated at'), default=timezone.now, editable=False)
+
+    objects = UserManager()
+
+    class Meta(AbstractUser.Meta):
+        index_together = (
+            # admin changelist of non superusers is always filtered by `created_by`
+            ('created_by', 'username'),
+            ('created_by', 'is_active'),
+            ('created_by', 'date_joined'),
+            ('is_active', 'date_joined'),
+            # users changed since a sync cursor, see `sync.iter_changes`
+            ('updated_at', 'id'),
+            ('created_by', 'updated_at'),
+        )
 
     def __str__(self):
         return self.get_full_name() or self.get_username()
+
+    @property
+    def subtree_path(self):
+        """
+        `owner_path` prefix of all users in the subtree of this user
+        """
+        return '%s%s/' % (self.owner_path, self.pk)
+
+    @property
+    def ancestor_ids(self):
+        return [int(pk) for pk in self.owner_path.split('/') if pk]
+
+    def get_owner_path(self):
+        """
+        `owner_path` of this user according to current `created_by`
+        """
+        if not self.created_by_id:
+            return ''
+        cache_name = self._meta.get_field('created_by').get_cache_name()
+        if hasattr(self, cache_name):
+            return self.created_by.subtree_path
+        parent_path = type(self)._base_manager.filter(
+            pk=self.created_by_id).values_list('owner_path', flat=True).first() or ''
+        return '%s%s/' % (parent_path, self.created_by_id)
+
+    def clean(self):
+        super(User, self).clean()
+        if self.pk and self.created_by_id and str(self.pk) in self.get_owner_path().split('/'):
+            raise ValidationError({'created_by': _('User can not be created by himself or his descendants.')})
+
+    def save(self, *args, **kwargs):
+        self.email_lower = (self.email or '').lower()
+        self.updated_at = timezone.now()
+        update_fields = kwargs.get('update_fields')
+        if update_fields:
+            update_fields = kwargs['update_fields'] = set(update_fields) | {'updated_at'}
+            if 'email' in update_fields:
+                update_fields.add('email_lower')
+
+        old_subtree_path = None
+        original_created_by_id = getattr(self, '_original_created_by_id', None)
+        if update_fields is None or 'created_by' in update_fields:
+            if self._state.adding or original_created_by_id != self.created_by_id:
+                if not self._state.adding:
+                    old_path = type(self)._base_manager.filter(
+                        pk=self.pk).values_list('owner_path', flat=True).first()
+                    if old_path is not None:
+                        old_subtree_path = '%s%s/' % (old_path, self.pk)
+                self.owner_path = self.get_owner_path()
+                if self.pk and str(self.pk) in self.owner_path.split('/'):
+                    raise ValueError('User can not be created by himself or his descendants.')
+                if update_fields is not None:
+                    update_fields = kwargs['update_fields'] = set(update_fields) | {'owner_path'}
+
+        super(User, self).save(*args, **kwargs)
+        self._original_created_by_id = self.created_by_id
+
+        if old_subtree_path and old_subtree_path != self.subtree_path:
+            # move the whole subtree along with the user
+            type(self)._default_manager.filter(owner_path__startswith=old_subtree_path).update(
+                owner_path=Concat(Value(self.subtree_path), Substr('owner_path', len(old_subtree_path) + 1),
+                                  output_field=models.CharField()))
+
+
+class AuditEntry(models.Model):
+    """
+    Field level changes of a user, written in batches by `audit.AuditLogWriter`
+    """
+    CREATE = 'create'
+    UPDATE = 'update'
+    DELETE = 'delete'
+    ACTION_CHOICES = (
+        (CREATE, _('Create')),
+        (UPDATE, _('Update')),
+        (DELETE, _('Delete')),
+    )
+
+    # no constraints, history outlives deleted users and is written after their transaction commits
+    user = models.ForeignKey(User, null=True, on_delete=models.DO_NOTHING, db_constraint=False,
+                             related_name='audit_entries')
+    actor = models.ForeignKey(User, null=True, blank=True, on_delete=models.DO_NOTHING, db_constraint=False,
+                              related_name='+')
+    # username at the time of change, user can be renamed or deleted later
+    username = models.CharField(_('username'), max_length=150)
+    action = models.CharField(_('action'), max_length=10, choices=ACTION_CHOICES)
+    # JSON of {field: [old value, new value]}, many to many fields are {field: {added/removed: [pks]}}
+    changes = models.TextField(_('changes'))
+    created_at = models.DateTimeField(_('created at'), default=timezone.now)
+
+    class Meta:
+        verbose_name = _('audit entry')
+        verbose_name_plural = _('audit entries')
+        ordering = ('-created_at', '-id')
+        index_together = (
+            # history of a user is browsed newest first
+            ('user', 'created_at'),
+            ('created_at', 'id'),
+        )
+
+    def __str__(self):
+        return '%s %s' % (self.get_action_display(), self.username)
+
+    def get_changes(self):
+        return json.loads(self.changes)
+
+
+class UserTombstone(models.Model):
+    """
+    Deleted user, written in the deleting transaction so incremental sync can report deletions
+    """
+    user_id = models.IntegerField(_('user id'))
+    username = models.CharField(_('username'), max_length=150)
+    # ownership of the deleted user, tombstones are scoped the same way as users
+    created_by_id = models.IntegerField(null=True, db_index=True)
+    owner_path = models.CharField(max_length=255, blank=True, db_index=True)
+    deleted_at = models.DateTimeField(_('deleted at'), default=timezone.now)
+
+    class Meta:
+        verbose_name = _('deleted user')
+        verbose_name_plural = _('deleted users')
+        index_together = (
+            ('deleted_at', 'id'),
+        )
+
+    def __str__(self):
+        return self.username
+
+
+class OutboxMessage(models.Model):
+    """
+    Event about a user waiting to be delivered to a webhook, written in the transaction changing
+    the user and delivered by `outbox.WebhookSender`
+    """
+    USER_CREATED = 'user.created'
+    USER_DEACTIVATED = 'user.deactivated'
+    USER_IBAN_CHANGED = 'user.iban_changed'
+    USER_REASSIGNED = 'user.reassigned'
+    EVENT_CHOICES = (
+        (USER_CREATED, _('User created')),
+        (USER_DEACTIVATED, _('User deactivated')),
+        (USER_IBAN_CHANGED, _('User IBAN changed')),
+        (USER_REASSIGNED, _('User reassigned')),
+    )
+
+    endpoint = models.CharField(_('endpoint'), max_length=255)
+    event = models.CharField(_('event'), max_length=50, choices=EVENT_CHOICES)
+    user_id = models.IntegerField(_('user id'))
+    # JSON sent to the endpoint, event id in it is shared by messages of all endpoints
+    payload = models.TextField(_('payload'))
+    created_at = models.DateTimeField(_('created at'), default=timezone.now)
+    attempts = models.PositiveIntegerField(_('attempts'), default=0)
+    # NULL once the message is delivered or given up after too many attempts
+    next_attempt_at = models.DateTimeField(_('next attempt at'), null=True, default=timezone.now)
+    delivered_at = models.DateTimeField(_('delivered at'), null=True)
+    last_error = models.TextField(_('last error'), blank=True)
+
+    class Meta:
+        verbose_name = _('outbox message')
+        verbose_name_plural = _('outbox messages')
+        index_together = (
+            # due messages are drained in order
+            ('next_attempt_at', 'id'),
+        )
+
+    def __str__(self):
+        return '%s %s' % (self.event, self.user_id)
+
+    def get_payload(self):
+        return json.loads(self.payload)
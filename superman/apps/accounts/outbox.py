@@ -0,0 +1,251 @@
+import json
+import logging
+import threading
+import uuid
+from collections import OrderedDict, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+import requests
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import F
+from django.utils import timezone
+
+from .models import OutboxMessage
+from .utils import chunked
+
+
+logger = logging.getLogger(__name__)
+
+# fields of User sent along with every event
+EVENT_FIELDS = ('id', 'username', 'first_name', 'last_name', 'email', 'iban', 'is_active', 'created_by_id')
+
+
+def get_events(original, values, created=False):
+    """
+    Events of a user whose fields changed from `original` to `values`, fields missing in either
+    are not known to change
+    """
+    if created:
+        return [OutboxMessage.USER_CREATED]
+    events = []
+    if original.get('is_active') and values.get('is_active') is False:
+        events.append(OutboxMessage.USER_DEACTIVATED)
+    if 'iban' in original and 'iban' in values and original['iban'] != values['iban']:
+        events.append(OutboxMessage.USER_IBAN_CHANGED)
+    if 'created_by_id' in original and 'created_by_id' in values and \
+            original['created_by_id'] != values['created_by_id']:
+        events.append(OutboxMessage.USER_REASSIGNED)
+    return events
+
+
+def make_messages(event, user):
+    """
+    Unsaved messages of `event` for every endpoint of `WEBHOOK_URLS`
+    :param user: dict of `EVENT_FIELDS`
+    """
+    now = timezone.now()
+    payload = json.dumps({'id': uuid.uuid4().hex, 'event': event, 'created_at': now, 'user': user},
+                         cls=DjangoJSONEncoder, sort_keys=True)
+    return [OutboxMessage(endpoint=endpoint, event=event, user_id=user['id'], payload=payload,
+                          created_at=now, next_attempt_at=now)
+            for endpoint in settings.WEBHOOK_URLS]
+
+
+def publish(events, using=None):
+    """
+    Writes messages of `events` to the outbox, call it in the transaction changing the users so
+    events are delivered if and only if the change commits
+    :param events: list of (event, dict of `EVENT_FIELDS`) tuples
+    """
+    if not settings.WEBHOOK_URLS:
+        return
+    messages = [message for event, user in events for message in make_messages(event, user)]
+    if messages:
+        OutboxMessage.objects.using(using).bulk_create(messages)
+
+
+def get_event_values(user):
+    return dict((name, user.__dict__[name]) for name in EVENT_FIELDS if name in user.__dict__)
+
+
+def publish_created(users, using=None):
+    """
+    Publishes bulk created users, which don't send signals. Primary keys not set by `bulk_create`
+    are looked up by username with a single query.
+    """
+    if not settings.WEBHOOK_URLS or not users:
+        return
+    missing = [user.get_username() for user in users if user.pk is None]
+    pks = {}
+    if missing:
+        model = type(users[0])
+        pks = dict(model._base_manager.using(using).filter(
+            **{model.USERNAME_FIELD + '__in': missing}).values_list(model.USERNAME_FIELD, 'pk'))
+    events = []
+    for user in users:
+        values = get_event_values(user)
+        values['id'] = user.pk or pks[user.get_username()]
+        events.append((OutboxMessage.USER_CREATED, values))
+    publish(events, using=using)
+
+
+def publish_update(queryset, values):
+    """
+    Publishes events of a bulk `queryset.update(**values)` which doesn't send signals, call it
+    before the update in the same transaction
+    """
+    if not settings.WEBHOOK_URLS or not {'is_active', 'iban', 'created_by_id'}.intersection(values):
+        return
+    events = []
+    for row in queryset.values(*EVENT_FIELDS):
+        changed = dict(row, **dict((name, value) for name, value in values.items() if name in row))
+        for event in get_events(row, changed):
+            events.append((event, changed))
+    publish(events, using=queryset.db)
+
+
+def get_retry_delay(attempts):
+    """
+    Seconds until next attempt after `attempts` failed ones, doubles with every attempt
+    """
+    return min(settings.WEBHOOK_RETRY_DELAY * 2 ** (attempts - 1), settings.WEBHOOK_RETRY_MAX_DELAY)
+
+
+def purge_messages(before, batch_size=1000):
+    """
+    Deletes messages created `before` which are delivered or given up, in batches of `batch_size`
+    so locks are held briefly. Messages waiting for delivery are never deleted.
+    :return: number of deleted messages
+    """
+    deleted = 0
+    while True:
+        pks = list(OutboxMessage.objects.filter(next_attempt_at=None, created_at__lt=before).order_by(
+            'pk').values_list('pk', flat=True)[:batch_size])
+        if not pks:
+            return deleted
+        OutboxMessage.objects.filter(pk__in=pks).delete()
+        deleted += len(pks)
+
+
+class WebhookSender(object):
+    """
+    Drains due outbox messages in batches of `batch_size`. Messages of the same endpoint are sent
+    in requests of up to `events_per_request` events as `{"events": [...]}` JSON, at most
+    `concurrency` requests run at once per endpoint over pooled keep-alive connections.
+    Failed requests are retried with exponential backoff until `max_attempts`, receivers
+    should expect events to be delivered more than once and deduplicate them by their `id`.
+    Retried events are not ordered with the rest, they can arrive after newer events of the
+    same user, so receivers order them by `created_at` rather than by arrival.
+
+        with WebhookSender() as sender:
+            sender.drain()
+    """
+    def __init__(self, batch_size=1000, events_per_request=None, concurrency=None, timeout=None,
+                 max_attempts=None, session=None):
+        self.batch_size = batch_size
+        self.events_per_request = events_per_request or settings.WEBHOOK_EVENTS_PER_REQUEST
+        self.concurrency = concurrency or settings.WEBHOOK_CONCURRENCY
+        self.timeout = timeout or settings.WEBHOOK_TIMEOUT
+        self.max_attempts = max_attempts or settings.WEBHOOK_MAX_ATTEMPTS
+        self.session = session or self.make_session()
+        self.semaphores = {}
+        self.delivered = 0
+        self.failed = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def make_session(self):
+        session = requests.Session()
+        # connections are kept alive and reused, endpoints on the same host share its pool
+        adapter = requests.adapters.HTTPAdapter(
+            pool_maxsize=self.concurrency * max(len(settings.WEBHOOK_URLS), 1))
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        session.headers['Content-Type'] = 'application/json'
+        return session
+
+    def close(self):
+        self.session.close()
+
+    def drain(self):
+        """
+        Delivers messages due when called, messages failing now are retried by a later call
+        :return: number of messages sent
+        """
+        sent = 0
+        last_pk = 0
+        while True:
+            messages = list(OutboxMessage.objects.filter(
+                next_attempt_at__lte=timezone.now(), pk__gt=last_pk).order_by('pk')[:self.batch_size])
+            if not messages:
+                return sent
+            self.send(messages)
+            sent += len(messages)
+            last_pk = messages[-1].pk
+
+    def send(self, messages):
+        """
+        Sends a batch of messages and records the outcome with one UPDATE per request,
+        failed requests with messages of different attempts take more
+        """
+        by_endpoint = OrderedDict()
+        for message in messages:
+            by_endpoint.setdefault(message.endpoint, []).append(message)
+            # semaphores are created by this thread, not by racing workers
+            if message.endpoint not in self.semaphores:
+                self.semaphores[message.endpoint] = threading.BoundedSemaphore(self.concurrency)
+        # requests over the concurrency of an endpoint wait for its semaphore in their thread
+        with ThreadPoolExecutor(max_workers=self.concurrency * len(by_endpoint)) as executor:
+            futures = [(chunk, executor.submit(self.post, endpoint, chunk))
+                       for endpoint, endpoint_messages in by_endpoint.items()
+                       for chunk in chunked(endpoint_messages, self.events_per_request)]
+            # database is updated from this thread only
+            for chunk, future in futures:
+                error = future.result()
+                if error is None:
+                    self.mark_delivered(chunk)
+                else:
+                    self.mark_failed(chunk, error)
+
+    def post(self, endpoint, messages):
+        """
+        :return: error message or `None` when the endpoint accepted the events
+        """
+        data = '{"events": [%s]}' % ', '.join(message.payload for message in messages)
+        with self.semaphores[endpoint]:
+            try:
+                response = self.session.post(endpoint, data=data.encode('utf-8'), timeout=self.timeout)
+            except requests.RequestException as e:
+                return str(e) or e.__class__.__name__
+        if 200 <= response.status_code < 300:
+            return None
+        return 'HTTP %d: %s' % (response.status_code, response.text[:200])
+
+    def mark_delivered(self, messages):
+        self.delivered += len(messages)
+        OutboxMessage.objects.filter(pk__in=[message.pk for message in messages]).update(
+            attempts=F('attempts') + 1, delivered_at=timezone.now(), next_attempt_at=None, last_error='')
+
+    def mark_failed(self, messages, error):
+        self.failed += len(messages)
+        now = timezone.now()
+        by_attempts = defaultdict(list)
+        for message in messages:
+            by_attempts[message.attempts + 1].append(message.pk)
+        for attempts, pks in sorted(by_attempts.items()):
+            if attempts >= self.max_attempts:
+                logger.error('giving up delivery of %d messages to %s after %d attempts: %s',
+                             len(pks), messages[0].endpoint, attempts, error)
+                next_attempt_at = None
+            else:
+                logger.warning('delivery of %d messages to %s failed, attempt %d: %s',
+                               len(pks), messages[0].endpoint, attempts, error)
+                next_attempt_at = now + timedelta(seconds=get_retry_delay(attempts))
+            OutboxMessage.objects.filter(pk__in=pks).update(
+                attempts=attempts, next_attempt_at=next_attempt_at, last_error=error)
@@ -0,0 +1,185 @@
+import logging
+import multiprocessing
+import os
+import time
+
+import django
+from django.apps import apps
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import get_hasher, make_password
+from django.db import transaction
+from django.utils import timezone
+
+from .audit import make_create_entry, record
+from .cache import invalidate_creators
+from .outbox import publish_created
+
+
+logger = logging.getLogger(__name__)
+
+
+def _setup_worker():
+    # forked workers inherit configured django, spawned ones have to set it up
+    if not apps.ready:
+        django.setup()
+
+
+def _make_password(args):
+    password, hasher = args
+    return make_password(password, hasher=hasher)
+
+
+class HashingPool(object):
+    """
+    Hashes passwords in a pool of worker processes so bulk provisioning uses all cores,
+    PBKDF2 and friends are CPU bound and hold the GIL. Hasher is resolved from `PASSWORD_HASHERS`
+    of calling process and passed to workers.
+
+        with HashingPool(processes=4) as pool:
+            encoded = pool.hash(passwords)
+    """
+    def __init__(self, processes=None, hasher='default'):
+        self.processes = processes or os.cpu_count() or 1
+        self.hasher = get_hasher(hasher)
+        self.pool = None
+        self.hashed = 0
+        self.duration = 0.0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.close()
+            self.pool.join()
+            self.pool = None
+
+    def hash(self, passwords):
+        """
+        :param passwords: list of raw passwords, `None` gives unusable password
+        :return: list of encoded passwords in the same order
+        """
+        started = time.time()
+        usable = [(i, password) for i, password in enumerate(passwords) if password is not None]
+        # unusable passwords are random strings, not worth sending to workers
+        encoded = [make_password(None) if password is None else None for password in passwords]
+        if self.processes > 1 and len(usable) > 1:
+            if self.pool is None:
+                self.pool = multiprocessing.Pool(self.processes, initializer=_setup_worker)
+            chunksize = max(1, len(usable) // (self.processes * 4))
+            results = self.pool.map(_make_password, [(password, self.hasher) for i, password in usable],
+                                    chunksize)
+        else:
+            results = [_make_password((password, self.hasher)) for i, password in usable]
+        for (i, password), result in zip(usable, results):
+            encoded[i] = result
+        self.hashed += len(usable)
+        self.duration += time.time() - started
+        return encoded
+
+    @property
+    def throughput(self):
+        """
+        Passwords hashed per second
+        """
+        return self.hashed / self.duration if self.duration else 0.0
+
+
+def hash_passwords(passwords, processes=None, hasher='default'):
+    """
+    Hashes list of raw passwords in a temporary pool of `processes` worker processes
+    """
+    with HashingPool(processes=processes, hasher=hasher) as pool:
+        return pool.hash(passwords)
+
+
+def set_derived_fields(users):
+    """
+    Sets `email_lower` and `owner_path` of unsaved `users`, `User.save` does it for a single user
+    but `bulk_create` does not call it. Creators which are not loaded are read with one query.
+    """
+    User = get_user_model()
+    cache_name = User._meta.get_field('created_by').get_cache_name()
+    missing = {user.created_by_id for user in users if user.created_by_id and not hasattr(user, cache_name)}
+    paths = {}
+    if missing:
+        paths = dict(User._base_manager.filter(pk__in=missing).values_list('pk', 'owner_path'))
+    for user in users:
+        user.email_lower = (user.email or '').lower()
+        if not user.created_by_id:
+            user.owner_path = ''
+        elif hasattr(user, cache_name):
+            user.owner_path = user.created_by.subtree_path
+        else:
+            user.owner_path = '%s%s/' % (paths.get(user.created_by_id, ''), user.created_by_id)
+
+
+def bulk_create_users(users, passwords, processes=None, batch_size=None, pool=None, prepare=None):
+    """
+    Sets hashed `passwords` to unsaved `users` and creates them with a single `bulk_create`,
+    passwords are hashed in parallel before the transaction is started. Creation is audited and
+    published in the same transaction.
+    :param users: list of unsaved accounts.User objects
+    :param passwords: list of raw passwords matching `users`, `None` gives unusable password
+    :param processes: size of the pool, number of CPUs by default
+    :param batch_size: passed to `bulk_create`
+    :param pool: `HashingPool` to reuse, `processes` is ignored then
+    :param prepare: function called in the transaction with hashed `users` right before they are
+        created, returns list of users to create, e.g. to check uniqueness against existing rows
+    :return: dict with `users` created, `created` count, `processes`, `hash_seconds`, `insert_seconds`
+        and `users_per_second`
+    """
+    if len(users) != len(passwords):
+        raise ValueError('Every user needs a password, got %d users and %d passwords.' % (
+            len(users), len(passwords)))
+    own_pool = pool is None
+    if own_pool:
+        pool = HashingPool(processes=processes)
+    started = time.time()
+    try:
+        encoded = pool.hash(passwords)
+    finally:
+        if own_pool:
+            pool.close()
+    hashed = time.time()
+    for user, password in zip(users, encoded):
+        user.password = password
+    with transaction.atomic():
+        if prepare is not None:
+            users = prepare(users)
+        set_derived_fields(users)
+        # changes feed orders by `updated_at`, stamped as close to the commit as possible
+        now = timezone.now()
+        for user in users:
+            user.updated_at = now
+        if users:
+            User = get_user_model()
+            User.objects.bulk_create(users, batch_size=batch_size)
+            # primary keys not set by `bulk_create` are looked up by username with a single query
+            missing = [user.get_username() for user in users if user.pk is None]
+            if missing:
+                pks = dict(User._base_manager.filter(**{User.USERNAME_FIELD + '__in': missing}).values_list(
+                    User.USERNAME_FIELD, 'pk'))
+                for user in users:
+                    if user.pk is None:
+                        user.pk = pks[user.get_username()]
+            # signals are not sent for bulk created users
+            record([make_create_entry(user) for user in users])
+            publish_created(users)
+    if users:
+        invalidate_creators()
+    finished = time.time()
+    stats = {
+        'users': users,
+        'created': len(users),
+        'processes': pool.processes,
+        'hash_seconds': hashed - started,
+        'insert_seconds': finished - hashed,
+        'users_per_second': len(users) / max(finished - started, 1e-6),
+    }
+    logger.info('created %(created)d users with %(processes)d processes in %(hash_seconds).2fs of hashing '
+                'and %(insert_seconds).2fs of inserting (%(users_per_second).0f users/s)', stats)
+    return stats
@@ -2,15 +2,33 @@ from django.contrib.auth import get_user_model
 
 from social.exceptions import SocialAuthBaseException
 
+from .metrics import LOAD_USER_DURATION
 
+
+def get_users_by_email(emails):
+    """
+    Resolves users by email (case insensitive) with a single query. Users are not cached, login
+    needs the current password hash and active flag so the row is read anyway. If more users
+    share an email the first one created wins.
+    :param emails: list of emails
+    :return: dict of lowercased email and accounts.User object, unknown emails are left out
+    """
+    emails = set(email.lower() for email in emails if email)
+    if not emails:
+        return {}
+    return dict((user.email_lower, user) for user in
+                get_user_model().objects.filter(email_lower__in=emails).order_by('-pk'))
+
+
+@LOAD_USER_DURATION.time()
 def load_user(*args, **kwargs):
     user = None
     response = kwargs.get('response', {})
     if response:
-        emails = response.get('emails', [])
+        emails = [email['value'] for email in response.get('emails', []) if email['type'] == 'account']
+        users = get_users_by_email(emails)
         for email in emails:
-            if email['type'] == 'account':
-                user = get_user_model().objects.filter(email__iexact=email['value']).first()
-                if not user:
-                    raise SocialAuthBaseException('User account does not exist.')
+            user = users.get(email.lower())
+            if not user:
+                raise SocialAuthBaseException('User account does not exist.')
     return {'user': user, 'uid': user.id if user else None}
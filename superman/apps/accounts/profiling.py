@@ -0,0 +1,207 @@
+import cProfile
+import io
+import json
+import marshal
+import os
+import pstats
+import re
+import stat
+import time
+import uuid
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured, MiddlewareNotUsed
+from django.utils import timezone
+
+from .queries import QueryBudget
+
+
+# request is profiled when it has this query parameter or header
+PROFILE_VAR = '_profile'
+PROFILE_HEADER = 'HTTP_X_PROFILE'
+PROFILE_ID_RE = re.compile(r'^[0-9]{20}-[0-9a-f]{8}$')
+SORT_KEYS = ('cumulative', 'tottime', 'ncalls')
+
+
+class ProfileNotFound(LookupError):
+    pass
+
+
+def get_path(profile_id, extension):
+    return os.path.join(settings.PROFILING_DIR, '%s.%s' % (profile_id, extension))
+
+
+def get_profile_ids():
+    """
+    Ids of stored profiles, newest first
+    """
+    try:
+        names = os.listdir(settings.PROFILING_DIR)
+    except FileNotFoundError:
+        return []
+    ids = [name[:-len('.json')] for name in names if name.endswith('.json')]
+    return sorted((profile_id for profile_id in ids if PROFILE_ID_RE.match(profile_id)), reverse=True)
+
+
+def ensure_private_dir(path):
+    """
+    Creates directory `path` readable only by its owner. Existing directory must be owned by the
+    current user, it's made private if it's not.
+    :raise ImproperlyConfigured: when `path` is not a directory of the current user
+    """
+    try:
+        os.mkdir(path, 0o700)
+    except FileExistsError:
+        pass
+    info = os.lstat(path)
+    if not stat.S_ISDIR(info.st_mode) or info.st_uid != os.getuid():
+        raise ImproperlyConfigured('PROFILING_DIR %s must be a directory of the current user.' % path)
+    if stat.S_IMODE(info.st_mode) & 0o077:
+        os.chmod(path, 0o700)
+
+
+def open_private(path, mode='wb', **kwargs):
+    """
+    Opens a new file `path` readable and writable only by its owner
+    """
+    return io.open(os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600), mode, **kwargs)
+
+
+def save_profile(profiler, info):
+    """
+    Writes `pstats` dump of `profiler` and JSON of `info` (request, SQL queries) and removes the
+    oldest profiles over `PROFILING_MAX_DUMPS`. Profiles contain SQL with users' data, so they are
+    readable only by the user running the server.
+    :return: id of the profile, ids are sorted by time
+    """
+    ensure_private_dir(settings.PROFILING_DIR)
+    profile_id = '%s-%s' % (timezone.now().strftime('%Y%m%d%H%M%S%f'), uuid.uuid4().hex[:8])
+    info = dict(info, id=profile_id)
+    # what `Profile.dump_stats` writes
+    profiler.create_stats()
+    with open_private(get_path(profile_id, 'prof')) as fp:
+        marshal.dump(profiler.stats, fp)
+    # JSON is written last and atomically, listed profiles are complete
+    tmp_path = get_path(profile_id, 'json.tmp')
+    with open_private(tmp_path, 'w', encoding='utf-8') as fp:
+        json.dump(info, fp)
+    os.replace(tmp_path, get_path(profile_id, 'json'))
+    for old_id in get_profile_ids()[settings.PROFILING_MAX_DUMPS:]:
+        for extension in ('json', 'prof'):
+            try:
+                os.remove(get_path(old_id, extension))
+            except FileNotFoundError:
+                # removed by another process
+                pass
+    return profile_id
+
+
+def load_profile(profile_id):
+    """
+    :return: dict of request and SQL queries of the profile
+    """
+    if not PROFILE_ID_RE.match(profile_id):
+        raise ProfileNotFound(profile_id)
+    try:
+        with io.open(get_path(profile_id, 'json'), encoding='utf-8') as fp:
+            return json.load(fp)
+    except FileNotFoundError:
+        raise ProfileNotFound(profile_id)
+
+
+def list_profiles():
+    profiles = []
+    for profile_id in get_profile_ids():
+        try:
+            profile = load_profile(profile_id)
+        except ProfileNotFound:
+            continue
+        # queries are shown only in detail
+        profile.pop('queries', None)
+        profiles.append(profile)
+    return profiles
+
+
+def get_top_functions(profile_id, sort='cumulative', limit=50):
+    """
+    Functions of the profile with the highest `sort` key
+    :return: list of dicts with `function`, `ncalls`, `primitive_calls`, `tottime` and `cumtime`
+    """
+    try:
+        stats = pstats.Stats(get_path(profile_id, 'prof'), stream=io.StringIO())
+    except FileNotFoundError:
+        raise ProfileNotFound(profile_id)
+    key = {'cumulative': 4, 'tottime': 3, 'ncalls': 1}[sort]
+    rows = [(pstats.func_std_string(func), ncalls, primitive_calls, tottime, cumtime)
+            for func, (primitive_calls, ncalls, tottime, cumtime, callers) in stats.stats.items()]
+    rows.sort(key=lambda row: row[key], reverse=True)
+    return [{'function': function, 'ncalls': ncalls, 'primitive_calls': primitive_calls,
+             'tottime': tottime, 'cumtime': cumtime}
+            for function, ncalls, primitive_calls, tottime, cumtime in rows[:limit]]
+
+
+def get_top_queries(queries, limit=50):
+    """
+    Statements of the profile by total time, identical statements repeated by N+1 loops are summed
+    :return: list of dicts with `sql`, `alias`, `count` and `time` in seconds
+    """
+    grouped = {}
+    for query in queries:
+        key = (query['alias'], query['sql'])
+        group = grouped.setdefault(key, {'sql': query['sql'], 'alias': query['alias'], 'count': 0,
+                                         'time': 0.0})
+        group['count'] += 1
+        group['time'] += query['time']
+    groups = sorted(grouped.values(), key=lambda group: (group['time'], group['count']), reverse=True)
+    return groups[:limit]
+
+
+def is_triggered(request):
+    return PROFILE_HEADER in request.META or PROFILE_VAR in request.GET
+
+
+class ProfilingMiddleware(object):
+    """
+    Profiles requests of superusers with `_profile` query parameter or `X-Profile` header with
+    cProfile and records their SQL queries, the dump is stored in `PROFILING_DIR` and browsed in
+    `Profiles` admin page. Other requests only pay for checking the parameter. Enabled by
+    `PROFILING_ENABLED` setting. Streamed content is not profiled.
+    """
+    def __init__(self, get_response):
+        if not getattr(settings, 'PROFILING_ENABLED', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not is_triggered(request):
+            return self.get_response(request)
+        user = getattr(request, 'user', None)
+        if user is None or not user.is_superuser:
+            return self.get_response(request)
+        return self.profile(request)
+
+    def profile(self, request):
+        profiler = cProfile.Profile()
+        with QueryBudget() as budget:
+            started_at = timezone.now()
+            started = time.time()
+            profiler.enable()
+            try:
+                response = self.get_response(request)
+            finally:
+                profiler.disable()
+            duration = time.time() - started
+        queries = [{'alias': query['alias'], 'sql': query['sql'], 'time': float(query['time'])}
+                   for query in budget.captured_queries]
+        response['X-Profile-Id'] = save_profile(profiler, {
+            'method': request.method,
+            'path': request.get_full_path(),
+            'status': response.status_code,
+            'user': request.user.get_username(),
+            'started_at': started_at.isoformat(),
+            'duration': duration,
+            'query_count': len(queries),
+            'query_time': sum(query['time'] for query in queries),
+            'queries': queries,
+        })
+        return response
@@ -0,0 +1,191 @@
+import logging
+import time
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.test.utils import CaptureQueriesContext
+
+
+logger = logging.getLogger(__name__)
+
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+
+class QueryBudget(object):
+    """
+    Context manager recording number and time of SQL queries run inside of it on all databases
+    (primary and replicas) or only on `using` one, optionally enforcing a budget of `max_queries`:
+
+        with QueryBudget(max_queries=5, name='export') as budget:
+            ...
+        budget.count, budget.time
+
+    Exceeded budget is logged as a warning or raised as `QueryBudgetExceeded` with `raise_exception`.
+    """
+    def __init__(self, max_queries=None, name=None, raise_exception=False, using=None):
+        aliases = [using] if using else list(connections)
+        self.contexts = [(alias, CaptureQueriesContext(connections[alias])) for alias in aliases]
+        self.max_queries = max_queries
+        self.name = name
+        self.raise_exception = raise_exception
+        self.started = None
+        self.duration = None
+
+    def __enter__(self):
+        self.started = time.time()
+        for alias, context in self.contexts:
+            context.__enter__()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        for alias, context in reversed(self.contexts):
+            context.__exit__(exc_type, exc_value, traceback)
+        self.duration = time.time() - self.started
+        if exc_type is None and self.exceeded:
+            message = '%s ran %d queries, budget is %d' % (self.name or 'Block', self.count, self.max_queries)
+            if self.raise_exception:
+                raise QueryBudgetExceeded(message)
+            logger.warning(message, extra={'queries': self.captured_queries})
+
+    def __len__(self):
+        return sum(len(context) for alias, context in self.contexts)
+
+    @property
+    def captured_queries(self):
+        """
+        Queries of all recorded databases with `alias` of their database
+        """
+        return [dict(query, alias=alias) for alias, context in self.contexts
+                for query in context.captured_queries]
+
+    @property
+    def count(self):
+        return len(self)
+
+    @property
+    def time(self):
+        """
+        Time spent in SQL queries in seconds
+        """
+        return sum(float(query['time']) for query in self.captured_queries)
+
+    @property
+    def exceeded(self):
+        return self.max_queries is not None and self.count > self.max_queries
+
+
+class CountingCursorWrapper(object):
+    """
+    Cursor adding number and time of executed statements to `QueryCounter`
+    """
+    def __init__(self, cursor, counter):
+        self.cursor = cursor
+        self.counter = counter
+
+    def __getattr__(self, name):
+        return getattr(self.cursor, name)
+
+    def __iter__(self):
+        return iter(self.cursor)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return self.cursor.__exit__(exc_type, exc_value, traceback)
+
+    def _run(self, method, *args):
+        started = time.time()
+        try:
+            return method(*args)
+        finally:
+            self.counter.count += 1
+            self.counter.time += time.time() - started
+
+    def execute(self, sql, params=None):
+        return self._run(self.cursor.execute, sql, params)
+
+    def executemany(self, sql, param_list):
+        return self._run(self.cursor.executemany, sql, param_list)
+
+
+class QueryCounter(object):
+    """
+    Running number and time of SQL queries of a connection, unlike `QueryBudget` queries are not
+    recorded and debug cursor is not forced, so it's cheap enough for every request. Connections
+    are local to a thread, so are their counters. Compare snapshots of `count` and `time`:
+
+        counter = QueryCounter.get(connections['default'])
+        count = counter.count
+        ...
+        counter.count - count
+    """
+    def __init__(self):
+        self.count = 0
+        self.time = 0.0
+
+    @classmethod
+    def get(cls, connection):
+        """
+        Counter of `connection`, its cursors are wrapped on the first call
+        """
+        counter = connection.__dict__.get('_query_counter')
+        if counter is None:
+            counter = connection._query_counter = cls()
+            make_cursor, make_debug_cursor = connection.make_cursor, connection.make_debug_cursor
+            connection.make_cursor = lambda cursor: CountingCursorWrapper(make_cursor(cursor), counter)
+            connection.make_debug_cursor = lambda cursor: CountingCursorWrapper(
+                make_debug_cursor(cursor), counter)
+        return counter
+
+
+class QueryBudgetMiddleware(object):
+    """
+    Records SQL queries of every request and checks them against per view budgets of
+    `QUERY_BUDGETS` setting, a dict of url names (e.g. `admin:accounts_user_changelist`) or
+    dotted view paths to max number of queries, `QUERY_BUDGET_DEFAULT` applies to other views.
+    In DEBUG responses are annotated with `X-Query-Count`, `X-Query-Time` (ms) and `X-Query-Budget`
+    headers. Exceeded budget is only logged, the view has already committed its changes; tests
+    fail on it with `QueryBudgetTestMixin.assertWithinBudget` of `response.query_budget`.
+    Enabled by `QUERY_BUDGET_ENABLED` setting, recording queries has overhead.
+    """
+    def __init__(self, get_response):
+        if not getattr(settings, 'QUERY_BUDGET_ENABLED', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        # view is resolved only while response is processed, budget is checked afterwards
+        budget = QueryBudget()
+        with budget:
+            response = self.get_response(request)
+        budget.name = self.get_view_name(request)
+        budget.max_queries = self.get_budget(budget.name, request)
+        if budget.exceeded:
+            message = '%s %s ran %d queries, budget of %s is %d' % (
+                request.method, request.path, budget.count, budget.name, budget.max_queries)
+            logger.warning(message, extra={'request': request, 'queries': budget.captured_queries})
+        response.query_budget = budget
+        if settings.DEBUG:
+            response['X-Query-Count'] = str(budget.count)
+            response['X-Query-Time'] = '%.3f' % (budget.time * 1000)
+            if budget.max_queries is not None:
+                response['X-Query-Budget'] = str(budget.max_queries)
+        return response
+
+    def get_view_name(self, request):
+        match = getattr(request, 'resolver_match', None)
+        if match is None:
+            return None
+        return match.view_name
+
+    def get_budget(self, view_name, request):
+        budgets = getattr(settings, 'QUERY_BUDGETS', {})
+        match = getattr(request, 'resolver_match', None)
+        for key in (view_name, match and match._func_path):
+            if key and key in budgets:
+                return budgets[key]
+        return getattr(settings, 'QUERY_BUDGET_DEFAULT', None)
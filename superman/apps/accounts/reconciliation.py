@@ -0,0 +1,57 @@
+from collections import namedtuple
+
+from django.contrib import admin
+from django.contrib.auth import get_user_model
+from django.http import HttpRequest
+
+from .iban import BatchIBANValidator, normalize_iban
+from .utils import chunked
+
+
+RECONCILE_CHUNK_SIZE = 1000
+
+MATCHED = 'matched'
+UNMATCHED = 'unmatched'
+INVALID = 'invalid'
+
+# `iban` as it was given, `normalized` IBAN, one of statuses above, matched `user` and validation `error`
+ReconciledIBAN = namedtuple('ReconciledIBAN', ['iban', 'normalized', 'status', 'user', 'error'])
+
+
+def get_scope(user):
+    """
+    Users `user` can manage in the admin, all users for superusers and users in
+    `created_by` scope for other administrators
+    """
+    request = HttpRequest()
+    request.user = user
+    return admin.site._registry[get_user_model()].get_queryset(request)
+
+
+def reconcile_ibans(ibans, queryset, chunk_size=RECONCILE_CHUNK_SIZE, fields=('username', )):
+    """
+    Matches IBANs e.g. from a bank statement against users of `queryset`. IBANs are consumed lazily,
+    each chunk is validated at once and resolved with a single `iban__in` query using unique index.
+    :param ibans: iterable of IBANs, normalized or not
+    :param queryset: users to match against, e.g. `get_scope(user)`
+    :param chunk_size: number of IBANs resolved by a single query
+    :param fields: user fields to load besides primary key and IBAN
+    :return: generator of `ReconciledIBAN` in the same order as `ibans`
+    """
+    validator = BatchIBANValidator.for_field(get_user_model()._meta.get_field('iban'))
+    queryset = queryset.order_by().only('pk', 'iban', *fields)
+    for chunk in chunked(ibans, chunk_size):
+        normalized = [normalize_iban(iban) or None for iban in chunk]
+        errors = validator.validate(normalized)
+        valid = set(iban for iban, error in zip(normalized, errors) if iban and error is None)
+        users = {}
+        if valid:
+            users = dict((user.iban, user) for user in queryset.filter(iban__in=valid))
+        for iban, normalized_iban, error in zip(chunk, normalized, errors):
+            if not normalized_iban or error is not None:
+                yield ReconciledIBAN(iban, normalized_iban, INVALID, None,
+                                     ' '.join(error.messages) if error else 'IBAN is missing.')
+            elif normalized_iban in users:
+                yield ReconciledIBAN(iban, normalized_iban, MATCHED, users[normalized_iban], None)
+            else:
+                yield ReconciledIBAN(iban, normalized_iban, UNMATCHED, None, None)
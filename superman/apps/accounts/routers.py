@@ -0,0 +1,111 @@
+import random
+import threading
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import DEFAULT_DB_ALIAS, connections
+
+
+# cookie of clients who wrote recently, their reads go to the primary until it expires
+STICKY_COOKIE = 'primary_db'
+
+_local = threading.local()
+
+
+def is_pinned():
+    """
+    Reads of current thread go to the primary, either because it's pinned or it's in a transaction
+    """
+    return getattr(_local, 'pinned', False) or connections[DEFAULT_DB_ALIAS].in_atomic_block
+
+
+def set_pinned(pinned):
+    _local.pinned = pinned
+
+
+def has_written():
+    return getattr(_local, 'written', False)
+
+
+def reset():
+    _local.pinned = False
+    _local.written = False
+    _local.replica = None
+
+
+def get_replica():
+    """
+    Replica serving reads of the thread until `reset`, i.e. for the whole request with
+    `ReplicaMiddleware`, so a request reads a single replica and opens a single connection
+    """
+    replica = getattr(_local, 'replica', None)
+    if replica not in settings.DATABASE_REPLICAS:
+        replica = _local.replica = random.choice(settings.DATABASE_REPLICAS)
+    return replica
+
+
+@contextmanager
+def use_primary():
+    """
+    Sends all reads of the block to the primary:
+
+        with use_primary():
+            user = User.objects.get(pk=pk)
+    """
+    pinned = getattr(_local, 'pinned', False)
+    _local.pinned = True
+    try:
+        yield
+    finally:
+        _local.pinned = pinned
+
+
+class ReplicaRouter(object):
+    """
+    Sends writes to the primary `default` database and reads to a replica of `DATABASE_REPLICAS`
+    chosen at random for every request (or thread). After a write, reads of the thread go to the
+    primary as well, so replication lag never hides the write from the code which made it.
+    """
+    def db_for_read(self, model, **hints):
+        replicas = settings.DATABASE_REPLICAS
+        if not replicas or is_pinned():
+            return DEFAULT_DB_ALIAS
+        return get_replica()
+
+    def db_for_write(self, model, **hints):
+        _local.written = True
+        _local.pinned = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # replicas hold the same data as the primary
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db not in settings.DATABASE_REPLICAS
+
+
+class ReplicaMiddleware(object):
+    """
+    Keeps clients reading from the primary for `REPLICA_STICKY_SECONDS` after they wrote,
+    so e.g. an administrator who saved a user in the admin sees the change on the next page.
+    Unsafe requests (POST etc.) read from the primary too. Not used without replicas.
+    """
+    def __init__(self, get_response):
+        if not settings.DATABASE_REPLICAS:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        reset()
+        if STICKY_COOKIE in request.COOKIES or request.method not in ('GET', 'HEAD', 'OPTIONS', 'TRACE'):
+            set_pinned(True)
+        try:
+            response = self.get_response(request)
+            if has_written() and settings.REPLICA_STICKY_SECONDS:
+                response.set_cookie(STICKY_COOKIE, '1', max_age=settings.REPLICA_STICKY_SECONDS,
+                                    httponly=True)
+            return response
+        finally:
+            reset()
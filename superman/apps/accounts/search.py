@@ -0,0 +1,63 @@
+from django.db import models
+from django.db.models import Case, Q, Value, When
+
+from .iban import normalize_iban
+
+
+# shorter terms give too few trigrams to be selective, they only match beginnings of values
+SEARCH_MIN_LENGTH = 3
+
+# rank of search results, lower is better
+RANK_EXACT = 0
+RANK_PREFIX = 1
+RANK_CONTAINS = 2
+
+
+def search_filter(term):
+    """
+    Condition matching users whose username, first or last name, email or IBAN contains `term`.
+    Every lookup is served by a trigram GIN index on PostgreSQL (see migration `0008_search_indexes`):
+    names are matched case insensitively on `UPPER(column)`, email on already lowercased `email_lower`
+    and IBAN on its normalized form it is stored in.
+    """
+    lookup = 'contains' if len(term) >= SEARCH_MIN_LENGTH else 'startswith'
+    q = (Q(**{'username__i%s' % lookup: term}) |
+         Q(**{'first_name__i%s' % lookup: term}) |
+         Q(**{'last_name__i%s' % lookup: term}) |
+         Q(**{'email_lower__%s' % lookup: term.lower()}))
+    iban = normalize_iban(term)
+    if iban:
+        q |= Q(**{'iban__%s' % lookup: iban})
+    return q
+
+
+def search_rank(query):
+    """
+    Expression ranking exact matches of the whole query first, then users whose username or
+    names start with it, then the other matches
+    """
+    query = query.strip()
+    return Case(
+        When(Q(username__iexact=query) | Q(email_lower=query.lower()) | Q(iban=normalize_iban(query)),
+             then=Value(RANK_EXACT)),
+        When(Q(username__istartswith=query) | Q(first_name__istartswith=query) |
+             Q(last_name__istartswith=query), then=Value(RANK_PREFIX)),
+        default=Value(RANK_CONTAINS),
+        output_field=models.IntegerField(),
+    )
+
+
+def search_users(queryset, query, rank=True):
+    """
+    Users of `queryset` matching all whitespace separated terms of `query`
+    :param rank: order best matches first, existing ordering of `queryset` breaks ties
+    """
+    terms = query.split()
+    if not terms:
+        return queryset
+    for term in terms:
+        queryset = queryset.filter(search_filter(term))
+    if not rank:
+        return queryset
+    ordering = queryset.query.order_by or queryset.model._meta.ordering
+    return queryset.annotate(search_rank=search_rank(query)).order_by('search_rank', *ordering)
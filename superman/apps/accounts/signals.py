@@ -0,0 +1,133 @@
+from django.db.models.functions import Substr
+from django.db.models.signals import post_delete
+
+from .audit import (
+    AUDIT_FIELDS, AUDIT_M2M_FIELDS, diff, get_original_values, make_create_entry, make_entry, record)
+from .cache import invalidate_creators
+from .context_processors import get_backend_names
+from .models import AuditEntry, User, UserTombstone
+from .outbox import get_event_values, get_events, publish
+
+
+# creators are listed with these fields, changing them invalidates cached creators
+CREATOR_FIELDS = {'created_by', 'username', 'first_name', 'last_name'}
+# deletion is recorded by audit log and tombstones with these fields
+DELETED_USER_FIELDS = ('username', 'owner_path') + AUDIT_FIELDS
+
+
+def remember_original_values(sender, instance, **kwargs):
+    # deferred fields are not loaded just to remember them
+    instance._original_created_by_id = instance.__dict__.get('created_by_id')
+    instance._original_audit_values = get_original_values(instance)
+    instance._original_event_values = get_event_values(instance)
+
+
+def invalidate_creators_cache(sender, instance, created=False, update_fields=None, **kwargs):
+    """
+    Saved user could become a creator, stop being one or be renamed. Deleted user could be
+    either and their users are detached without signals.
+    """
+    if kwargs.get('signal') is post_delete:
+        invalidate_creators()
+    elif created:
+        if instance.created_by_id:
+            invalidate_creators()
+    elif update_fields is None or CREATOR_FIELDS.intersection(update_fields):
+        invalidate_creators()
+
+
+def load_deleted_user_fields(sender, instance, using=None, **kwargs):
+    """
+    Users deleted by admin actions come from the changelist which loads only displayed columns,
+    fields recording the deletion are loaded from database while the user still exists
+    """
+    deferred = instance.get_deferred_fields()
+    fields = [name for name in DELETED_USER_FIELDS if sender._meta.get_field(name).attname in deferred]
+    if fields:
+        instance.refresh_from_db(using=using, fields=fields)
+
+
+def detach_owned_users(sender, instance, **kwargs):
+    """
+    Owned users of deleted user become roots (`created_by` is set to NULL), so the deleted
+    user's path is stripped from the whole subtree. Path is read from database as it may have
+    been changed by deletion of an ancestor in the same delete.
+    """
+    path = sender._base_manager.filter(pk=instance.pk).values_list('owner_path', flat=True).first()
+    if path is None:
+        return
+    subtree_path = '%s%s/' % (path, instance.pk)
+    sender._default_manager.filter(owner_path__startswith=subtree_path).update(
+        owner_path=Substr('owner_path', len(subtree_path) + 1))
+
+
+def clear_backend_names(setting, **kwargs):
+    if setting == 'AUTHENTICATION_BACKENDS':
+        get_backend_names.cache_clear()
+
+
+def audit_user_saved(sender, instance, created=False, using=None, **kwargs):
+    values = get_original_values(instance)
+    if created:
+        entry = make_create_entry(instance)
+    else:
+        changes = diff(getattr(instance, '_original_audit_values', {}), instance)
+        entry = changes and make_entry(instance.pk, instance.get_username(), AuditEntry.UPDATE, changes)
+    instance._original_audit_values = values
+    if entry:
+        record([entry], using=using)
+
+
+def audit_user_deleted(sender, instance, using=None, **kwargs):
+    changes = dict((name, [value, None]) for name, value in get_original_values(instance).items())
+    record([make_entry(instance.pk, instance.get_username(), AuditEntry.DELETE, changes)], using=using)
+
+
+def audit_m2m_changed(sender, instance, action, reverse, model, pk_set, using=None, **kwargs):
+    """
+    Groups and permissions added to or removed from users, from either side of the relation
+    """
+    name = next(name for name in AUDIT_M2M_FIELDS if getattr(User, name).through is sender)
+    if action == 'pre_clear':
+        # cleared objects are not known after clear
+        if reverse:
+            instance._audit_cleared = set(User._base_manager.using(using).filter(
+                **{name: instance}).values_list('pk', flat=True))
+        else:
+            instance._audit_cleared = set(getattr(instance, name).values_list('pk', flat=True))
+        return
+    if action == 'post_clear':
+        pk_set = getattr(instance, '_audit_cleared', set())
+    elif action not in ('post_add', 'post_remove'):
+        return
+    if not pk_set:
+        return
+    change = 'added' if action == 'post_add' else 'removed'
+    if reverse:
+        users = User._base_manager.using(using).filter(pk__in=pk_set).values_list('pk', User.USERNAME_FIELD)
+        entries = [make_entry(pk, username, AuditEntry.UPDATE, {name: {change: [instance.pk]}})
+                   for pk, username in users]
+    else:
+        entries = [make_entry(instance.pk, instance.get_username(), AuditEntry.UPDATE,
+                              {name: {change: sorted(pk_set)}})]
+    record(entries, using=using)
+
+
+def create_tombstone(sender, instance, **kwargs):
+    """
+    Deleted users are reported by incremental sync, tombstone is written in the same transaction
+    """
+    UserTombstone.objects.create(user_id=instance.pk, username=instance.get_username(),
+                                 created_by_id=instance.__dict__.get('created_by_id'),
+                                 owner_path=instance.__dict__.get('owner_path') or '')
+
+
+def publish_user_events(sender, instance, created=False, using=None, **kwargs):
+    """
+    Events of created, deactivated users and changed IBANs are written to the outbox in the
+    transaction saving the user
+    """
+    values = get_event_values(instance)
+    events = get_events(getattr(instance, '_original_event_values', {}), values, created)
+    instance._original_event_values = values
+    publish([(event, values) for event in events], using=using)
@@ -0,0 +1,113 @@
+import datetime
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .changelist import decode_cursor, encode_cursor
+from .models import UserTombstone
+
+
+SYNC_BATCH_SIZE = 1000
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def scoped_tombstones(user):
+    """
+    Deleted users `user` could see in the admin, same rules as `UserAdmin.get_queryset`
+    """
+    qs = UserTombstone.objects.all()
+    if user.is_superuser:
+        return qs
+    if settings.ADMIN_SUBTREE_SCOPE:
+        return qs.filter(owner_path__startswith=user.subtree_path)
+    return qs.filter(created_by_id=user.pk)
+
+
+def _format(value):
+    return value.isoformat() if value is not None else None
+
+
+def parse_cursor(cursor):
+    """
+    :return: [users updated_at, users pk, tombstones deleted_at, tombstones pk], missing
+        positions are `None`, empty cursor starts from the beginning
+    """
+    if not cursor:
+        return [None, None, None, None]
+    try:
+        position = decode_cursor(cursor)
+        updated_at, user_pk, deleted_at, tombstone_pk = position
+        position = [updated_at and parse_datetime(updated_at), user_pk,
+                    deleted_at and parse_datetime(deleted_at), tombstone_pk]
+    except Exception:
+        raise InvalidCursor('Invalid cursor.')
+    return position
+
+
+def make_cursor(position):
+    updated_at, user_pk, deleted_at, tombstone_pk = position
+    return encode_cursor([_format(updated_at), user_pk, _format(deleted_at), tombstone_pk])
+
+
+def _after(queryset, field, timestamp, pk):
+    # keyset condition served by (timestamp, id) index
+    if timestamp is None:
+        return queryset
+    return queryset.filter(Q(**{'%s__gt' % field: timestamp}) | Q(**{field: timestamp, 'pk__gt': pk}))
+
+
+def get_changes(users, tombstones, fields, cursor=None, limit=SYNC_BATCH_SIZE):
+    """
+    Users changed and deleted after `cursor`, oldest change first. Only rows older than
+    `SYNC_LAG_SECONDS` are returned, so changes of transactions still in flight when a batch
+    is read are not skipped. Cost of a batch depends on `limit`, not on size of the table.
+    :param users: scoped users, e.g. `UserAdmin.get_queryset`
+    :param tombstones: scoped tombstones, e.g. `scoped_tombstones`
+    :param fields: user fields of changed rows, `id` and `updated_at` are always included
+    :param cursor: opaque cursor returned by the previous call, `None` to start from the beginning
+    :return: (list of rows, next cursor, True if there are more changes), deleted users are
+        `{'id': pk, 'deleted': True, 'updated_at': deleted at}`
+    :raise InvalidCursor:
+    """
+    updated_at, user_pk, deleted_at, tombstone_pk = parse_cursor(cursor)
+    until = timezone.now() - datetime.timedelta(seconds=settings.SYNC_LAG_SECONDS)
+    fields = [name for name in fields if name not in ('id', 'updated_at')]
+
+    users = _after(users.filter(updated_at__lt=until), 'updated_at', updated_at, user_pk)
+    users = users.order_by('updated_at', 'pk').values_list('updated_at', 'pk', *fields)[:limit + 1]
+    tombstones = _after(tombstones.filter(deleted_at__lt=until), 'deleted_at', deleted_at, tombstone_pk)
+    tombstones = tombstones.order_by('deleted_at', 'pk').values_list(
+        'deleted_at', 'pk', 'user_id')[:limit + 1]
+
+    # both streams are merged by time, a batch takes the oldest `limit` changes of both
+    changes = sorted([(row[0], 0, row) for row in users] + [(row[0], 1, row) for row in tombstones],
+                     key=lambda change: change[:2])
+    has_more = len(changes) > limit
+    rows = []
+    for timestamp, deleted, row in changes[:limit]:
+        if deleted:
+            deleted_at, tombstone_pk = row[:2]
+            rows.append({'id': row[2], 'deleted': True, 'updated_at': timestamp})
+        else:
+            updated_at, user_pk = row[:2]
+            data = dict(zip(fields, row[2:]))
+            data.update(id=user_pk, deleted=False, updated_at=timestamp)
+            rows.append(data)
+    return rows, make_cursor([updated_at, user_pk, deleted_at, tombstone_pk]), has_more
+
+
+def iter_changes(users, tombstones, fields, cursor=None, batch_size=SYNC_BATCH_SIZE):
+    """
+    All changes after `cursor` in batches of `batch_size`
+    :return: generator of (rows, cursor after the rows) tuples
+    """
+    while True:
+        rows, cursor, has_more = get_changes(users, tombstones, fields, cursor, batch_size)
+        yield rows, cursor
+        if not has_more:
+            return
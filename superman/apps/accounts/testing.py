@@ -0,0 +1,61 @@
+from .queries import QueryBudget
+
+
+def format_queries(queries):
+    return '\n'.join('%d. %s' % (i, query['sql']) for i, query in enumerate(queries, start=1))
+
+
+class _AssertMaxQueriesContext(QueryBudget):
+    def __init__(self, test_case, num, using):
+        super(_AssertMaxQueriesContext, self).__init__(using=using)
+        self.test_case = test_case
+        self.num = num
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        super(_AssertMaxQueriesContext, self).__exit__(exc_type, exc_value, traceback)
+        if exc_type is None:
+            self.test_case.assertLessEqual(
+                self.count, self.num,
+                '%d queries executed, at most %d expected\nCaptured queries were:\n%s' % (
+                    self.count, self.num, format_queries(self.captured_queries)))
+
+
+class QueryBudgetTestMixin(object):
+    """
+    TestCase mixin with assertions guarding against N+1 queries
+    """
+    def assertMaxQueries(self, num, using='default'):
+        """
+        Fails when block runs more than `num` queries:
+
+            with self.assertMaxQueries(5):
+                self.client.get(url)
+        """
+        return _AssertMaxQueriesContext(self, num, using)
+
+    def assertWithinBudget(self, response):
+        """
+        Fails when the view of `response` exceeded its budget of `QUERY_BUDGETS` setting, needs
+        `QueryBudgetMiddleware` enabled
+        """
+        budget = response.query_budget
+        if budget.exceeded:
+            self.fail('%s ran %d queries, budget is %d\nCaptured queries were:\n%s' % (
+                budget.name, budget.count, budget.max_queries, format_queries(budget.captured_queries)))
+
+    def assertConstantQueries(self, func, grow, using='default'):
+        """
+        Calls `func`, then `grow` which adds more rows and `func` again, both calls of `func`
+        must run the same number of queries
+        :return: number of queries
+        """
+        with QueryBudget(using=using) as before:
+            func()
+        grow()
+        with QueryBudget(using=using) as after:
+            func()
+        self.assertEqual(
+            after.count, before.count,
+            '%d queries executed after adding rows, %d before\nCaptured queries were:\n%s' % (
+                after.count, before.count, format_queries(after.captured_queries)))
+        return before.count
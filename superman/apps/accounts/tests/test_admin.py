@@ -1,10 +1,18 @@
+import json
+
+from unittest.mock import patch
+
 from django.contrib.admin.sites import AdminSite
-from django.test import TestCase
+from django.core.urlresolvers import reverse
+from django.test import TestCase, RequestFactory, override_settings
 from django.contrib.auth import get_user_model
 from django.contrib.auth.models import Permission
 from django.contrib.contenttypes.models import ContentType
 
 from ..admin import UserAdmin
+from ..cache import get_cache, get_creators
+from ..filters import CreatedByFilter
+from ..testing import QueryBudgetTestMixin
 
 
 class MockRequest(object):
@@ -94,7 +102,7 @@ class UserAdminTest(TestCase):
         request.user = self.super_user
         list_filter = ma.get_list_filter(request)
         self.assertEqual(list_filter, ('is_staff', 'is_superuser', 'is_active',
-                                       'date_joined', 'created_by'))
+                                       'date_joined', CreatedByFilter))
 
         # for staff user
         request.user = self.staff_user_1
@@ -168,3 +176,311 @@ class UserAdminTest(TestCase):
         request.user = self.staff_user_1
         has_permission = ma.has_delete_permission(request, self.test_user_2)
         self.assertFalse(has_permission)
+
+    def test_export(self):
+        ma = UserAdmin(self.User, self.site)
+        self.test_user_1.iban = 'DE44500105175407324931'
+        self.test_user_1.save()
+
+        # superuser exports all columns including creator's username
+        request.user = self.super_user
+        response = ma.export_csv(request, ma.get_queryset(request))
+        self.assertEqual(response['Content-Disposition'], 'attachment; filename="users.csv"')
+        lines = b''.join(response.streaming_content).decode('utf-8').splitlines()
+        self.assertEqual(lines[0], 'username,first_name,last_name,iban,is_staff,is_superuser,is_active,created_by')
+        self.assertEqual(len(lines), 6)
+        self.assertIn('test1,,,DE44500105175407324931,False,False,True,staff1', lines)
+
+        # staff user only exports users created by him and restricted columns
+        request.user = self.staff_user_1
+        response = ma.export_jsonl(request, ma.get_queryset(request))
+        rows = [json.loads(line) for line in b''.join(response.streaming_content).decode('utf-8').splitlines()]
+        self.assertEqual(rows, [{'username': 'test1', 'first_name': '', 'last_name': '',
+                                 'iban': 'DE44500105175407324931', 'is_active': True}])
+
+
+class UserChangeListTest(QueryBudgetTestMixin, TestCase):
+    def setUp(self):
+        super(UserChangeListTest, self).setUp()
+        self.User = get_user_model()
+        self.super_user = self.User.objects.create(username='admin', is_superuser=True, is_staff=True)
+        self.staff_user = self.User.objects.create(username='staff', is_staff=True)
+        content_type = ContentType.objects.get_for_model(self.User)
+        self.staff_user.user_permissions.add(
+            Permission.objects.get(codename='change_user', content_type__id=content_type.id))
+        for i in range(10):
+            self.User.objects.create(username='test%02d' % i, first_name='Test', created_by=self.staff_user)
+        self.url = reverse('admin:accounts_user_changelist')
+
+    def test_only_displayed_columns_are_loaded(self):
+        self.client.force_login(self.super_user)
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        user = response.context['cl'].result_list[0]
+        self.assertEqual(user.get_deferred_fields(), {'password', 'last_login', 'email', 'email_lower',
+                                                      'owner_path', 'date_joined', 'updated_at'})
+        # creators are joined and displayed without extra queries
+        self.assertContains(response, 'staff')
+        with self.assertNumQueries(0):
+            str(response.context['cl'].result_list[5].created_by)
+
+    def test_changelist_queries_are_constant(self):
+        def grow():
+            start = self.User.objects.count()
+            for i in range(start, start + 20):
+                self.User.objects.create(username='test%02d' % i, created_by=self.User.objects.create(
+                    username='creator%02d' % i, is_staff=True))
+
+        for user in (self.super_user, self.staff_user):
+            self.client.force_login(user)
+            self.assertConstantQueries(lambda: self.client.get(self.url), grow)
+            with self.assertMaxQueries(10):
+                self.client.get(self.url)
+
+    def test_change_form_queries_are_constant(self):
+        user = self.User.objects.get(username='test00')
+        url = reverse('admin:accounts_user_change', args=(user.pk, ))
+
+        def grow():
+            start = self.User.objects.count()
+            for i in range(start, start + 20):
+                self.User.objects.create(username='test%02d' % i, created_by=self.staff_user)
+
+        for admin in (self.super_user, self.staff_user):
+            self.client.force_login(admin)
+            self.assertConstantQueries(lambda: self.client.get(url), grow)
+            with self.assertMaxQueries(10):
+                self.client.get(url)
+
+    def test_list_select_related(self):
+        ma = UserAdmin(self.User, AdminSite())
+        request.user = self.super_user
+        self.assertEqual(ma.get_list_select_related(request), ('created_by', ))
+        request.user = self.staff_user
+        self.assertEqual(ma.get_list_select_related(request), ())
+
+    @override_settings(ADMIN_KEYSET_PAGINATION=True)
+    def test_keyset_pagination(self):
+        self.client.force_login(self.staff_user)
+        with patch.object(UserAdmin, 'list_per_page', 4):
+            usernames = []
+            url = self.url
+            while url:
+                response = self.client.get(self.url + url if url.startswith('?') else url)
+                self.assertEqual(response.status_code, 200)
+                cl = response.context['cl']
+                self.assertTrue(cl.keyset_pagination)
+                self.assertEqual(cl.result_count, 10)
+                usernames.extend(u.username for u in cl.result_list)
+                url = cl.get_next_page_url()
+        self.assertEqual(usernames, ['test%02d' % i for i in range(10)])
+
+        # invalid cursor
+        response = self.client.get(self.url, {'cursor': 'blah'})
+        self.assertRedirects(response, self.url + '?e=1')
+
+    @override_settings(ADMIN_KEYSET_PAGINATION=True)
+    def test_keyset_pagination_fallback(self):
+        # ordering by non unique column falls back to regular pagination
+        self.client.force_login(self.staff_user)
+        response = self.client.get(self.url, {'o': '2'})
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.context['cl'].keyset_pagination)
+
+
+@override_settings(ADMIN_SUBTREE_SCOPE=True)
+class UserAdminSubtreeScopeTest(TestCase):
+    def setUp(self):
+        super(UserAdminSubtreeScopeTest, self).setUp()
+        self.site = AdminSite()
+        self.User = get_user_model()
+        self.reseller = self.User.objects.create(username='reseller', is_staff=True)
+        self.admin = self.User.objects.create(username='admin', is_staff=True, created_by=self.reseller)
+        self.user = self.User.objects.create(username='user', created_by=self.admin)
+        self.other = self.User.objects.create(username='other')
+
+    def test_queryset(self):
+        ma = UserAdmin(self.User, self.site)
+        request.user = self.reseller
+        self.assertEqual(list(ma.get_queryset(request).order_by('pk')), [self.admin, self.user])
+        request.user = self.admin
+        self.assertEqual(list(ma.get_queryset(request)), [self.user])
+
+    def test_has_permission(self):
+        ma = UserAdmin(self.User, self.site)
+        request.user = self.reseller
+        with self.assertNumQueries(0):
+            self.assertTrue(ma.has_permission(request, self.user))
+            self.assertFalse(ma.has_permission(request, self.other))
+            self.assertFalse(ma.has_permission(request, self.reseller))
+        request.user = self.admin
+        self.assertFalse(ma.has_permission(request, self.reseller))
+
+
+class CreatedByFilterTest(TestCase):
+    def setUp(self):
+        super(CreatedByFilterTest, self).setUp()
+        get_cache().clear()
+        self.User = get_user_model()
+        self.super_user = self.User.objects.create(username='admin', is_superuser=True, is_staff=True)
+        self.staff_user = self.User.objects.create(username='staff', first_name='Jane', last_name='Doe',
+                                                   is_staff=True, created_by=self.super_user)
+        for i in range(5):
+            self.User.objects.create(username='test%d' % i, created_by=self.staff_user)
+        self.url = reverse('admin:accounts_user_changelist')
+        self.creators_url = reverse('admin:accounts_user_creators')
+        self.client.force_login(self.super_user)
+
+    def test_only_selected_creator_is_listed(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, self.creators_url)
+        self.assertNotContains(response, 'created_by__id__exact=%d"' % self.staff_user.pk)
+
+        response = self.client.get(self.url, {'created_by__id__exact': self.staff_user.pk})
+        self.assertEqual(response.context['cl'].result_count, 5)
+        self.assertContains(response, 'Jane Doe')
+
+        response = self.client.get(self.url, {'created_by__id__exact': 'blah'})
+        self.assertRedirects(response, self.url + '?e=1')
+
+    def test_creators_are_cached(self):
+        get_creators()
+        with self.assertNumQueries(0):
+            self.assertEqual(len(get_creators()), 2)
+        # new creator invalidates cached creators
+        self.User.objects.create(username='test', created_by=self.User.objects.get(username='test0'))
+        self.assertEqual([row[1] for row in get_creators()], ['admin', 'staff', 'test0'])
+        self.User.objects.filter(username='test').delete()
+        self.assertEqual([row[1] for row in get_creators()], ['admin', 'staff'])
+        # so does rename of a creator
+        self.staff_user.first_name = 'John'
+        self.staff_user.save()
+        self.assertEqual(get_creators()[1][2], 'John')
+
+    def test_creators_view(self):
+        response = self.client.get(self.creators_url, {'q': 'doe'})
+        self.assertEqual(json.loads(response.content.decode()), {'results': [
+            {'id': self.staff_user.pk, 'username': 'staff', 'label': 'Jane Doe'}]})
+        response = self.client.get(self.creators_url)
+        self.assertEqual(len(json.loads(response.content.decode())['results']), 2)
+
+        content_type = ContentType.objects.get_for_model(self.User)
+        self.staff_user.user_permissions.add(
+            Permission.objects.get(codename='change_user', content_type__id=content_type.id))
+        self.client.force_login(self.staff_user)
+        self.assertEqual(self.client.get(self.creators_url).status_code, 403)
+
+    def test_too_many_creators_to_cache(self):
+        with patch('superman.apps.accounts.cache.CREATORS_CACHE_LIMIT', 1):
+            self.assertIsNone(get_creators())
+            # too many creators are remembered, so they are counted only once
+            with self.assertNumQueries(0):
+                self.assertIsNone(get_creators())
+
+            response = self.client.get(self.creators_url, {'q': 'jane d'})
+            self.assertEqual(json.loads(response.content.decode()), {'results': [
+                {'id': self.staff_user.pk, 'username': 'staff', 'label': 'Jane Doe'}]})
+            response = self.client.get(self.creators_url)
+            self.assertEqual(len(json.loads(response.content.decode())['results']), 2)
+
+            response = self.client.get(self.url, {'created_by__id__exact': self.staff_user.pk})
+            self.assertEqual(response.context['cl'].result_count, 5)
+            self.assertContains(response, 'Jane Doe')
+
+            url = reverse('admin:accounts_user_change', args=(self.User.objects.get(username='test0').pk, ))
+            self.assertContains(self.client.get(url), '<strong><a href="%s">Jane Doe</a></strong>' % reverse(
+                'admin:accounts_user_change', args=(self.staff_user.pk, )))
+
+    def test_raw_id_widget_label_is_cached(self):
+        url = reverse('admin:accounts_user_change', args=(self.User.objects.get(username='test0').pk, ))
+        response = self.client.get(url)
+        self.assertContains(response, '<strong><a href="%s">Jane Doe</a></strong>' % reverse(
+            'admin:accounts_user_change', args=(self.staff_user.pk, )))
+        form = response.context['adminform'].form
+        with self.assertNumQueries(0):
+            form['created_by'].as_widget()
+
+
+class UserAdminActionsTest(TestCase):
+    def setUp(self):
+        super(UserAdminActionsTest, self).setUp()
+        self.User = get_user_model()
+        self.super_user = self.User.objects.create(username='admin', is_superuser=True, is_staff=True)
+        self.staff_user = self.User.objects.create(username='staff', is_staff=True)
+        self.other_staff_user = self.User.objects.create(username='other', is_staff=True)
+        content_type = ContentType.objects.get_for_model(self.User)
+        permissions = Permission.objects.filter(codename__in=['change_user', 'delete_user'],
+                                                content_type__id=content_type.id)
+        self.staff_user.user_permissions.add(*permissions)
+        self.users = [self.User.objects.create(username='test%d' % i, iban=iban, created_by=self.staff_user)
+                      for i, iban in enumerate(['DE44500105175407324931', 'GB82WEST12345698765432'])]
+        self.other_user = self.User.objects.create(username='test', created_by=self.other_staff_user)
+        self.url = reverse('admin:accounts_user_changelist')
+
+    def action(self, action, users, **data):
+        data.update({'action': action, 'index': 0, '_selected_action': [user.pk for user in users]})
+        return self.client.post(self.url, data)
+
+    def test_actions(self):
+        ma = UserAdmin(self.User, AdminSite())
+        request = RequestFactory().get(self.url)
+        request.user = self.super_user
+        self.assertIn('reassign_created_by', ma.get_actions(request))
+        request.user = self.staff_user
+        actions = ma.get_actions(request)
+        self.assertIn('deactivate_users', actions)
+        self.assertNotIn('reassign_created_by', actions)
+        self.assertNotIn('clear_iban', actions)
+
+    def test_deactivate_and_activate(self):
+        self.client.force_login(self.staff_user)
+        # session, user, permissions and changelist count, then audited values and a single scoped UPDATE
+        # in a savepoint
+        with self.assertNumQueries(9):
+            response = self.action('deactivate_users', self.users + [self.other_user, self.staff_user])
+        self.assertRedirects(response, self.url)
+        self.assertEqual(list(self.User.objects.filter(is_active=False).order_by('pk')), self.users)
+        self.action('activate_users', self.users)
+        self.assertFalse(self.User.objects.filter(is_active=False).exists())
+
+    def test_clear_iban(self):
+        self.client.force_login(self.super_user)
+        self.action('clear_iban', self.users[:1])
+        self.assertEqual(list(self.User.objects.filter(iban__isnull=False)), self.users[1:])
+
+        self.client.force_login(self.staff_user)
+        response = self.action('clear_iban', self.users[1:])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(list(self.User.objects.filter(iban__isnull=False)), self.users[1:])
+
+    def test_reassign_created_by(self):
+        self.client.force_login(self.super_user)
+        grandchild = self.User.objects.create(username='grandchild', created_by=self.users[0])
+        response = self.action('reassign_created_by', self.users)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['count'], 2)
+
+        response = self.action('reassign_created_by', self.users, post='yes', created_by='nobody')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.context['form'].errors)
+
+        response = self.action('reassign_created_by', self.users, post='yes', created_by='other')
+        self.assertRedirects(response, self.url)
+        self.assertEqual(self.User.objects.filter(created_by=self.other_staff_user).count(), 3)
+        grandchild.refresh_from_db()
+        self.assertEqual(grandchild.owner_path, '%s/%s/' % (self.other_staff_user.pk, self.users[0].pk))
+
+        # users can't be moved under their own subtree
+        self.action('reassign_created_by', self.users, post='yes', created_by='grandchild')
+        self.assertEqual(self.User.objects.get(pk=self.users[0].pk).created_by_id, self.other_staff_user.pk)
+
+        self.action('reassign_created_by', self.users, post='yes', created_by='')
+        self.assertFalse(self.User.objects.filter(pk__in=[u.pk for u in self.users], created_by__isnull=False))
+        grandchild.refresh_from_db()
+        self.assertEqual(grandchild.owner_path, '%s/' % self.users[0].pk)
+
+    def test_delete_is_scoped(self):
+        self.client.force_login(self.staff_user)
+        self.action('delete_selected', self.users + [self.other_user], post='yes')
+        self.assertEqual(list(self.User.objects.filter(username__startswith='test')), [self.other_user])
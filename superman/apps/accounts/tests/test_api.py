@@ -0,0 +1,104 @@
+from django.core.urlresolvers import reverse
+from django.test import TestCase, override_settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import Permission
+from django.contrib.contenttypes.models import ContentType
+
+from ..testing import QueryBudgetTestMixin
+
+
+class UserAPITest(QueryBudgetTestMixin, TestCase):
+    def setUp(self):
+        super(UserAPITest, self).setUp()
+        self.User = get_user_model()
+        self.super_user = self.User.objects.create(username='admin', is_superuser=True, is_staff=True)
+        self.staff_user = self.User.objects.create(username='staff', is_staff=True)
+        content_type = ContentType.objects.get_for_model(self.User)
+        self.staff_user.user_permissions.add(
+            Permission.objects.get(codename='change_user', content_type=content_type))
+        self.users = [self.User.objects.create(username='test%d' % i, iban=None, created_by=self.staff_user)
+                      for i in range(5)]
+        self.url = reverse('api:user_list')
+
+    def get(self, url, user=None, **params):
+        self.client.force_login(user or self.super_user)
+        return self.client.get(url, params)
+
+    def test_list(self):
+        response = self.get(self.url, fields='id,username,created_by')
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertIsNone(data['next'])
+        self.assertEqual(len(data['results']), 7)
+        self.assertEqual(data['results'][2], {
+            'id': self.users[0].pk, 'username': 'test0', 'created_by': self.staff_user.pk})
+
+    def test_all_fields(self):
+        data = self.get(self.url).json()
+        self.assertEqual(len(data['results'][0]), 12)
+        self.assertNotIn('password', data['results'][0])
+
+    def test_scope(self):
+        data = self.get(self.url, user=self.staff_user, fields='username').json()
+        self.assertEqual([row['username'] for row in data['results']], ['test%d' % i for i in range(5)])
+        response = self.get(reverse('api:user_detail', args=[self.super_user.pk]), user=self.staff_user)
+        self.assertEqual(response.status_code, 404)
+
+    def test_cursor_pagination(self):
+        usernames = []
+        url = self.url
+        params = {'fields': 'username', 'limit': 3}
+        while url:
+            data = self.get(url, **params).json()
+            usernames.extend(row['username'] for row in data['results'])
+            self.assertLessEqual(len(data['results']), 3)
+            url, params = data['next'], {}
+        self.assertEqual(usernames, ['admin', 'staff'] + ['test%d' % i for i in range(5)])
+
+    def test_constant_queries(self):
+        def grow():
+            self.User.objects.bulk_create([self.User(username='bulk%d' % i, created_by=self.staff_user)
+                                           for i in range(1000)])
+
+        def get_page():
+            data = self.client.get(self.url, {'limit': 2000}).json()
+            self.assertIsNone(data['next'])
+        self.client.force_login(self.staff_user)
+        # session, user, permissions and one query for the page
+        self.assertEqual(self.assertConstantQueries(get_page, grow), 5)
+        data = self.get(self.url, user=self.staff_user, limit=1000).json()
+        self.assertEqual(len(data['results']), 1000)
+        self.assertIsNotNone(data['next'])
+
+    def test_detail(self):
+        response = self.get(reverse('api:user_detail', args=[self.users[1].pk]), fields='username,iban')
+        self.assertEqual(response.json(), {'username': 'test1', 'iban': None})
+        response = self.get(reverse('api:user_detail', args=[0]))
+        self.assertEqual(response.status_code, 404)
+
+    @override_settings(API_MAX_PAGE_SIZE=10)
+    def test_invalid_parameters(self):
+        self.assertEqual(self.get(self.url, fields='password').status_code, 400)
+        self.assertEqual(self.get(self.url, limit=11).status_code, 400)
+        self.assertEqual(self.get(self.url, limit='a').status_code, 400)
+        self.assertEqual(self.get(self.url, cursor='invalid').status_code, 400)
+
+    def test_fields_of_administrators(self):
+        data = self.get(self.url, user=self.staff_user).json()
+        self.assertEqual(sorted(data['results'][0]), ['first_name', 'iban', 'id', 'is_active', 'last_name',
+                                                      'username'])
+        for name in ('email', 'is_staff', 'is_superuser', 'created_by', 'last_login'):
+            self.assertEqual(self.get(self.url, user=self.staff_user, fields=name).status_code, 400)
+            response = self.get(reverse('api:user_changes'), user=self.staff_user, fields=name)
+            self.assertEqual(response.status_code, 400)
+        response = self.get(reverse('api:user_detail', args=[self.users[0].pk]), user=self.staff_user)
+        self.assertNotIn('email', response.json())
+
+    def test_permissions(self):
+        self.assertEqual(self.client.get(self.url).status_code, 401)
+        user = self.User.objects.create(username='user')
+        self.assertEqual(self.get(self.url, user=user).status_code, 403)
+        self.staff_user.user_permissions.clear()
+        self.assertEqual(self.get(self.url, user=self.staff_user).status_code, 403)
+        self.client.force_login(self.super_user)
+        self.assertEqual(self.client.post(self.url).status_code, 405)
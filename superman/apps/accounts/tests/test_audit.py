@@ -0,0 +1,214 @@
+import json
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import Group, Permission
+from django.contrib.contenttypes.models import ContentType
+from django.core.urlresolvers import reverse
+from django.db import OperationalError, connection, transaction
+from django.test import TestCase, TransactionTestCase, override_settings
+
+from ..audit import AuditLogWriter, get_writer
+from ..models import AuditEntry, OutboxMessage
+
+
+@override_settings(AUDIT_LOG_ASYNC=False)
+class AuditSignalsTest(TransactionTestCase):
+    def setUp(self):
+        super(AuditSignalsTest, self).setUp()
+        self.User = get_user_model()
+
+    def entries(self, **kwargs):
+        return [(entry.username, entry.action, entry.get_changes())
+                for entry in AuditEntry.objects.filter(**kwargs).order_by('id')]
+
+    def test_create_update_delete(self):
+        user = self.User.objects.create(username='john', email='john@example.com')
+        user.iban = 'DE44500105175407324931'
+        user.first_name = 'John'
+        user.save()
+        # nothing audited changed
+        user.save()
+        pk = user.pk
+        user.delete()
+        self.assertEqual(self.entries(user_id=pk), [
+            ('john', 'create', {'email': [None, 'john@example.com'], 'iban': [None, None],
+                                'is_active': [None, True], 'is_staff': [None, False],
+                                'is_superuser': [None, False], 'created_by_id': [None, None]}),
+            ('john', 'update', {'iban': [None, 'DE44500105175407324931']}),
+            ('john', 'delete', {'email': ['john@example.com', None],
+                                'iban': ['DE44500105175407324931', None], 'is_active': [True, None],
+                                'is_staff': [False, None], 'is_superuser': [False, None],
+                                'created_by_id': [None, None]}),
+        ])
+
+    def test_rolled_back_changes_are_not_audited(self):
+        user = self.User.objects.create(username='john')
+        try:
+            with transaction.atomic():
+                user.is_staff = True
+                user.save()
+                raise ValueError
+        except ValueError:
+            pass
+        self.assertEqual([action for username, action, changes in self.entries()], ['create'])
+
+    def test_permissions(self):
+        user = self.User.objects.create(username='john')
+        group = Group.objects.create(name='staff')
+        permission = Permission.objects.get(codename='change_user')
+        user.user_permissions.add(permission)
+        user.groups.add(group)
+        group.user_set.remove(user)
+        user.user_permissions.clear()
+        self.assertEqual(self.entries(action='update'), [
+            ('john', 'update', {'user_permissions': {'added': [permission.pk]}}),
+            ('john', 'update', {'groups': {'added': [group.pk]}}),
+            ('john', 'update', {'groups': {'removed': [group.pk]}}),
+            ('john', 'update', {'user_permissions': {'removed': [permission.pk]}}),
+        ])
+
+    def test_actor(self):
+        admin = self.User.objects.create(username='admin', is_superuser=True, is_staff=True)
+        user = self.User.objects.create(username='john', created_by=admin)
+        self.client.force_login(admin)
+        response = self.client.post(reverse('admin:accounts_user_changelist'), {
+            'action': 'deactivate_users', '_selected_action': [user.pk]})
+        self.assertEqual(response.status_code, 302)
+        entry = AuditEntry.objects.get(user=user, action='update')
+        self.assertEqual(entry.actor, admin)
+        self.assertEqual(entry.get_changes(), {'is_active': [True, False]})
+
+    @override_settings(WEBHOOK_URLS=['http://example.com/hook'])
+    def test_reassigned_by_admin_action(self):
+        admin = self.User.objects.create(username='admin', is_superuser=True, is_staff=True)
+        user = self.User.objects.create(username='john', created_by=admin)
+        other = self.User.objects.create(username='other')
+        self.client.force_login(admin)
+        response = self.client.post(reverse('admin:accounts_user_changelist'), {
+            'action': 'reassign_created_by', '_selected_action': [user.pk], 'post': 'yes',
+            'created_by': 'other'})
+        self.assertEqual(response.status_code, 302)
+        entry = AuditEntry.objects.get(user=user, action='update')
+        self.assertEqual(entry.actor, admin)
+        self.assertEqual(entry.get_changes(), {'created_by_id': [admin.pk, other.pk]})
+        message = OutboxMessage.objects.get(user_id=user.pk, event='user.reassigned')
+        self.assertEqual(message.get_payload()['user']['created_by_id'], other.pk)
+
+    def test_deleted_by_admin_action(self):
+        admin = self.User.objects.create(username='admin', is_superuser=True, is_staff=True)
+        user = self.User.objects.create(username='john', email='john@example.com', created_by=admin)
+        self.client.force_login(admin)
+        # changelist loads only displayed columns
+        self.client.post(reverse('admin:accounts_user_changelist'), {
+            'action': 'delete_selected', '_selected_action': [user.pk], 'post': 'yes'})
+        self.assertEqual(self.entries(user_id=user.pk, action='delete'), [
+            ('john', 'delete', {'email': ['john@example.com', None], 'iban': [None, None],
+                                'is_active': [True, None], 'is_staff': [False, None],
+                                'is_superuser': [False, None], 'created_by_id': [admin.pk, None]}),
+        ])
+
+
+@override_settings(AUDIT_LOG_ASYNC=True)
+class AuditLogWriterTest(TransactionTestCase):
+    def setUp(self):
+        super(AuditLogWriterTest, self).setUp()
+        self.User = get_user_model()
+
+    def test_batches(self):
+        writer = AuditLogWriter(batch_size=10, flush_interval=0.01)
+        entries = [AuditEntry(username='user%d' % i, action='update', changes='{}') for i in range(25)]
+        for entry in entries:
+            writer.queue.put(entry)
+        self.assertEqual([len(writer.take(block=False)) for i in range(4)], [10, 10, 5, 0])
+
+    def test_stop_writes_queued_entries(self):
+        writer = AuditLogWriter(batch_size=10, flush_interval=60)
+        writer.put([AuditEntry(username='user%d' % i, action='update', changes='{}') for i in range(3)])
+        self.assertIsNotNone(writer.thread)
+        writer.stop()
+        self.assertIsNone(writer.thread)
+        self.assertEqual(AuditEntry.objects.count(), 3)
+
+    def test_full_queue_is_written_synchronously(self):
+        writer = AuditLogWriter(max_size=1, flush_interval=60)
+        # connection of the calling thread is not closed
+        with self.assertLogs('superman.apps.accounts.audit', 'WARNING'), \
+                mock.patch.object(connection, 'close') as close:
+            writer.put([AuditEntry(username='user%d' % i, action='update', changes='{}') for i in range(3)])
+        self.assertFalse(close.called)
+        self.assertGreaterEqual(AuditEntry.objects.count(), 2)
+        writer.stop()
+        self.assertEqual(AuditEntry.objects.count(), 3)
+
+    def test_failed_batch_is_retried_on_new_connection(self):
+        writer = AuditLogWriter(max_attempts=2, retry_delay=0)
+        entries = [AuditEntry(username='user%d' % i, action='update', changes='{}') for i in range(3)]
+        bulk_create = AuditEntry.objects.bulk_create
+        errors = [OperationalError('server closed the connection')]
+
+        def fail_once(entries):
+            if errors:
+                raise errors.pop()
+            return bulk_create(entries)
+        with mock.patch.object(AuditEntry.objects, 'bulk_create', side_effect=fail_once), \
+                mock.patch.object(connection, 'close', wraps=connection.close) as close:
+            with self.assertLogs('superman.apps.accounts.audit', 'WARNING'):
+                writer.write(entries)
+        self.assertTrue(close.called)
+        self.assertEqual(AuditEntry.objects.count(), 3)
+
+    def test_failed_batch_is_logged(self):
+        writer = AuditLogWriter(max_attempts=2, retry_delay=0)
+        with mock.patch.object(AuditEntry.objects, 'bulk_create', side_effect=OperationalError):
+            with self.assertLogs('superman.apps.accounts.audit', 'ERROR'):
+                writer.write([AuditEntry(username='user', action='update', changes='{}')])
+        self.assertFalse(AuditEntry.objects.exists())
+
+    def test_signals(self):
+        self.addCleanup(get_writer().stop)
+        self.User.objects.create(username='john')
+        get_writer().stop()
+        self.assertEqual(list(AuditEntry.objects.values_list('username', 'action')), [('john', 'create')])
+
+
+class AuditEntryAdminTest(TestCase):
+    def setUp(self):
+        super(AuditEntryAdminTest, self).setUp()
+        self.User = get_user_model()
+        self.super_user = self.User.objects.create(username='admin', is_superuser=True, is_staff=True)
+        self.staff_user = self.User.objects.create(username='staff', is_staff=True)
+        content_type = ContentType.objects.get_for_model(self.User)
+        self.staff_user.user_permissions.add(
+            Permission.objects.get(codename='change_user', content_type=content_type))
+        self.own_user = self.User.objects.create(username='own', created_by=self.staff_user)
+        # TestCase never commits, entries are created directly
+        for user in (self.own_user, self.super_user):
+            AuditEntry.objects.create(user=user, username=user.username, action='update',
+                                      changes=json.dumps({'iban': [None, 'DE44500105175407324931']}))
+        self.url = reverse('admin:accounts_auditentry_changelist')
+
+    def test_scope(self):
+        self.client.force_login(self.staff_user)
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([entry.username for entry in response.context['cl'].result_list], ['own'])
+        self.client.force_login(self.super_user)
+        response = self.client.get(self.url)
+        self.assertEqual(len(response.context['cl'].result_list), 2)
+
+    def test_history_of_user(self):
+        self.client.force_login(self.staff_user)
+        response = self.client.get(reverse('admin:accounts_user_history', args=[self.own_user.pk]))
+        self.assertRedirects(response, '%s?user__id__exact=%d' % (self.url, self.own_user.pk))
+        response = self.client.get(response.url)
+        self.assertEqual([entry.user for entry in response.context['cl'].result_list], [self.own_user])
+        response = self.client.get(reverse('admin:accounts_user_history', args=[self.super_user.pk]))
+        self.assertEqual(response.status_code, 403)
+
+    def test_read_only(self):
+        self.client.force_login(self.super_user)
+        entry = AuditEntry.objects.first()
+        self.assertEqual(self.client.get(reverse('admin:accounts_auditentry_add')).status_code, 403)
+        response = self.client.get(reverse('admin:accounts_auditentry_change', args=[entry.pk]))
+        self.assertEqual(response.status_code, 403)
@@ -0,0 +1,68 @@
+import io
+
+from django.core.management import call_command, CommandError
+from django.test import TestCase
+from django.contrib.auth import get_user_model
+
+from ..backfill import batched_update
+
+
+class BatchedUpdateTest(TestCase):
+    def setUp(self):
+        super(BatchedUpdateTest, self).setUp()
+        self.User = get_user_model()
+        self.users = [self.User.objects.create(username='test%d' % i, first_name='old' if i % 2 else 'new')
+                      for i in range(10)]
+        self.first_pk = self.users[0].pk
+
+    def test_batched_update(self):
+        progress = []
+        # bounds query, then savepoint, update and release per chunk of 3 pks
+        with self.assertNumQueries(1 + 4 * 3):
+            updated = batched_update(self.User.objects.filter(first_name='old'), {'first_name': 'new'},
+                                     chunk_size=3, progress=lambda *args: progress.append(args))
+        self.assertEqual(updated, 5)
+        self.assertFalse(self.User.objects.filter(first_name='old').exists())
+        self.assertEqual([p[0] for p in progress], [self.first_pk + i for i in (3, 6, 9, 12)])
+        self.assertEqual(progress[-1][1], 5)
+
+    def test_resume(self):
+        updated = batched_update(self.User.objects.all(), {'last_name': 'doe'},
+                                 chunk_size=4, start_pk=self.first_pk + 5)
+        self.assertEqual(updated, 5)
+        self.assertEqual(self.User.objects.filter(last_name='doe', pk__lt=self.first_pk + 5).count(), 0)
+
+    def test_empty_table(self):
+        self.User.objects.all().delete()
+        self.assertEqual(batched_update(self.User.objects.all(), {'last_name': 'doe'}), 0)
+
+
+class BackfillCommandTest(TestCase):
+    def setUp(self):
+        super(BackfillCommandTest, self).setUp()
+        self.User = get_user_model()
+        self.User.objects.create(username='test1', last_name='Doe')
+        self.User.objects.create(username='test2', last_name='')
+        self.User.objects.create(username='test3', last_name='')
+
+    def backfill(self, *args, **kwargs):
+        out = io.StringIO()
+        call_command('backfill', *args, stdout=out, **kwargs)
+        return out.getvalue()
+
+    def test_backfill(self):
+        output = self.backfill('accounts.User', filters='{"last_name": ""}', values='{"last_name": "Smith"}',
+                               chunk_size=2)
+        self.assertIn('Updated 2 rows.', output)
+        self.assertIn('resume with --start-pk=', output)
+        self.assertEqual(self.User.objects.filter(last_name='Smith').count(), 2)
+
+    def test_invalid_arguments(self):
+        with self.assertRaises(CommandError):
+            self.backfill('accounts.Nope', values='{"last_name": "Smith"}')
+        with self.assertRaises(CommandError):
+            self.backfill('accounts.User')
+        with self.assertRaises(CommandError):
+            self.backfill('accounts.User', values='[]')
+        with self.assertRaises(CommandError):
+            self.backfill('accounts.User', values='{"nope": 1}')
@@ -0,0 +1,98 @@
+import io
+import json
+from unittest import mock
+
+from django.core.management import call_command, CommandError
+from django.test import TestCase
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import Group
+
+from localflavor.generic.validators import IBANValidator
+
+from ..benchmarks import (
+    BENCH_EMAIL_DOMAIN, BENCH_GROUP_NAME, UsernameAllocator, delete_seeded_users, make_iban, measure,
+    percentile, seed_users)
+
+
+class BenchmarksTest(TestCase):
+    def setUp(self):
+        super(BenchmarksTest, self).setUp()
+        self.User = get_user_model()
+
+    def test_make_iban(self):
+        IBANValidator()(make_iban(42))
+        self.assertNotEqual(make_iban(1), make_iban(2))
+
+    def test_username_allocator(self):
+        self.User.objects.create(username='john')
+        allocator = UsernameAllocator(['john'], 30)
+        self.assertEqual([allocator.allocate('john') for i in range(3)], ['john2', 'john3', 'john4'])
+
+    def test_seed_users(self):
+        population = seed_users(300, batch_size=100)
+        seeded = self.User.objects.filter(email_lower__endswith='@' + BENCH_EMAIL_DOMAIN)
+        # 300 users and the superuser
+        self.assertEqual(seeded.count(), 301)
+        self.assertEqual(len(population['admins']), 3)
+        self.assertTrue(population['root'].is_superuser)
+        admin = population['admins'][0]
+        self.assertTrue(admin.has_perm('accounts.change_user'))
+        for user in self.User.objects.filter(created_by=admin):
+            self.assertEqual(user.owner_path, user.created_by.subtree_path)
+        self.assertEqual(len(set(seeded.values_list('username', flat=True))), 301)
+
+        self.assertEqual(delete_seeded_users(), 301)
+        self.assertFalse(seeded.exists())
+        self.assertFalse(Group.objects.filter(name=BENCH_GROUP_NAME).exists())
+
+    def test_seed_users_in_chunks(self):
+        # more administrators than fit in a single lookup
+        with mock.patch('superman.apps.accounts.benchmarks.FETCH_CHUNK_SIZE', 2):
+            population = seed_users(500, batch_size=100)
+        admins = population['admins']
+        self.assertEqual(len(admins), 5)
+        self.assertEqual([admin.pk for admin in admins], sorted(admin.pk for admin in admins))
+        self.assertEqual(self.User.objects.filter(created_by__in=admins).count(), 494)
+
+    def test_percentile(self):
+        values = list(range(1, 101))
+        self.assertEqual(percentile(values, 50), 50)
+        self.assertEqual(percentile(values, 99), 99)
+        self.assertEqual(percentile([7], 99), 7)
+        self.assertIsNone(percentile([], 50))
+
+    def test_measure(self):
+        calls = []
+        result = measure(lambda i: list(self.User.objects.all()), 4, setup=calls.append)
+        self.assertEqual(calls, [0, 1, 2, 3])
+        self.assertEqual(result['iterations'], 4)
+        self.assertEqual(result['queries'], 4)
+        self.assertEqual(result['queries_per_iteration'], 1)
+        self.assertLessEqual(result['p50_ms'], result['p99_ms'])
+
+
+class BenchAccountsCommandTest(TestCase):
+    def test_command(self):
+        out = io.StringIO()
+        call_command('bench_accounts', users=200, iterations=2, iban_count=100, stdout=out)
+        report = json.loads(out.getvalue())
+        self.assertEqual(report['users'], 201)
+        self.assertEqual(set(report['results']), {
+            'generate_unique_username', 'iban_validation_per_value', 'iban_validation_batch',
+            'user_creation_form', 'user_change_form', 'load_user',
+            'changelist_superuser', 'changelist_scoped_admin', 'changelist_search_superuser',
+            'changelist_search_scoped_admin', 'change_view_superuser', 'change_view_scoped_admin'})
+        for result in report['results'].values():
+            self.assertEqual(result['iterations'], 2)
+        # all account emails are resolved with a single query
+        self.assertEqual(report['results']['load_user']['queries'], 2)
+        # forms are saved in rolled back transactions
+        self.assertEqual(get_user_model().objects.count(), 201)
+
+        out = io.StringIO()
+        call_command('bench_accounts', skip_seed=True, iterations=1, stdout=out)
+        self.assertEqual(json.loads(out.getvalue())['users'], 201)
+
+    def test_skip_seed_without_population(self):
+        with self.assertRaises(CommandError):
+            call_command('bench_accounts', skip_seed=True, iterations=1, stdout=io.StringIO())
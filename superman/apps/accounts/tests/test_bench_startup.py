@@ -0,0 +1,25 @@
+import io
+import json
+
+from django.core.management import call_command, CommandError
+from django.test import SimpleTestCase
+
+
+class BenchStartupCommandTest(SimpleTestCase):
+    def test_command(self):
+        out = io.StringIO()
+        call_command('bench_startup', runs=1, requests=2, stdout=out)
+        results = json.loads(out.getvalue())['results']
+        enabled, disabled = results['social_auth_enabled'], results['social_auth_disabled']
+        # only models of social auth are imported when it's disabled, not its backends and middleware
+        self.assertGreater(disabled['social_modules'], 0)
+        self.assertLess(disabled['social_modules'], enabled['social_modules'])
+        self.assertLess(disabled['modules'], enabled['modules'])
+        for result in (enabled, disabled):
+            self.assertEqual(result['runs'], 1)
+            self.assertGreater(result['startup_p50_ms'], 0)
+            self.assertLessEqual(result['request_p50_ms'], result['request_p99_ms'])
+
+    def test_invalid_options(self):
+        with self.assertRaises(CommandError):
+            call_command('bench_startup', runs=0, stdout=io.StringIO())
@@ -0,0 +1,31 @@
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.test import TestCase, TransactionTestCase, override_settings
+
+from ..cache import CREATORS_KEY, _get_generation, check_shared_cache, get_cache, get_creators
+
+
+class CacheTest(TestCase):
+    def test_shared_cache_check(self):
+        self.assertEqual([error.id for error in check_shared_cache()], ['accounts.W001'])
+        caches = {'accounts': {'BACKEND': 'django.core.cache.backends.memcached.MemcachedCache'}}
+        with override_settings(CACHES=caches):
+            self.assertEqual(check_shared_cache(), [])
+
+
+class InvalidateOnCommitTest(TransactionTestCase):
+    def setUp(self):
+        super(InvalidateOnCommitTest, self).setUp()
+        get_cache().clear()
+        self.User = get_user_model()
+        self.admin = self.User.objects.create(username='admin')
+        self.user = self.User.objects.create(username='test', created_by=self.admin)
+
+    def test_invalidate_on_commit(self):
+        with transaction.atomic():
+            self.admin.first_name = 'John'
+            self.admin.save()
+            # another worker caches the committed name before this transaction commits
+            cache = get_cache()
+            cache.set(CREATORS_KEY % _get_generation(cache), [(self.admin.pk, 'admin', '', '')])
+        self.assertEqual(get_creators(), [(self.admin.pk, 'admin', 'John', '')])
@@ -1,6 +1,11 @@
-from django.test import TestCase, override_settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import AnonymousUser
+from django.template import RequestContext, Template
+from django.test import TestCase, RequestFactory, override_settings
 
-from ..context_processors import accounts
+from social.apps.django_app.default.models import UserSocialAuth
+
+from ..context_processors import accounts, backends, get_backend_names
 
 
 class ContextProcessorsTest(TestCase):
@@ -13,3 +18,43 @@ class ContextProcessorsTest(TestCase):
     def test_valid_1(self):
         data = accounts(None)
         self.assertFalse(data['SOCIAL_AUTH_ENABLED'])
+
+
+# social auth app is installed even with social login off, only its backend has to be configured
+@override_settings(AUTHENTICATION_BACKENDS=['social.backends.google.GoogleOAuth2',
+                                            'django.contrib.auth.backends.ModelBackend'])
+class BackendsContextProcessorTest(TestCase):
+    def setUp(self):
+        super(BackendsContextProcessorTest, self).setUp()
+        self.User = get_user_model()
+        self.user = self.User.objects.create(username='john')
+        UserSocialAuth.objects.create(user=self.user, provider='google-oauth2', uid='john@example.com')
+        self.request = RequestFactory().get('/')
+        self.request.user = self.user
+
+    def test_lazy(self):
+        with self.assertNumQueries(0):
+            data = backends(self.request)
+            # same object is reused by every render of the request
+            self.assertIs(backends(self.request)['backends'], data['backends'])
+        with self.assertNumQueries(1):
+            self.assertEqual([association.uid for association in data['backends']['associated']],
+                             ['john@example.com'])
+            self.assertEqual(data['backends'].not_associated, [])
+            self.assertEqual(data['backends']['backends'], ['google-oauth2'])
+
+    def test_template(self):
+        template = Template('{% for name in backends.not_associated %}{{ name }}{% endfor %}')
+        self.request.user = AnonymousUser()
+        with self.assertNumQueries(0):
+            self.assertEqual(template.render(RequestContext(self.request, backends(self.request))),
+                             'google-oauth2')
+
+    def test_backends_are_loaded_once(self):
+        get_backend_names.cache_clear()
+        get_backend_names()
+        get_backend_names()
+        self.assertEqual(get_backend_names.cache_info().misses, 1)
+        with self.settings(AUTHENTICATION_BACKENDS=['django.contrib.auth.backends.ModelBackend']):
+            self.assertEqual(get_backend_names(), ())
+        self.assertEqual(get_backend_names(), ('google-oauth2', ))
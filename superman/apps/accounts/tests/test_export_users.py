@@ -0,0 +1,42 @@
+import io
+import json
+
+from django.core.management import call_command, CommandError
+from django.test import TestCase
+from django.contrib.auth import get_user_model
+
+
+class ExportUsersTest(TestCase):
+    def setUp(self):
+        super(ExportUsersTest, self).setUp()
+        self.User = get_user_model()
+        self.super_user = self.User.objects.create(username='admin', is_superuser=True)
+        self.staff_user = self.User.objects.create(username='staff', is_staff=True)
+        for i in range(5):
+            self.User.objects.create(username='test%d' % i, first_name='Test',
+                                     created_by=self.staff_user)
+
+    def export_users(self, *args, **kwargs):
+        out = io.StringIO()
+        call_command('export_users', *args, stdout=out, **kwargs)
+        return out.getvalue()
+
+    def test_export_csv_for_superuser(self):
+        lines = self.export_users(user='admin', chunk_size=2).splitlines()
+        self.assertEqual(lines[0], 'username,first_name,last_name,iban,is_staff,is_superuser,is_active,created_by')
+        # header + all users, chunks don't duplicate or lose rows
+        self.assertEqual(len(lines), 8)
+        self.assertEqual(lines[1], 'admin,,,,False,True,True,')
+        self.assertEqual(lines[3], 'test0,Test,,,False,False,True,staff')
+
+    def test_export_jsonl_for_staff_user(self):
+        # user lookup plus one query per chunk of rows
+        with self.assertNumQueries(1 + 3):
+            output = self.export_users(user='staff', format='jsonl', chunk_size=2)
+        rows = [json.loads(line) for line in output.splitlines()]
+        self.assertEqual([row['username'] for row in rows], ['test%d' % i for i in range(5)])
+        self.assertEqual(sorted(rows[0]), ['first_name', 'iban', 'is_active', 'last_name', 'username'])
+
+    def test_invalid_user(self):
+        with self.assertRaises(CommandError):
+            self.export_users(user='nobody')
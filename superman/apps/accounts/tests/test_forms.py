@@ -1,6 +1,10 @@
+from unittest import mock
+
 from django.test import TestCase
 from django.contrib.auth import get_user_model
 
+from localflavor.generic.validators import IBANValidator
+
 from ..forms import UserCreationForm, UserChangeForm
 
 
@@ -81,6 +85,20 @@ class UserCreationFormTest(Helper):
         self.assertNotEqual(user.created_by, None)
         self.assertEqual(user.created_by.id, self.staff_user.id)
 
+    def test_iban_is_validated_by_batch_validator(self):
+        self.form.user = self.super_user
+        self.data['iban'] = 'de44 5001 0517 5407 3249 32'
+        form = self.form(self.data)
+        self.assertFalse(form.is_valid())
+        self.assertEqual(form.errors['iban'], ['Not a valid IBAN.'])
+        self.data['iban'] = 'de44 5001 0517 5407 3249 31'
+        form = self.form(self.data)
+        # model field's validator doesn't validate it once more
+        with mock.patch.object(IBANValidator, '__call__') as validate:
+            self.assertTrue(form.is_valid())
+        self.assertFalse(validate.called)
+        self.assertEqual(form.cleaned_data['iban'], self.iban)
+
     def test_invalid_data(self):
         self.form.user = self.super_user  # doesn't matter which user
 
@@ -198,6 +216,12 @@ class UserChangeFormTest(Helper):
         form = self.form(data, instance=self.normal_user)
         self.assertFalse(form.is_valid())
 
+        # email belong to another user in different case
+        data = self.data.copy()
+        data['email'] = u.email.upper()
+        form = self.form(data, instance=self.normal_user)
+        self.assertFalse(form.is_valid())
+
         # username belong to another user
         data = self.data.copy()
         data['username'] = u.username
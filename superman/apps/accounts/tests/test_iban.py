@@ -0,0 +1,88 @@
+import random
+import unittest
+
+from unittest.mock import patch
+
+from django.core.exceptions import ImproperlyConfigured, ValidationError
+from django.test import SimpleTestCase
+from django.contrib.auth import get_user_model
+
+from localflavor.generic.validators import IBANValidator
+
+from .. import iban
+from ..benchmarks import make_iban
+from ..iban import BatchIBANValidator, normalize_iban
+
+VALID_IBANS = [
+    'DE44500105175407324931', 'GB82WEST12345698765432', 'GR1601101250000000012300695',
+    'NL39RABO0300065264', 'FR1420041010050500013M02606', 'MT84MALT011000012345MTLCAST001S',
+    'NO9386011117947', 'AO06000600000100037131174',  # Nordea extension
+]
+
+
+def make_corpus(size, seed=0):
+    """
+    Valid IBANs and their mutations covering every validation rule
+    """
+    rng = random.Random(seed)
+    corpus = VALID_IBANS + [None, '', 'de44 5001-0517 5407 3249 31', 'XX44500105175407324931',
+                            'DE4450010517540732493', 'DE44500105175407324931!', 'DE44 5001 0517 5407 3249 3É',
+                            'DEAB500105175407324931', 'D', 'AO06000600000100037131174']
+    characters = '0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ -*'
+    while len(corpus) < size:
+        value = list(rng.choice(VALID_IBANS) if rng.random() < 0.5 else make_iban(rng.randint(0, 10 ** 12)))
+        for i in range(rng.randint(0, 2)):
+            value[rng.randrange(len(value))] = rng.choice(characters)
+        corpus.append(''.join(value))
+    return corpus
+
+
+class BatchIBANValidatorTest(SimpleTestCase):
+    def assertSameAsIBANValidator(self, values, **kwargs):
+        expected = []
+        for value in values:
+            try:
+                IBANValidator(**kwargs)(value)
+            except ValidationError as e:
+                expected.append(e.messages)
+            else:
+                expected.append(None)
+        errors = BatchIBANValidator(**kwargs).validate(values)
+        self.assertEqual([e.messages if e else None for e in errors], expected)
+
+    def test_same_results_as_iban_validator(self):
+        corpus = make_corpus(2000)
+        self.assertSameAsIBANValidator(corpus)
+        self.assertSameAsIBANValidator(corpus, use_nordea_extensions=True)
+        self.assertSameAsIBANValidator(corpus, include_countries=['DE', 'NL'])
+
+    def test_pure_python_checksums(self):
+        with patch.object(iban, 'numpy', None):
+            self.assertSameAsIBANValidator(make_corpus(500))
+
+    @unittest.skipIf(iban.numpy is None, 'NumPy is not installed')
+    def test_numpy_checksums(self):
+        with patch.object(iban, 'NUMPY_MIN_BATCH', 1):
+            self.assertSameAsIBANValidator(make_corpus(500), use_nordea_extensions=True)
+
+    def test_single_value(self):
+        validator = BatchIBANValidator()
+        validator('DE44 5001 0517 5407 3249 31')
+        validator(None)
+        with self.assertRaisesMessage(ValidationError, 'Not a valid IBAN.'):
+            validator('DE45500105175407324931')
+        self.assertEqual(validator.is_valid(['DE44500105175407324931', 'DE45500105175407324931']), [True, False])
+
+    def test_for_field(self):
+        validator = BatchIBANValidator.for_field(get_user_model()._meta.get_field('iban'))
+        # user IBANs are validated with Nordea extensions
+        self.assertTrue(validator.use_nordea_extensions)
+        self.assertTrue(validator.is_valid(['AO06000600000100037131174'])[0])
+
+    def test_invalid_configuration(self):
+        with self.assertRaises(ImproperlyConfigured):
+            BatchIBANValidator(include_countries=['XX'])
+
+    def test_normalize(self):
+        self.assertEqual(normalize_iban('de44 5001-0517'), 'DE4450010517')
+        self.assertIsNone(normalize_iban(None))
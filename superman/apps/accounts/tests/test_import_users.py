@@ -0,0 +1,135 @@
+import io
+import json
+import os
+import shutil
+import tempfile
+
+from django.core.management import call_command, CommandError
+from django.db import connection
+from django.test import TestCase
+from django.contrib.auth import get_user_model
+
+
+class ImportUsersTest(TestCase):
+    def setUp(self):
+        super(ImportUsersTest, self).setUp()
+        self.User = get_user_model()
+        self.super_user = self.User.objects.create(username='admin', is_superuser=True)
+        self.staff_user = self.User.objects.create(username='staff', is_staff=True)
+        self.iban = 'DE44500105175407324931'
+        self.tmp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+        super(ImportUsersTest, self).tearDown()
+
+    def write(self, name, content):
+        path = os.path.join(self.tmp_dir, name)
+        with io.open(path, 'w', encoding='utf-8') as fp:
+            fp.write(content)
+        return path
+
+    def import_users(self, path, *args, **kwargs):
+        out = io.StringIO()
+        call_command('import_users', path, *args, stdout=out, **kwargs)
+        return out.getvalue()
+
+    def test_import_csv(self):
+        path = self.write('users.csv', 'first_name,last_name,iban\n'
+                                       'John,Doe,%s\n'
+                                       'John,Smith,\n'
+                                       'Jane,Doe,\n' % self.iban)
+        self.import_users(path, created_by='admin', batch_size=2)
+        users = self.User.objects.filter(created_by=self.super_user).order_by('id')
+        self.assertEqual([u.username for u in users], ['john', 'john2', 'jane'])
+        self.assertEqual(users[0].iban, self.iban)
+        self.assertEqual(users[1].iban, None)
+        self.assertFalse(users[0].has_usable_password())
+
+    def test_import_jsonl_with_rejected_rows(self):
+        self.User.objects.create(username='existing', iban=self.iban)
+        rows = [
+            {'first_name': 'John', 'last_name': 'Doe', 'iban': 'GB82WEST12345698765432'},
+            {'first_name': 'Jane', 'last_name': 'Doe', 'iban': self.iban},  # IBAN already exists
+            {'first_name': 'Jim', 'last_name': 'Doe', 'iban': 'blah'},  # invalid IBAN
+            {'first_name': 'Jack', 'last_name': 'Doe'},  # staff users can't add users without IBAN
+            {'first_name': 'Joe', 'last_name': 'Doe', 'iban': 'GB82 WEST 1234 5698 7654 32'},  # duplicate
+        ]
+        path = self.write('users.jsonl', '\n'.join(json.dumps(row) for row in rows) + '\nnot json\n')
+        rejected_path = os.path.join(self.tmp_dir, 'rejected.jsonl')
+        self.import_users(path, created_by='staff', rejected=rejected_path)
+
+        users = self.User.objects.filter(created_by=self.staff_user)
+        self.assertEqual([u.username for u in users], ['john'])
+        self.assertEqual(users[0].iban, 'GB82WEST12345698765432')
+
+        with io.open(rejected_path, encoding='utf-8') as fp:
+            rejected = [json.loads(line) for line in fp]
+        self.assertEqual([row['line'] for row in rejected], [2, 3, 4, 5, 6])
+        self.assertEqual(sorted(rejected[0]['errors']), ['iban'])
+        self.assertEqual(rejected[0]['first_name'], 'Jane')
+        self.assertEqual(sorted(rejected[-1]['errors']), ['__all__'])
+
+    def test_import_passwords(self):
+        path = self.write('users.csv', 'first_name,last_name,password\n'
+                                       'John,Doe,correct horse battery\n'
+                                       'Jane,Doe,123\n'
+                                       'Jim,Doe,\n')
+        rejected_path = os.path.join(self.tmp_dir, 'rejected.csv')
+        out = self.import_users(path, created_by='admin', processes=2, rejected=rejected_path)
+        self.assertIn('Hashed 1 passwords with 2 processes', out)
+        users = self.User.objects.filter(created_by=self.super_user).order_by('id')
+        self.assertEqual([u.username for u in users], ['john', 'jim'])
+        self.assertTrue(users[0].check_password('correct horse battery'))
+        self.assertFalse(users[1].has_usable_password())
+        with io.open(rejected_path, encoding='utf-8') as fp:
+            rejected = fp.read()
+        self.assertIn('password:', rejected)
+        self.assertNotIn('123', rejected)
+
+    def test_taken_ibans_are_not_hashed(self):
+        self.User.objects.create(username='existing', iban=self.iban)
+        path = self.write('users.csv', 'first_name,last_name,iban,password\n'
+                                       'John,Doe,%s,correct horse battery\n'
+                                       'Jane,Doe,GB82WEST12345698765432,correct horse battery\n'
+                                       'Jim,Doe,GB82WEST12345698765432,correct horse battery\n' % self.iban)
+        out = self.import_users(path, created_by='admin', processes=1)
+        self.assertIn('Imported 1 users, rejected 2 rows', out)
+        self.assertIn('Hashed 1 passwords', out)
+
+    def test_rejected_rows_have_no_passwords(self):
+        path = self.write('users.jsonl', '{"first_name": "John", "last_name": "Doe", "iban": "invalid", '
+                                         '"password": "correct horse battery"}\n')
+        rejected_path = os.path.join(self.tmp_dir, 'rejected.jsonl')
+        self.import_users(path, created_by='admin', rejected=rejected_path)
+        with io.open(rejected_path, encoding='utf-8') as fp:
+            rejected = fp.read()
+        self.assertNotIn('correct horse battery', rejected)
+        self.assertEqual(sorted(json.loads(rejected)), ['errors', 'first_name', 'iban', 'last_name', 'line'])
+
+    def test_csv_rows_with_extra_cells(self):
+        path = self.write('users.csv', 'first_name,last_name,iban\n'
+                                       'John,Doe,\n'
+                                       'Jane,Doe,,extra,cells\n'
+                                       'Jim,Doe,\n')
+        rejected_path = os.path.join(self.tmp_dir, 'rejected.csv')
+        self.import_users(path, created_by='admin', batch_size=1, rejected=rejected_path)
+        self.assertEqual(list(self.User.objects.filter(created_by=self.super_user).order_by('id')
+                              .values_list('username', flat=True)), ['john', 'jim'])
+        with io.open(rejected_path, encoding='utf-8') as fp:
+            self.assertEqual(fp.read().splitlines(), ['line,first_name,last_name,iban,errors',
+                                                      '3,,,,__all__: Malformed row.'])
+
+    def test_constant_queries_per_batch(self):
+        content = 'first_name,last_name\n' + ''.join('John,Doe %d\n' % i for i in range(50))
+        path = self.write('users.csv', content)
+        # owner lookup, then per batch: savepoint, usernames, insert, primary keys unless the insert
+        # returns them and savepoint release
+        with self.assertNumQueries(5 if connection.features.can_return_ids_from_bulk_insert else 6):
+            self.import_users(path, created_by='admin', batch_size=50)
+        self.assertEqual(self.User.objects.filter(created_by=self.super_user).count(), 50)
+
+    def test_invalid_created_by(self):
+        path = self.write('users.csv', 'first_name,last_name\n')
+        with self.assertRaises(CommandError):
+            self.import_users(path, created_by='nobody')
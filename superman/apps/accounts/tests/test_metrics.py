@@ -0,0 +1,165 @@
+import multiprocessing
+import os
+import shutil
+import tempfile
+from collections import deque
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.exceptions import MiddlewareNotUsed
+from django.core.signals import request_started
+from django.core.urlresolvers import reverse
+from django.db import connection, reset_queries
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, override_settings
+
+from ..cache import get_cache, get_creators
+from ..metrics import REGISTRY, Counter, Histogram, MetricsMiddleware, Registry
+
+
+def _increment(counter, times):
+    for i in range(times):
+        counter.inc(view='child')
+
+
+@override_settings(METRICS_ENABLED=True, METRICS_DIR=None, METRICS_TOKEN='secret')
+class MetricsTest(TestCase):
+    def setUp(self):
+        super(MetricsTest, self).setUp()
+        self.User = get_user_model()
+        self.super_user = self.User.objects.create(username='admin', is_superuser=True, is_staff=True)
+        self.url = reverse('metrics')
+        REGISTRY.reset()
+        self.addCleanup(REGISTRY.reset)
+
+    def metrics(self):
+        response = self.client.get(self.url, HTTP_AUTHORIZATION='Bearer secret')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'text/plain; version=0.0.4; charset=utf-8')
+        return response.content.decode('utf-8').splitlines()
+
+    def test_exposition(self):
+        registry = Registry()
+        counter = Counter('test_total', 'Test counter.', ['view'], registry=registry)
+        histogram = Histogram('test_seconds', 'Test histogram.', buckets=(0.1, 1), registry=registry)
+        counter.inc(view='a "quoted"\nview')
+        counter.inc(2, view='b')
+        histogram.observe(0.05)
+        histogram.observe(0.5)
+        histogram.observe(0.6)
+        self.assertEqual(registry.generate().splitlines(), [
+            '# HELP test_total Test counter.',
+            '# TYPE test_total counter',
+            'test_total{view="a \\"quoted\\"\\nview"} 1',
+            'test_total{view="b"} 2',
+            '# HELP test_seconds Test histogram.',
+            '# TYPE test_seconds histogram',
+            'test_seconds_bucket{le="0.1"} 1',
+            'test_seconds_bucket{le="1"} 3',
+            'test_seconds_bucket{le="+Inf"} 3',
+            'test_seconds_count 3',
+            'test_seconds_sum 1.15',
+        ])
+        with self.assertRaises(ValueError):
+            counter.inc(status='200')
+
+    @override_settings(METRICS_ENABLED=False)
+    def test_disabled(self):
+        with self.assertRaises(MiddlewareNotUsed):
+            MetricsMiddleware(lambda request: HttpResponse())
+        self.assertEqual(self.client.get(self.url, HTTP_AUTHORIZATION='Bearer secret').status_code, 404)
+
+    def test_protected(self):
+        self.assertEqual(self.client.get(self.url).status_code, 401)
+        self.assertEqual(self.client.get(self.url, HTTP_AUTHORIZATION='Bearer wrong').status_code, 401)
+        staff_user = self.User.objects.create(username='staff', is_staff=True)
+        self.client.force_login(staff_user)
+        self.assertEqual(self.client.get(self.url).status_code, 401)
+        self.client.force_login(self.super_user)
+        self.assertEqual(self.client.get(self.url).status_code, 200)
+
+    def test_requests(self):
+        self.client.force_login(self.super_user)
+        self.client.get(reverse('admin:accounts_user_changelist'))
+        self.client.get('/unknown/url/')
+        lines = self.metrics()
+        view = 'view="admin:accounts_user_changelist"'
+        self.assertIn('superman_request_duration_seconds_count{%s} 1' % view, lines)
+        self.assertIn('superman_requests_total{%s,status="200"} 1' % view, lines)
+        self.assertIn('superman_requests_total{view="unresolved",status="404"} 1', lines)
+        self.assertIn('superman_request_queries_count{%s} 1' % view, lines)
+        # session, user and changelist queries
+        self.assertIn('superman_request_queries_bucket{%s,le="1"} 0' % view, lines)
+        self.assertIn('superman_request_queries_bucket{%s,le="+Inf"} 1' % view, lines)
+
+    def test_queries_are_counted_not_recorded(self):
+        logged = []
+
+        def view(request):
+            logged.append(connection.queries_logged)
+            for i in range(5):
+                self.User.objects.filter(pk=i).exists()
+            return HttpResponse()
+        request = RequestFactory().get('/')
+        MetricsMiddleware(view)(request)
+        # debug log of 2 queries is full
+        with self.settings(DEBUG=True), mock.patch.object(connection, 'queries_log', deque(maxlen=2)):
+            MetricsMiddleware(view)(request)
+        self.assertEqual(logged, [False, True])
+        self.assertIn(reset_queries, [receiver() for key, receiver in request_started.receivers])
+        self.assertIn('superman_request_queries_sum{view="unresolved"} 10', self.metrics())
+
+    def test_cache(self):
+        get_cache().clear()
+        get_creators()
+        get_creators()
+        lines = self.metrics()
+        self.assertIn('superman_cache_requests_total{cache="creators",result="hit"} 1', lines)
+        self.assertIn('superman_cache_requests_total{cache="creators",result="miss"} 1', lines)
+
+    def test_time(self):
+        registry = Registry()
+        histogram = Histogram('test_seconds', 'Test histogram.', registry=registry)
+
+        @histogram.time()
+        def func():
+            return 'result'
+        self.assertEqual(func(), 'result')
+        self.assertIn('test_seconds_count 1', registry.generate().splitlines())
+
+    def test_workers_share_directory(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        registry = Registry()
+        counter = Counter('test_total', 'Test counter.', ['view'], registry=registry)
+        with self.settings(METRICS_DIR=directory):
+            counter.inc(view='parent')
+            # forked workers write to their own files
+            context = multiprocessing.get_context('fork')
+            workers = [context.Process(target=_increment, args=(counter, 100)) for i in range(3)]
+            for worker in workers:
+                worker.start()
+            for worker in workers:
+                worker.join()
+            self.assertEqual(len(os.listdir(directory)), 4)
+            self.assertEqual(registry.generate().splitlines()[2:], [
+                'test_total{view="child"} 300',
+                'test_total{view="parent"} 1',
+            ])
+            # values of the process survive reopening the file
+            registry.reset()
+            counter.inc(view='parent')
+            self.assertIn('test_total{view="parent"} 2', registry.generate().splitlines())
+
+    def test_file_grows(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        registry = Registry()
+        counter = Counter('test_total', 'Test counter.', ['view'], registry=registry)
+        with self.settings(METRICS_DIR=directory):
+            for i in range(2000):
+                counter.inc(i, view='view%d' % i)
+            registry.reset()
+            lines = registry.generate().splitlines()
+        self.assertEqual(len(lines), 2002)
+        self.assertIn('test_total{view="view1999"} 1999', lines)
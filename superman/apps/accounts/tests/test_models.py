@@ -1,4 +1,5 @@
-from django.test import TestCase
+from django.core.exceptions import ValidationError
+from django.test import TestCase, override_settings
 from django.contrib.auth import get_user_model
 
 
@@ -14,3 +15,87 @@ class UserModelTest(TestCase):
         u.last_name = 'Doe'
         u.save()
         self.assertEqual(u.__str__(), '{0} {1}'.format(u.first_name, u.last_name))
+
+    @override_settings(SOCIAL_AUTH_ENABLED=False)
+    def test_delete_with_social_account(self):
+        from social.apps.django_app.default.models import UserSocialAuth
+        u = get_user_model().objects.create(username='test')
+        UserSocialAuth.objects.create(user=u, provider='google-oauth2', uid='test@example.com')
+        u.delete()
+        self.assertFalse(UserSocialAuth.objects.exists())
+
+    def test_email_lower(self):
+        u = get_user_model().objects.create(username='test', email='John.Doe@Example.com')
+        self.assertEqual(u.email_lower, 'john.doe@example.com')
+
+        u.email = 'Jane@Example.com'
+        u.save(update_fields=['email'])
+        u.refresh_from_db()
+        self.assertEqual(u.email_lower, 'jane@example.com')
+
+
+class OwnerPathTest(TestCase):
+    def setUp(self):
+        super(OwnerPathTest, self).setUp()
+        self.User = get_user_model()
+        # root -> reseller -> admin -> user
+        self.root = self.User.objects.create(username='root')
+        self.reseller = self.User.objects.create(username='reseller', created_by=self.root)
+        self.admin = self.User.objects.create(username='admin', created_by=self.reseller)
+        self.user = self.User.objects.create(username='user', created_by=self.admin)
+        self.other = self.User.objects.create(username='other')
+
+    def refresh(self, *users):
+        for u in users or (self.root, self.reseller, self.admin, self.user, self.other):
+            u.refresh_from_db()
+
+    def test_create(self):
+        self.refresh()
+        self.assertEqual(self.root.owner_path, '')
+        self.assertEqual(self.user.owner_path, '%s/%s/%s/' % (self.root.pk, self.reseller.pk, self.admin.pk))
+        self.assertEqual(self.user.ancestor_ids, [self.root.pk, self.reseller.pk, self.admin.pk])
+
+    def test_descendants_and_ancestors(self):
+        with self.assertNumQueries(1):
+            descendants = list(self.User.objects.descendants_of(self.reseller).order_by('pk'))
+        self.assertEqual(descendants, [self.admin, self.user])
+        self.assertEqual(list(self.User.objects.descendants_of(self.reseller, include_self=True).order_by('pk')),
+                         [self.reseller, self.admin, self.user])
+        with self.assertNumQueries(1):
+            ancestors = list(self.User.objects.ancestors_of(self.user).order_by('pk'))
+        self.assertEqual(ancestors, [self.root, self.reseller, self.admin])
+
+    def test_reassign(self):
+        # the whole subtree moves along
+        self.reseller.created_by = self.other
+        self.reseller.save()
+        self.refresh()
+        self.assertEqual(self.admin.owner_path, '%s/%s/' % (self.other.pk, self.reseller.pk))
+        self.assertEqual(self.user.owner_path, '%s/%s/%s/' % (self.other.pk, self.reseller.pk, self.admin.pk))
+        self.assertEqual(list(self.User.objects.descendants_of(self.root)), [])
+
+        self.reseller.created_by = None
+        self.reseller.save(update_fields=['created_by'])
+        self.refresh()
+        self.assertEqual(self.reseller.owner_path, '')
+        self.assertEqual(self.user.owner_path, '%s/%s/' % (self.reseller.pk, self.admin.pk))
+
+    def test_reassign_to_descendant(self):
+        self.reseller.created_by = self.user
+        with self.assertRaises(ValidationError):
+            self.reseller.full_clean()
+        with self.assertRaises(ValueError):
+            self.reseller.save()
+
+    def test_delete(self):
+        self.reseller.delete()
+        self.refresh(self.admin, self.user)
+        self.assertEqual(self.admin.created_by, None)
+        self.assertEqual(self.admin.owner_path, '')
+        self.assertEqual(self.user.owner_path, '%s/' % self.admin.pk)
+
+    def test_delete_subtree(self):
+        self.User.objects.filter(pk__in=[self.reseller.pk, self.admin.pk]).delete()
+        self.refresh(self.user)
+        self.assertEqual(self.user.created_by, None)
+        self.assertEqual(self.user.owner_path, '')
@@ -0,0 +1,256 @@
+import io
+import json
+import socket
+import threading
+from datetime import timedelta
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command, CommandError
+from django.core.urlresolvers import reverse
+from django.db import transaction
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from ..models import OutboxMessage
+from ..outbox import WebhookSender, get_retry_delay, publish_created, purge_messages
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_POST(self):
+        server = self.server
+        body = json.loads(self.rfile.read(int(self.headers['Content-Length'])).decode('utf-8'))
+        with server.lock:
+            server.active += 1
+            server.max_active = max(server.max_active, server.active)
+            status = server.statuses.pop(0) if server.statuses else 200
+        # long enough for concurrent requests to overlap
+        server.release.wait(0.05)
+        with server.lock:
+            server.active -= 1
+            server.requests.append((self.path, body))
+            server.connections.add(self.client_address)
+        self.send_response(status)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+class StubServer(ThreadingMixIn, HTTPServer):
+    """
+    Local webhook endpoint answering with queued `statuses`, 200 when there are none left
+    """
+    daemon_threads = True
+
+    def __init__(self):
+        super(StubServer, self).__init__(('127.0.0.1', 0), StubHandler)
+        self.lock = threading.Lock()
+        self.release = threading.Event()
+        self.statuses = []
+        self.requests = []
+        self.connections = set()
+        self.active = self.max_active = 0
+
+    def url(self, path='/'):
+        return 'http://127.0.0.1:%d%s' % (self.server_port, path)
+
+    def events(self, path='/'):
+        return [event for request_path, body in self.requests if request_path == path
+                for event in body['events']]
+
+
+class OutboxTest(TestCase):
+    def setUp(self):
+        super(OutboxTest, self).setUp()
+        self.User = get_user_model()
+        self.server = StubServer()
+        thread = threading.Thread(target=self.server.serve_forever, kwargs={'poll_interval': 0.01})
+        thread.daemon = True
+        thread.start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+        settings = override_settings(WEBHOOK_URLS=[self.server.url('/a'), self.server.url('/b')],
+                                     WEBHOOK_RETRY_DELAY=10, WEBHOOK_MAX_ATTEMPTS=3)
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+    def deliver(self, **kwargs):
+        with WebhookSender(**kwargs) as sender:
+            return sender.drain()
+
+    def test_events(self):
+        user = self.User.objects.create(username='john', is_active=True)
+        user.first_name = 'John'
+        user.save()
+        user.iban = 'DE44500105175407324931'
+        user.is_active = False
+        user.save()
+        self.User.objects.create(username='jane')
+        self.assertEqual(list(OutboxMessage.objects.filter(endpoint=self.server.url('/a')).order_by('id')
+                              .values_list('event', 'user_id')), [
+            ('user.created', user.pk), ('user.deactivated', user.pk), ('user.iban_changed', user.pk),
+            ('user.created', user.pk + 1)])
+        self.assertEqual(OutboxMessage.objects.filter(endpoint=self.server.url('/b')).count(), 4)
+        payload = OutboxMessage.objects.filter(event='user.iban_changed').first().get_payload()
+        self.assertEqual(payload['user']['iban'], 'DE44500105175407324931')
+        # event id is shared by endpoints
+        self.assertEqual(OutboxMessage.objects.filter(payload__contains=payload['id']).count(), 2)
+
+    def test_rolled_back_changes_are_not_published(self):
+        try:
+            with transaction.atomic():
+                self.User.objects.create(username='john')
+                raise ValueError
+        except ValueError:
+            pass
+        self.assertFalse(OutboxMessage.objects.exists())
+
+    @override_settings(WEBHOOK_URLS=[])
+    def test_no_webhooks(self):
+        self.User.objects.create(username='john')
+        self.assertFalse(OutboxMessage.objects.exists())
+
+    def test_bulk_update_and_create(self):
+        users = [self.User.objects.create(username='test%d' % i, iban=None) for i in range(3)]
+        OutboxMessage.objects.all().delete()
+        admin = self.User.objects.create(username='admin', is_superuser=True, is_staff=True)
+        self.client.force_login(admin)
+        self.client.post(reverse('admin:accounts_user_changelist'), {
+            'action': 'deactivate_users', '_selected_action': [user.pk for user in users[:2]]})
+        self.assertEqual(sorted(OutboxMessage.objects.filter(endpoint=self.server.url('/a'))
+                                .exclude(user_id=admin.pk).values_list('event', 'user_id')),
+                         [('user.deactivated', users[0].pk), ('user.deactivated', users[1].pk)])
+
+        OutboxMessage.objects.all().delete()
+        created = [self.User(username='bulk%d' % i) for i in range(2)]
+        self.User.objects.bulk_create(created)
+        publish_created(created)
+        self.assertEqual(sorted(OutboxMessage.objects.filter(endpoint=self.server.url('/a'))
+                                .values_list('event', flat=True)), ['user.created'] * 2)
+        pks = self.User.objects.filter(username__startswith='bulk').values_list('pk', flat=True)
+        self.assertEqual(sorted(message.get_payload()['user']['id']
+                                for message in OutboxMessage.objects.all()), sorted(list(pks) * 2))
+
+    def test_delivery(self):
+        for i in range(5):
+            self.User.objects.create(username='test%d' % i)
+        self.assertEqual(self.deliver(events_per_request=2), 10)
+        # concurrent requests may arrive in any order
+        self.assertEqual(sorted(event['user']['username'] for event in self.server.events('/a')),
+                         ['test%d' % i for i in range(5)])
+        self.assertEqual(len(self.server.events('/b')), 5)
+        # 3 requests per endpoint
+        self.assertEqual(len(self.server.requests), 6)
+        self.assertFalse(OutboxMessage.objects.filter(delivered_at=None).exists())
+        # delivered messages are not sent again
+        self.assertEqual(self.deliver(), 0)
+
+    def test_connections_are_reused(self):
+        for i in range(6):
+            self.User.objects.create(username='test%d' % i)
+        self.server.release.set()
+        self.deliver(events_per_request=1, concurrency=1)
+        self.assertEqual(len(self.server.requests), 12)
+        # keep-alive connections are reused, at most one per endpoint
+        self.assertLessEqual(len(self.server.connections), 2)
+
+    def test_concurrency_per_endpoint(self):
+        for i in range(12):
+            self.User.objects.create(username='test%d' % i)
+        with override_settings(WEBHOOK_URLS=[self.server.url('/a')]):
+            OutboxMessage.objects.exclude(endpoint=self.server.url('/a')).delete()
+            self.deliver(events_per_request=1, concurrency=3)
+        self.assertEqual(len(self.server.requests), 12)
+        self.assertLessEqual(self.server.max_active, 3)
+        self.assertGreater(self.server.max_active, 1)
+
+    def test_retries(self):
+        self.User.objects.create(username='john')
+        self.server.statuses = [500]
+        with override_settings(WEBHOOK_URLS=[self.server.url('/a')]):
+            OutboxMessage.objects.exclude(endpoint=self.server.url('/a')).delete()
+            with self.assertLogs('superman.apps.accounts.outbox', 'WARNING'):
+                self.deliver()
+        message = OutboxMessage.objects.get()
+        self.assertEqual(message.attempts, 1)
+        self.assertIsNone(message.delivered_at)
+        self.assertIn('HTTP 500', message.last_error)
+        self.assertGreater(message.next_attempt_at, timezone.now() + timedelta(seconds=5))
+        # not due yet
+        self.assertEqual(self.deliver(), 0)
+
+        OutboxMessage.objects.update(next_attempt_at=timezone.now())
+        self.assertEqual(self.deliver(), 1)
+        message.refresh_from_db()
+        self.assertEqual(message.attempts, 2)
+        self.assertIsNotNone(message.delivered_at)
+        self.assertIsNone(message.next_attempt_at)
+
+    def test_give_up(self):
+        self.User.objects.create(username='john')
+        OutboxMessage.objects.update(attempts=2)
+        self.server.statuses = [500, 500]
+        with self.assertLogs('superman.apps.accounts.outbox', 'ERROR'):
+            self.deliver()
+        self.assertEqual(list(OutboxMessage.objects.values_list('attempts', 'next_attempt_at',
+                                                                'delivered_at')), [(3, None, None)] * 2)
+
+    def test_unreachable_endpoint(self):
+        # port nothing listens on
+        sock = socket.socket()
+        sock.bind(('127.0.0.1', 0))
+        url = 'http://127.0.0.1:%d/' % sock.getsockname()[1]
+        sock.close()
+        with override_settings(WEBHOOK_URLS=[url]):
+            self.User.objects.create(username='john')
+            with self.assertLogs('superman.apps.accounts.outbox', 'WARNING'):
+                self.deliver(timeout=1)
+        self.assertEqual(list(OutboxMessage.objects.values_list('attempts', flat=True)), [1])
+        self.assertTrue(all(OutboxMessage.objects.values_list('last_error', flat=True)))
+
+    def test_retry_delay(self):
+        self.assertEqual([get_retry_delay(attempts) for attempts in (1, 2, 3)], [10, 20, 40])
+        with override_settings(WEBHOOK_RETRY_MAX_DELAY=30):
+            self.assertEqual(get_retry_delay(10), 30)
+
+    def test_command(self):
+        self.User.objects.create(username='john')
+        err = io.StringIO()
+        call_command('deliver_webhooks', stderr=err)
+        self.assertEqual(err.getvalue().strip(), '2 messages sent, 2 delivered and 0 failed so far')
+        self.assertEqual(len(self.server.requests), 2)
+        with self.assertRaises(CommandError):
+            call_command('deliver_webhooks', concurrency=0)
+
+    def test_purge(self):
+        for i in range(3):
+            self.User.objects.create(username='test%d' % i)
+        self.deliver()
+        OutboxMessage.objects.filter(user_id=self.User.objects.get(username='test0').pk).update(
+            delivered_at=None, attempts=10, next_attempt_at=None)
+        OutboxMessage.objects.filter(user_id=self.User.objects.get(username='test1').pk).update(
+            delivered_at=None, next_attempt_at=timezone.now())
+        self.User.objects.create(username='new')
+        OutboxMessage.objects.exclude(user_id=self.User.objects.get(username='new').pk).update(
+            created_at=timezone.now() - timedelta(days=8))
+        # delivered and given up old messages, two per user
+        self.assertEqual(purge_messages(timezone.now() - timedelta(days=7), batch_size=3), 4)
+        # waiting and new messages are kept
+        pks = [self.User.objects.get(username=username).pk for username in ('test1', 'new')]
+        self.assertEqual(sorted(OutboxMessage.objects.values_list('user_id', flat=True)), sorted(pks * 2))
+
+    def test_command_purges(self):
+        self.User.objects.create(username='john')
+        self.deliver()
+        OutboxMessage.objects.update(created_at=timezone.now() - timedelta(days=2))
+        err = io.StringIO()
+        call_command('deliver_webhooks', purge_after=1, stderr=err)
+        self.assertIn('2 old messages purged', err.getvalue())
+        self.assertFalse(OutboxMessage.objects.exists())
+        with self.assertRaises(CommandError):
+            call_command('deliver_webhooks', purge_after=0)
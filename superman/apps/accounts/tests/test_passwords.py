@@ -0,0 +1,91 @@
+from datetime import timedelta
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import check_password, is_password_usable
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from ..passwords import HashingPool, bulk_create_users, hash_passwords
+
+
+class HashPasswordsTest(TestCase):
+    def test_hash_passwords(self):
+        passwords = ['secret%d' % i for i in range(6)] + [None]
+        encoded = hash_passwords(passwords, processes=2)
+        self.assertEqual(len(encoded), 7)
+        for password, hashed in zip(passwords[:-1], encoded):
+            self.assertTrue(check_password(password, hashed))
+        self.assertFalse(is_password_usable(encoded[-1]))
+
+    @override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+    def test_password_hashers_are_honored(self):
+        for processes in (1, 2):
+            encoded = hash_passwords(['secret', 'secret2'], processes=processes)
+            self.assertTrue(all(hashed.startswith('md5$') for hashed in encoded))
+
+    def test_pool_reports_throughput(self):
+        with HashingPool(processes=2) as pool:
+            pool.hash(['secret', 'secret2', None])
+            pool.hash(['secret3'])
+        self.assertEqual(pool.hashed, 3)
+        self.assertGreater(pool.throughput, 0)
+        self.assertIsNone(pool.pool)
+
+
+class BulkCreateUsersTest(TestCase):
+    def setUp(self):
+        super(BulkCreateUsersTest, self).setUp()
+        self.User = get_user_model()
+
+    def test_bulk_create_users(self):
+        users = [self.User(username='test%d' % i) for i in range(4)]
+        # savepoint, insert and its release, primary keys are looked up unless the insert returns them
+        with self.assertNumQueries(3 if connection.features.can_return_ids_from_bulk_insert else 4):
+            stats = bulk_create_users(users, ['secret%d' % i for i in range(3)] + [None], processes=2)
+        self.assertEqual(stats['created'], 4)
+        self.assertEqual(stats['processes'], 2)
+        self.assertGreater(stats['users_per_second'], 0)
+        users = self.User.objects.order_by('username')
+        self.assertTrue(users[0].check_password('secret0'))
+        self.assertFalse(users[3].has_usable_password())
+
+    def test_creation_is_audited(self):
+        users = [self.User(username='test%d' % i, email='test%d@example.com' % i) for i in range(2)]
+        with mock.patch('superman.apps.accounts.passwords.record') as record:
+            bulk_create_users(users, [None, None], processes=1)
+        entries = record.call_args[0][0]
+        self.assertEqual([(entry.user_id, entry.action) for entry in entries],
+                         [(pk, 'create') for pk in self.User.objects.order_by('username').values_list(
+                             'pk', flat=True)])
+        self.assertEqual(entries[0].get_changes()['email'], [None, 'test0@example.com'])
+
+    def test_derived_fields(self):
+        admin = self.User.objects.create(username='admin')
+        staff = self.User.objects.create(username='staff', created_by=admin)
+        users = [self.User(username='loaded', email='Loaded@Example.com', created_by=staff),
+                 self.User(username='not_loaded', created_by_id=staff.pk),
+                 self.User(username='root')]
+        bulk_create_users(users, [None] * 3, processes=1)
+        self.assertEqual(list(self.User.objects.filter(pk__gt=staff.pk).order_by('pk').values_list(
+            'username', 'email_lower', 'owner_path')), [
+            ('loaded', 'loaded@example.com', '%s/%s/' % (admin.pk, staff.pk)),
+            ('not_loaded', '', '%s/%s/' % (admin.pk, staff.pk)),
+            ('root', '', ''),
+        ])
+        self.assertEqual(self.User.objects.descendants_of(admin).count(), 3)
+
+    def test_users_are_stamped_at_insert(self):
+        # constructed long before the insert, e.g. while passwords are hashed
+        users = [self.User(username='test%d' % i, updated_at=timezone.now() - timedelta(hours=1))
+                 for i in range(2)]
+        started = timezone.now()
+        bulk_create_users(users, ['secret', None], processes=1)
+        self.assertTrue(all(updated_at >= started
+                            for updated_at in self.User.objects.values_list('updated_at', flat=True)))
+
+    def test_passwords_must_match_users(self):
+        with self.assertRaises(ValueError):
+            bulk_create_users([self.User(username='test')], [], processes=1)
+        self.assertFalse(self.User.objects.exists())
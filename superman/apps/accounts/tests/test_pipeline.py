@@ -30,3 +30,34 @@ class PipelineTest(TestCase):
     def test_response_with_valid_type_of_email_but_no_account_exist(self):
         with self.assertRaises(SocialAuthBaseException):
             load_user(response={'emails': [{'type': 'account', 'value': 'test2@example.com'}]})
+
+    def test_response_email_is_case_insensitive(self):
+        with self.assertNumQueries(1):
+            data = load_user(response={'emails': [{'type': 'account', 'value': 'Test@Example.com'}]})
+        self.assertEqual(data, {'user': self.user, 'uid': self.user.id})
+
+    def test_first_user_wins(self):
+        self.User.objects.create(username='test2', email='Test@example.com')
+        data = load_user(response={'emails': [{'type': 'account', 'value': self.user.email}]})
+        self.assertEqual(data, {'user': self.user, 'uid': self.user.id})
+
+    def test_changed_email(self):
+        response = {'emails': [{'type': 'account', 'value': self.user.email}]}
+        load_user(response=response)
+        self.user.email = 'john@example.com'
+        self.user.save()
+        with self.assertRaises(SocialAuthBaseException):
+            load_user(response=response)
+
+    def test_response_with_multiple_emails(self):
+        user = self.User.objects.create(username='test2', email='test2@example.com')
+        response = {'emails': [{'type': 'account', 'value': self.user.email},
+                               {'type': 'account', 'value': user.email}]}
+        # all emails are resolved with a single query
+        with self.assertNumQueries(1):
+            data = load_user(response=response)
+        self.assertEqual(data, {'user': user, 'uid': user.id})
+
+        response['emails'].append({'type': 'account', 'value': 'test3@example.com'})
+        with self.assertRaises(SocialAuthBaseException):
+            load_user(response=response)
@@ -0,0 +1,114 @@
+import os
+import shutil
+import stat
+import tempfile
+
+from django.contrib.auth import get_user_model
+from django.core.exceptions import ImproperlyConfigured, MiddlewareNotUsed
+from django.core.urlresolvers import reverse
+from django.http import HttpResponse
+from django.test import TestCase, override_settings
+
+from ..profiling import ProfilingMiddleware, ensure_private_dir, get_profile_ids, get_top_queries
+
+
+class ProfilingTest(TestCase):
+    def setUp(self):
+        super(ProfilingTest, self).setUp()
+        self.User = get_user_model()
+        self.super_user = self.User.objects.create(username='admin', is_superuser=True, is_staff=True)
+        self.staff_user = self.User.objects.create(username='staff', is_staff=True)
+        for i in range(3):
+            self.User.objects.create(username='test%d' % i, created_by=self.staff_user)
+        self.url = reverse('admin:accounts_user_changelist')
+        self.profiles_url = reverse('admin:accounts_user_profiles')
+        tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp_dir)
+        self.profiling_dir = os.path.join(tmp_dir, 'profiles')
+        settings = override_settings(PROFILING_ENABLED=True, PROFILING_DIR=self.profiling_dir,
+                                     PROFILING_MAX_DUMPS=2)
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+    @override_settings(PROFILING_ENABLED=False)
+    def test_disabled(self):
+        with self.assertRaises(MiddlewareNotUsed):
+            ProfilingMiddleware(lambda request: HttpResponse())
+
+    def test_not_triggered(self):
+        self.client.force_login(self.super_user)
+        response = self.client.get(self.url)
+        self.assertNotIn('X-Profile-Id', response)
+        self.assertEqual(get_profile_ids(), [])
+
+    def test_only_superusers_are_profiled(self):
+        self.client.force_login(self.staff_user)
+        response = self.client.get(self.url, {'_profile': ''})
+        self.assertNotIn('X-Profile-Id', response)
+        self.assertEqual(get_profile_ids(), [])
+        self.assertEqual(self.client.get(self.profiles_url).status_code, 403)
+
+    def test_profile(self):
+        self.client.force_login(self.super_user)
+        response = self.client.get(self.url, HTTP_X_PROFILE='1')
+        self.assertEqual(response.status_code, 200)
+        profile_id = response['X-Profile-Id']
+        self.assertEqual(get_profile_ids(), [profile_id])
+
+        response = self.client.get(self.profiles_url)
+        self.assertContains(response, 'GET %s' % self.url)
+        detail_url = reverse('admin:accounts_user_profile', args=[profile_id])
+        self.assertContains(response, detail_url)
+
+        response = self.client.get(detail_url)
+        self.assertContains(response, 'changelist_view')
+        self.assertContains(response, 'FROM &quot;accounts_user&quot;')
+        for sort in ('tottime', 'ncalls', 'invalid'):
+            self.assertEqual(self.client.get(detail_url, {'sort': sort}).status_code, 200)
+        response = self.client.get(detail_url, {'download': ''})
+        self.assertEqual(response['Content-Disposition'], 'attachment; filename="%s.prof"' % profile_id)
+        self.assertTrue(b''.join(response.streaming_content))
+
+    def test_profiles_are_private(self):
+        self.client.force_login(self.super_user)
+        self.client.get(self.url, {'_profile': ''})
+        self.assertEqual(stat.S_IMODE(os.stat(self.profiling_dir).st_mode), 0o700)
+        names = os.listdir(self.profiling_dir)
+        self.assertEqual(len(names), 2)
+        for name in names:
+            self.assertEqual(stat.S_IMODE(os.stat(os.path.join(self.profiling_dir, name)).st_mode), 0o600)
+
+    def test_existing_directory(self):
+        os.mkdir(self.profiling_dir, 0o777)
+        os.chmod(self.profiling_dir, 0o777)
+        ensure_private_dir(self.profiling_dir)
+        self.assertEqual(stat.S_IMODE(os.stat(self.profiling_dir).st_mode), 0o700)
+        os.rmdir(self.profiling_dir)
+        # e.g. link planted in shared temporary directory
+        os.symlink(tempfile.gettempdir(), self.profiling_dir)
+        with self.assertRaises(ImproperlyConfigured):
+            ensure_private_dir(self.profiling_dir)
+
+    def test_ring_buffer(self):
+        self.client.force_login(self.super_user)
+        profile_ids = [self.client.get(self.url, {'_profile': ''})['X-Profile-Id'] for i in range(3)]
+        self.assertEqual(get_profile_ids(), profile_ids[:0:-1])
+        response = self.client.get(reverse('admin:accounts_user_profile', args=[profile_ids[0]]))
+        self.assertEqual(response.status_code, 404)
+
+    def test_unknown_profile(self):
+        self.client.force_login(self.super_user)
+        for profile_id in ('00000000000000000000-00000000', 'abc-def'):
+            response = self.client.get(self.profiles_url + profile_id + '/')
+            self.assertEqual(response.status_code, 404)
+
+    def test_top_queries(self):
+        queries = [
+            {'alias': 'default', 'sql': 'SELECT 1', 'time': 0.001},
+            {'alias': 'default', 'sql': 'SELECT 2', 'time': 0.002},
+            {'alias': 'default', 'sql': 'SELECT 1', 'time': 0.0015},
+            {'alias': 'replica1', 'sql': 'SELECT 1', 'time': 0.001},
+        ]
+        self.assertEqual([(query['alias'], query['sql'], query['count'])
+                          for query in get_top_queries(queries)],
+                         [('default', 'SELECT 1', 2), ('default', 'SELECT 2', 1), ('replica1', 'SELECT 1', 1)])
@@ -0,0 +1,101 @@
+from django.contrib.auth import get_user_model
+from django.core.exceptions import MiddlewareNotUsed
+from django.core.urlresolvers import reverse
+from django.db import connections
+from django.http import HttpResponse
+from django.test import TestCase, RequestFactory, override_settings
+
+from ..queries import QueryBudget, QueryBudgetExceeded, QueryBudgetMiddleware
+from ..testing import QueryBudgetTestMixin
+
+
+class QueryBudgetTest(TestCase):
+    def setUp(self):
+        super(QueryBudgetTest, self).setUp()
+        self.User = get_user_model()
+
+    def test_count(self):
+        with QueryBudget() as budget:
+            list(self.User.objects.all())
+            self.User.objects.count()
+        self.assertEqual(budget.count, 2)
+        self.assertGreaterEqual(budget.time, 0)
+        self.assertFalse(budget.exceeded)
+
+    def test_all_databases(self):
+        with QueryBudget() as budget:
+            self.User.objects.count()
+        self.assertEqual([alias for alias, context in budget.contexts], list(connections))
+        self.assertEqual([query['alias'] for query in budget.captured_queries], ['default'])
+
+    def test_exceeded_is_logged(self):
+        with self.assertLogs('superman.apps.accounts.queries', 'WARNING') as logs:
+            with QueryBudget(max_queries=1, name='users'):
+                self.User.objects.count()
+                self.User.objects.count()
+        self.assertEqual(logs.output, ['WARNING:superman.apps.accounts.queries:users ran 2 queries, budget is 1'])
+
+    def test_exceeded_raises(self):
+        with self.assertRaises(QueryBudgetExceeded):
+            with QueryBudget(max_queries=0, raise_exception=True):
+                self.User.objects.count()
+
+
+@override_settings(QUERY_BUDGET_ENABLED=True, QUERY_BUDGET_DEFAULT=None, DEBUG=True,
+                   QUERY_BUDGETS={'admin:accounts_user_changelist': 1})
+class QueryBudgetMiddlewareTest(QueryBudgetTestMixin, TestCase):
+    def setUp(self):
+        super(QueryBudgetMiddlewareTest, self).setUp()
+        self.User = get_user_model()
+        self.super_user = self.User.objects.create(username='admin', is_superuser=True, is_staff=True)
+        self.url = reverse('admin:accounts_user_changelist')
+
+    @override_settings(QUERY_BUDGET_ENABLED=False)
+    def test_disabled(self):
+        with self.assertRaises(MiddlewareNotUsed):
+            QueryBudgetMiddleware(lambda request: HttpResponse())
+
+    def test_headers(self):
+        def view(request):
+            self.User.objects.count()
+            return HttpResponse()
+        response = QueryBudgetMiddleware(view)(RequestFactory().get('/'))
+        self.assertEqual(response['X-Query-Count'], '1')
+        self.assertIn('X-Query-Time', response)
+
+    @override_settings(DEBUG=False)
+    def test_no_headers_without_debug(self):
+        response = QueryBudgetMiddleware(lambda request: HttpResponse())(RequestFactory().get('/'))
+        self.assertNotIn('X-Query-Count', response)
+
+    def test_budget_exceeded(self):
+        self.client.force_login(self.super_user)
+        with self.assertLogs('superman.apps.accounts.queries', 'WARNING') as logs:
+            response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('budget of admin:accounts_user_changelist is 1', logs.output[0])
+        self.assertGreater(int(response['X-Query-Count']), 1)
+        self.assertEqual(response['X-Query-Budget'], '1')
+
+    @override_settings(DEBUG=False)
+    def test_budget_exceeded_without_debug(self):
+        self.client.force_login(self.super_user)
+        with self.assertLogs('superman.apps.accounts.queries', 'WARNING'):
+            response = self.client.get(self.url)
+        # changes of the view are committed, so the response is not replaced by an error
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.query_budget.exceeded)
+        self.assertNotIn('X-Query-Budget', response)
+
+    def test_budget_by_view_path(self):
+        self.client.force_login(self.super_user)
+        with override_settings(QUERY_BUDGETS={'django.contrib.admin.options.changelist_view': 0}):
+            with self.assertLogs('superman.apps.accounts.queries', 'WARNING'):
+                response = self.client.get(self.url)
+            self.assertEqual(response['X-Query-Budget'], '0')
+            with self.assertRaises(AssertionError):
+                self.assertWithinBudget(response)
+        with override_settings(QUERY_BUDGETS={}):
+            response = self.client.get(self.url)
+            self.assertNotIn('X-Query-Budget', response)
+            self.assertWithinBudget(response)
@@ -0,0 +1,92 @@
+import io
+import json
+import os
+import tempfile
+
+from django.core.management import call_command, CommandError
+from django.test import TestCase
+from django.contrib.auth import get_user_model
+
+from ..reconciliation import INVALID, MATCHED, UNMATCHED, get_scope, reconcile_ibans
+
+
+class ReconcileIBANsTest(TestCase):
+    def setUp(self):
+        super(ReconcileIBANsTest, self).setUp()
+        self.User = get_user_model()
+        self.super_user = self.User.objects.create(username='admin', is_superuser=True, is_staff=True)
+        self.staff_user = self.User.objects.create(username='staff', is_staff=True)
+        self.own_user = self.User.objects.create(username='own', iban='DE44500105175407324931',
+                                                 created_by=self.staff_user)
+        self.other_user = self.User.objects.create(username='other', iban='GB82WEST12345698765432',
+                                                   created_by=self.super_user)
+
+    def reconcile(self, content, *args, **kwargs):
+        fd, path = tempfile.mkstemp(suffix=kwargs.pop('suffix', '.csv'))
+        with io.open(fd, 'w', encoding='utf-8') as fp:
+            fp.write(content)
+        self.addCleanup(os.remove, path)
+        out = io.StringIO()
+        call_command('reconcile_ibans', path, *args, stdout=out, stderr=io.StringIO(), **kwargs)
+        return out.getvalue()
+
+    def test_reconcile_ibans(self):
+        ibans = ['de44 5001 0517 5407 3249 31', 'GB82-WEST-1234-5698-7654-32', 'FR1420041010050500013M02606',
+                 'DE45500105175407324931', None]
+        results = list(reconcile_ibans(ibans, self.User.objects.all()))
+        self.assertEqual([result.status for result in results],
+                         [MATCHED, MATCHED, UNMATCHED, INVALID, INVALID])
+        self.assertEqual(results[0].normalized, 'DE44500105175407324931')
+        self.assertEqual(results[0].user, self.own_user)
+        self.assertEqual(results[1].user, self.other_user)
+        self.assertIsNone(results[2].user)
+        self.assertEqual(results[3].error, 'Not a valid IBAN.')
+
+    def test_scope(self):
+        ibans = ['DE44500105175407324931', 'GB82WEST12345698765432']
+        results = reconcile_ibans(ibans, get_scope(self.staff_user))
+        self.assertEqual([result.status for result in results], [MATCHED, UNMATCHED])
+        results = reconcile_ibans(ibans, get_scope(self.super_user))
+        self.assertEqual([result.status for result in results], [MATCHED, MATCHED])
+
+    def test_one_query_per_chunk(self):
+        ibans = ['DE44500105175407324931', 'GB82WEST12345698765432'] * 5
+        with self.assertNumQueries(5):
+            results = list(reconcile_ibans(ibans, self.User.objects.all(), chunk_size=2))
+        self.assertEqual(len(results), 10)
+        # chunks with invalid IBANs only don't hit the database
+        with self.assertNumQueries(0):
+            list(reconcile_ibans(['invalid'] * 3, self.User.objects.all()))
+
+    def test_command_csv(self):
+        output = self.reconcile('reference,iban\n1,DE44500105175407324931\n2,GB82WEST12345698765432\n3,XX\n',
+                                user='staff', chunk_size=2)
+        self.assertEqual(output.splitlines(), [
+            'reference,iban,iban_normalized,status,user_id,username,error',
+            '1,DE44500105175407324931,DE44500105175407324931,matched,%d,own,' % self.own_user.pk,
+            '2,GB82WEST12345698765432,GB82WEST12345698765432,unmatched,,,',
+            '3,XX,XX,invalid,,,XX is not a valid country code for IBAN.',
+        ])
+
+    def test_command_jsonl(self):
+        output = self.reconcile('{"account": "GB82 WEST 1234 5698 7654 32"}\nnot json\n', suffix='.jsonl',
+                                user='admin', column='account')
+        rows = [json.loads(line) for line in output.splitlines()]
+        self.assertEqual(rows[0]['status'], MATCHED)
+        self.assertEqual(rows[0]['username'], 'other')
+        self.assertEqual(rows[0]['account'], 'GB82 WEST 1234 5698 7654 32')
+        self.assertEqual(rows[1]['status'], INVALID)
+
+    def test_command_output_file(self):
+        fd, path = tempfile.mkstemp(suffix='.csv')
+        os.close(fd)
+        self.addCleanup(os.remove, path)
+        self.assertEqual(self.reconcile('iban\nDE44500105175407324931\n', user='admin', output=path), '')
+        with io.open(path, encoding='utf-8') as fp:
+            self.assertIn('matched,%d,own' % self.own_user.pk, fp.read())
+
+    def test_invalid_user(self):
+        with self.assertRaises(CommandError):
+            self.reconcile('iban\n', user='nobody')
+        with self.assertRaises(CommandError):
+            self.reconcile('iban\n')
@@ -0,0 +1,97 @@
+from django.contrib.auth import get_user_model
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import transaction
+from django.http import HttpResponse
+from django.test import SimpleTestCase, TestCase, RequestFactory, override_settings
+
+from ..routers import STICKY_COOKIE, ReplicaMiddleware, ReplicaRouter, reset, use_primary
+
+
+@override_settings(DATABASE_REPLICAS=['replica1', 'replica2'])
+class ReplicaRouterTest(SimpleTestCase):
+    def setUp(self):
+        super(ReplicaRouterTest, self).setUp()
+        self.router = ReplicaRouter()
+        self.User = get_user_model()
+        reset()
+        self.addCleanup(reset)
+
+    def test_reads_go_to_replicas(self):
+        self.assertIn(self.router.db_for_read(self.User), ['replica1', 'replica2'])
+        with override_settings(DATABASE_REPLICAS=[]):
+            self.assertEqual(self.router.db_for_read(self.User), 'default')
+
+    def test_replica_is_kept_until_reset(self):
+        replicas = set()
+        for i in range(20):
+            replica = self.router.db_for_read(self.User)
+            self.assertEqual(set(self.router.db_for_read(self.User) for j in range(10)), {replica})
+            replicas.add(replica)
+            reset()
+        self.assertEqual(replicas, {'replica1', 'replica2'})
+        # removed replica is not used anymore
+        replica = self.router.db_for_read(self.User)
+        with override_settings(DATABASE_REPLICAS=[name for name in ('replica1', 'replica2')
+                                                  if name != replica]):
+            self.assertNotEqual(self.router.db_for_read(self.User), replica)
+
+    def test_reads_after_write_go_to_primary(self):
+        self.assertEqual(self.router.db_for_write(self.User), 'default')
+        self.assertEqual(self.router.db_for_read(self.User), 'default')
+
+    def test_use_primary(self):
+        with use_primary():
+            self.assertEqual(self.router.db_for_read(self.User), 'default')
+        self.assertNotEqual(self.router.db_for_read(self.User), 'default')
+
+    def test_migrate_primary_only(self):
+        self.assertTrue(self.router.allow_migrate('default', 'accounts'))
+        self.assertFalse(self.router.allow_migrate('replica1', 'accounts'))
+
+
+@override_settings(DATABASE_REPLICAS=['replica1'], REPLICA_STICKY_SECONDS=15)
+class ReplicaMiddlewareTest(SimpleTestCase):
+    def setUp(self):
+        super(ReplicaMiddlewareTest, self).setUp()
+        self.router = ReplicaRouter()
+        self.User = get_user_model()
+        self.factory = RequestFactory()
+        self.databases = []
+
+    def view(self, write=False):
+        def view(request):
+            if write:
+                self.router.db_for_write(self.User)
+            self.databases.append(self.router.db_for_read(self.User))
+            return HttpResponse()
+        return ReplicaMiddleware(view)
+
+    @override_settings(DATABASE_REPLICAS=[])
+    def test_not_used_without_replicas(self):
+        with self.assertRaises(MiddlewareNotUsed):
+            self.view()
+
+    def test_write_sets_sticky_cookie(self):
+        response = self.view(write=True)(self.factory.post('/'))
+        self.assertEqual(response.cookies[STICKY_COOKIE]['max-age'], 15)
+        response = self.view()(self.factory.get('/'))
+        self.assertNotIn(STICKY_COOKIE, response.cookies)
+        self.assertEqual(self.databases, ['default', 'replica1'])
+
+    def test_sticky_cookie_reads_from_primary(self):
+        request = self.factory.get('/')
+        request.COOKIES[STICKY_COOKIE] = '1'
+        self.view()(request)
+        self.assertEqual(self.databases, ['default'])
+
+    def test_unsafe_requests_read_from_primary(self):
+        self.view()(self.factory.post('/'))
+        self.assertEqual(self.databases, ['default'])
+
+
+@override_settings(DATABASE_REPLICAS=['replica1'])
+class ReplicaTransactionTest(TestCase):
+    def test_reads_in_transaction_go_to_primary(self):
+        reset()
+        with transaction.atomic():
+            self.assertEqual(ReplicaRouter().db_for_read(get_user_model()), 'default')
@@ -0,0 +1,64 @@
+from django.core.urlresolvers import reverse
+from django.test import TestCase, override_settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import Permission
+from django.contrib.contenttypes.models import ContentType
+
+from ..search import search_users
+
+
+class SearchUsersTest(TestCase):
+    def setUp(self):
+        super(SearchUsersTest, self).setUp()
+        self.User = get_user_model()
+        self.super_user = self.User.objects.create(username='admin', is_superuser=True, is_staff=True)
+        self.staff_user = self.User.objects.create(username='staff', is_staff=True)
+        content_type = ContentType.objects.get_for_model(self.User)
+        self.staff_user.user_permissions.add(
+            Permission.objects.get(codename='change_user', content_type=content_type))
+        self.john = self.User.objects.create(username='john', first_name='John', last_name='Smith',
+                                             email='John.Smith@Example.com', created_by=self.staff_user)
+        self.johnson = self.User.objects.create(username='mjohnson', first_name='Mary', last_name='Johnson',
+                                                iban='DE44500105175407324931')
+        self.ajohn = self.User.objects.create(username='ajohn', first_name='Anna', last_name='Long')
+
+    def search(self, query, **kwargs):
+        queryset = search_users(self.User.objects.order_by('username'), query, **kwargs)
+        return [user.username for user in queryset]
+
+    def test_ranking(self):
+        # exact username, then names starting with the query, then the rest by username
+        self.assertEqual(self.search('john'), ['john', 'mjohnson', 'ajohn'])
+        self.assertEqual(self.search('JOHN', rank=False), ['ajohn', 'john', 'mjohnson'])
+
+    def test_fields(self):
+        self.assertEqual(self.search('example.COM'), ['john'])
+        self.assertEqual(self.search('john.smith@example.com'), ['john'])
+        self.assertEqual(self.search('de44 5001'), ['mjohnson'])
+        self.assertEqual(self.search('mary'), ['mjohnson'])
+
+    def test_all_terms_match(self):
+        self.assertEqual(self.search('john smith'), ['john'])
+        self.assertEqual(self.search('john nobody'), [])
+        self.assertEqual(self.search('  '), ['admin', 'ajohn', 'john', 'mjohnson', 'staff'])
+
+    def test_short_terms_match_beginnings(self):
+        self.assertEqual(self.search('jo'), ['john', 'mjohnson'])
+        self.assertEqual(self.search('oh'), [])
+
+    @override_settings(ADMIN_KEYSET_PAGINATION=True)
+    def test_changelist(self):
+        url = reverse('admin:accounts_user_changelist')
+        self.client.force_login(self.super_user)
+        response = self.client.get(url, {'q': 'john'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([user.username for user in response.context['cl'].result_list],
+                         ['john', 'mjohnson', 'ajohn'])
+        # explicit ordering wins over ranking
+        response = self.client.get(url, {'q': 'john', 'o': '1'})
+        self.assertEqual([user.username for user in response.context['cl'].result_list],
+                         ['ajohn', 'john', 'mjohnson'])
+        # search is limited to scope of the administrator
+        self.client.force_login(self.staff_user)
+        response = self.client.get(url, {'q': 'john'})
+        self.assertEqual([user.username for user in response.context['cl'].result_list], ['john'])
@@ -0,0 +1,146 @@
+import datetime
+import io
+import json
+import os
+import tempfile
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command, CommandError
+from django.core.urlresolvers import reverse
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from ..models import UserTombstone
+from ..sync import InvalidCursor, get_changes, iter_changes, scoped_tombstones
+
+
+@override_settings(SYNC_LAG_SECONDS=0)
+class SyncTest(TestCase):
+    def setUp(self):
+        super(SyncTest, self).setUp()
+        self.User = get_user_model()
+        self.super_user = self.User.objects.create(username='admin', is_superuser=True, is_staff=True)
+        self.staff_user = self.User.objects.create(username='staff', is_staff=True)
+        self.users = [self.User.objects.create(username='test%d' % i, created_by=self.staff_user)
+                      for i in range(5)]
+
+    def changes(self, cursor=None, user=None, limit=100):
+        user = user or self.super_user
+        users = self.User.objects.all() if user.is_superuser else self.User.objects.filter(created_by=user)
+        return get_changes(users, scoped_tombstones(user), ['username'], cursor, limit)
+
+    def test_updated_at_is_maintained(self):
+        user = self.users[0]
+        updated_at = user.updated_at
+        user.first_name = 'Test'
+        user.save(update_fields=['first_name'])
+        user.refresh_from_db()
+        self.assertGreater(user.updated_at, updated_at)
+        updated_at = user.updated_at
+        self.User.objects.filter(pk=user.pk).update(is_active=False)
+        user.refresh_from_db()
+        self.assertGreater(user.updated_at, updated_at)
+
+    def test_only_changes_since_cursor(self):
+        rows, cursor, has_more = self.changes()
+        self.assertEqual([row['username'] for row in rows],
+                         ['admin', 'staff'] + ['test%d' % i for i in range(5)])
+        self.assertFalse(has_more)
+        self.assertEqual(self.changes(cursor)[0], [])
+
+        self.users[3].save()
+        self.User.objects.filter(pk=self.users[1].pk).update(first_name='Test')
+        deleted_pk = self.users[4].pk
+        self.users[4].delete()
+        rows, cursor, has_more = self.changes(cursor)
+        self.assertEqual([(row['id'], row['deleted']) for row in rows], [
+            (self.users[3].pk, False), (self.users[1].pk, False), (deleted_pk, True)])
+        self.assertEqual(self.changes(cursor)[0], [])
+
+    def test_batches(self):
+        for user in self.users:
+            user.delete()
+        batches = list(iter_changes(self.User.objects.all(), scoped_tombstones(self.super_user), ['username'],
+                                    batch_size=3))
+        self.assertEqual([len(rows) for rows, cursor in batches], [3, 3, 1])
+        self.assertEqual(sum(row['deleted'] for rows, cursor in batches for row in rows), 5)
+
+    def test_batch_queries_are_constant(self):
+        rows, cursor, has_more = self.changes()
+        self.User.objects.bulk_create([self.User(username='bulk%d' % i) for i in range(100)])
+        # one query for users and one for tombstones, no matter how many rows changed
+        with self.assertNumQueries(2):
+            rows, cursor, has_more = self.changes(cursor, limit=50)
+        self.assertEqual(len(rows), 50)
+        self.assertTrue(has_more)
+
+    def test_lag(self):
+        with self.settings(SYNC_LAG_SECONDS=60):
+            self.assertEqual(self.changes()[0], [])
+        self.User.objects.update(updated_at=timezone.now() - datetime.timedelta(minutes=2))
+        with self.settings(SYNC_LAG_SECONDS=60):
+            self.assertEqual(len(self.changes()[0]), 7)
+
+    def test_scope(self):
+        self.users[0].delete()
+        UserTombstone.objects.create(user_id=0, username='other')
+        rows, cursor, has_more = self.changes(user=self.staff_user)
+        self.assertEqual([(row.get('username'), row['deleted']) for row in rows],
+                         [('test%d' % i, False) for i in range(1, 5)] + [(None, True)])
+
+    @override_settings(ADMIN_SUBTREE_SCOPE=True)
+    def test_deleted_by_admin_action(self):
+        owned = self.User.objects.create(username='owned', email='owned@example.com',
+                                         created_by=self.users[0])
+        self.client.force_login(self.super_user)
+        self.client.post(reverse('admin:accounts_user_changelist'), {
+            'action': 'delete_selected', '_selected_action': [owned.pk], 'post': 'yes'})
+        self.assertFalse(self.User.objects.filter(pk=owned.pk).exists())
+        tombstone = UserTombstone.objects.get(user_id=owned.pk)
+        self.assertEqual((tombstone.created_by_id, tombstone.owner_path),
+                         (self.users[0].pk, self.users[0].subtree_path))
+        rows, cursor, has_more = self.changes(user=self.staff_user)
+        self.assertIn((owned.pk, True), [(row['id'], row['deleted']) for row in rows])
+
+    def test_invalid_cursor(self):
+        with self.assertRaises(InvalidCursor):
+            self.changes('invalid')
+
+    def test_api(self):
+        url = reverse('api:user_changes')
+        self.client.force_login(self.super_user)
+        data = self.client.get(url, {'fields': 'username', 'limit': 5}).json()
+        self.assertEqual(len(data['results']), 5)
+        self.assertTrue(data['has_more'])
+        self.assertEqual(sorted(data['results'][0]), ['deleted', 'id', 'updated_at', 'username'])
+        data = self.client.get(url, {'fields': 'username', 'cursor': data['cursor']}).json()
+        # login updated `last_login` of admin which is a change too
+        self.assertEqual([row['username'] for row in data['results']], ['test4', 'admin'])
+        self.assertFalse(data['has_more'])
+        self.assertEqual(self.client.get(url, {'cursor': 'invalid'}).status_code, 400)
+
+    def test_command(self):
+        fd, cursor_file = tempfile.mkstemp()
+        os.close(fd)
+        os.remove(cursor_file)
+        self.addCleanup(lambda: os.path.exists(cursor_file) and os.remove(cursor_file))
+
+        def sync():
+            out = io.StringIO()
+            call_command('sync_users', user='staff', fields='username', cursor_file=cursor_file, batch_size=2,
+                         stdout=out, stderr=io.StringIO())
+            return [json.loads(line) for line in out.getvalue().splitlines()]
+        self.assertEqual([row['username'] for row in sync()], ['test%d' % i for i in range(5)])
+        self.assertEqual(sync(), [])
+        deleted_pk = self.users[2].pk
+        self.users[2].delete()
+        self.assertEqual([(row['id'], row['deleted']) for row in sync()], [(deleted_pk, True)])
+
+    def test_command_invalid_options(self):
+        with self.assertRaises(CommandError):
+            call_command('sync_users', stdout=io.StringIO())
+        with self.assertRaises(CommandError):
+            call_command('sync_users', user='admin', fields='password', stdout=io.StringIO())
+        with self.assertRaises(CommandError):
+            call_command('sync_users', user='admin', cursor='invalid', stdout=io.StringIO(),
+                         stderr=io.StringIO())
@@ -1,14 +1,28 @@
+from importlib import import_module, reload
+
+from django.conf import settings
 from django.test import TestCase, override_settings
-from django.core.urlresolvers import reverse, NoReverseMatch
+from django.core.urlresolvers import reverse, NoReverseMatch, clear_url_caches
 
 
 class UrlsTest(TestCase):
+    def reload_urls(self):
+        # urls are evaluated once on import, reload them to apply overridden settings
+        clear_url_caches()
+        reload(import_module(settings.ROOT_URLCONF))
+
+    def setUp(self):
+        super(UrlsTest, self).setUp()
+        self.addCleanup(self.reload_urls)
+
     @override_settings(SOCIAL_AUTH_ENABLED=True)
     def test_valid(self):
+        self.reload_urls()
         with not self.assertRaises(NoReverseMatch):
             reverse('social:begin', args=['google-oauth2'])
 
     @override_settings(SOCIAL_AUTH_ENABLED=False)
     def test_valid(self):
+        self.reload_urls()
         with self.assertRaises(NoReverseMatch):
             reverse('social:begin', args=['google-oauth2'])
@@ -1,7 +1,9 @@
+from unittest import mock
+
 from django.test import TestCase
 from django.contrib.auth import get_user_model
 
-from ..utils import generate_unique_username
+from ..utils import generate_unique_username, generate_unique_usernames
 
 
 class AutoUsernameTest(TestCase):
@@ -37,3 +39,60 @@ class AutoUsernameTest(TestCase):
         self.User.objects.create(username='john')
         username = generate_unique_username(['John'])
         self.assertEqual(username, 'john2')
+
+    def test_auto_username_single_query(self):
+        # existing usernames are resolved with a single query no matter how many collide
+        self.User.objects.create(username='john')
+        for i in range(2, 6):
+            self.User.objects.create(username='john{0}'.format(i))
+        self.User.objects.create(username='johnny')
+        with self.assertNumQueries(1):
+            username = generate_unique_username(['John'])
+        self.assertEqual(username, 'john6')
+
+    def test_auto_usernames_chunked(self):
+        self.User.objects.create(username='John')
+        self.User.objects.create(username='jane_')
+        names = [('john', ), ('jane_', ), ('jane', )]
+        with mock.patch('superman.apps.accounts.utils.USERNAME_PREFIX_CHUNK_SIZE', 2), \
+                self.assertNumQueries(2):
+            usernames = generate_unique_usernames(names)
+        # `jane_` starts with `jane` but is not one of its candidates
+        self.assertEqual(usernames, ['john2', 'jane_2', 'jane'])
+
+    def test_auto_username_case_insensitive(self):
+        self.User.objects.create(username='John')
+        username = generate_unique_username(['john'])
+        self.assertEqual(username, 'john2')
+
+    def test_auto_username_length_sanity(self):
+        # conflicts of truncated usernames should be resolved as well
+        max_length = self.User._meta.get_field(self.User.USERNAME_FIELD).max_length
+        self.User.objects.create(username='a'*max_length)
+        username = generate_unique_username(['a'*(max_length+10)])
+        self.assertEqual(username, 'a'*(max_length-1) + '2')
+
+
+class AutoUsernamesTest(TestCase):
+    def setUp(self):
+        super(AutoUsernamesTest, self).setUp()
+        self.User = get_user_model()
+
+    def test_auto_usernames_empty(self):
+        with self.assertNumQueries(0):
+            usernames = generate_unique_usernames([])
+        self.assertEqual(usernames, [])
+
+    def test_auto_usernames(self):
+        self.User.objects.create(username='john')
+        self.User.objects.create(username='jane3')
+        names = [('John', 'Doe'), ('Jane', 'Doe'), ('John', 'Smith'), ('', 'Doe'), ('', ''), ('Jane', '')]
+        with self.assertNumQueries(1):
+            usernames = generate_unique_usernames(names)
+        self.assertEqual(len(usernames), len(names))
+        self.assertEqual(usernames[:4], ['john2', 'jane', 'john3', 'doe'])
+        self.assertEqual(usernames[5], 'jane2')
+        # random username for empty names
+        self.assertTrue(usernames[4])
+        # all usernames are unique
+        self.assertEqual(len(set(usernames)), len(usernames))
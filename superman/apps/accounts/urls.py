@@ -0,0 +1,10 @@
+from django.conf.urls import url
+
+from . import api
+
+
+urlpatterns = [
+    url(r'^users/$', api.user_list, name='user_list'),
+    url(r'^users/changes/$', api.user_changes, name='user_changes'),
+    url(r'^users/(?P<pk>\d+)/$', api.user_detail, name='user_detail'),
+]
@@ -1,12 +1,28 @@
+import csv
+import functools
+import itertools
+import json
+import operator
+import os
 import re
 import unicodedata
 
 from django.utils.encoding import force_text
 from django.contrib.auth import get_user_model
+from django.db.models import Q
 from django.utils.crypto import get_random_string
 
 
 USERNAME_RE = re.compile('[^\w\s@+.-]')
+# max number of digits appended to a username to make it unique
+USERNAME_SUFFIX_MAX_LENGTH = 10
+# existing usernames are looked up by this many prefixes per query
+USERNAME_PREFIX_CHUNK_SIZE = 100
+
+# supported formats of import/export files
+CSV = 'csv'
+JSONL = 'jsonl'
+FORMATS = (CSV, JSONL)
 
 
 def _generate_unique_username_base(txts, regex=USERNAME_RE):
@@ -26,6 +42,87 @@ def _generate_unique_username_base(txts, regex=USERNAME_RE):
     return username or None
 
 
+def _username_candidates(username, max_length, start=0):
+    """
+    Yields candidate usernames `username`, `username2`, `username3`, ... truncated to `max_length`
+    """
+    i = start
+    while True:
+        if i:
+            pfx = str(i + 1)
+        else:
+            pfx = ''
+        yield i, username[0:max_length - len(pfx)] + pfx
+        i += 1
+
+
+def _existing_usernames(usernames, max_length):
+    """
+    Fetches (lowercased) every existing username that could collide with candidates of
+    the given base usernames. Usernames are looked up by OR'ed prefixes, which use the
+    `UPPER(username)` prefix index, `USERNAME_PREFIX_CHUNK_SIZE` per query and candidates
+    are matched in Python.
+    :param usernames: iterable of base usernames
+    :param max_length: max length of username field
+    :return: set of lowercased usernames
+    """
+    User = get_user_model()
+    prefixes = set()
+    patterns = set()
+    for username in usernames:
+        if len(username) + USERNAME_SUFFIX_MAX_LENGTH <= max_length:
+            prefixes.add(username)
+            patterns.add(re.escape(username.lower()) + '[0-9]*')
+        else:
+            # long usernames get truncated to make room for the suffix
+            prefix = username[0:max_length - USERNAME_SUFFIX_MAX_LENGTH]
+            prefixes.add(prefix)
+            patterns.add(re.escape(prefix.lower()) + '.*')
+    if not prefixes:
+        return set()
+    candidate_re = re.compile('|'.join(sorted(patterns)))
+    existing = set()
+    for chunk in chunked(sorted(prefixes), USERNAME_PREFIX_CHUNK_SIZE):
+        query = functools.reduce(operator.or_, (
+            Q(**{User.USERNAME_FIELD + '__istartswith': prefix}) for prefix in chunk))
+        for username in User.objects.filter(query).values_list(User.USERNAME_FIELD, flat=True):
+            username = username.lower()
+            if candidate_re.fullmatch(username):
+                existing.add(username)
+    return existing
+
+
+def generate_unique_usernames(names, regex=USERNAME_RE):
+    """
+    Generates unique usernames for a list of names using a query per `USERNAME_PREFIX_CHUNK_SIZE`
+    distinct names, usernames are unique among existing users as well as among each other
+    :param names: list of lists of strings e.g. [(first_name, last_name), ...]
+    :param regex: regex to validate username
+    :return: list of unique usernames in the same order as `names`
+    """
+    User = get_user_model()
+    max_length = User._meta.get_field(User.USERNAME_FIELD).max_length
+    bases = []
+    for txts in names:
+        username = _generate_unique_username_base(txts, regex)
+        if not username:
+            username = get_random_string(max_length).lower()
+        bases.append(username)
+
+    taken = _existing_usernames(set(bases), max_length)
+    # remember where the search stopped for each base so duplicated names stay linear
+    next_index = {}
+    usernames = []
+    for username in bases:
+        for i, ret in _username_candidates(username, max_length, next_index.get(username, 0)):
+            if ret.lower() not in taken:
+                break
+        next_index[username] = i + 1
+        taken.add(ret.lower())
+        usernames.append(ret)
+    return usernames
+
+
 def generate_unique_username(txts, regex=USERNAME_RE):
     """
     Generates a unique username from list of strings
@@ -35,21 +132,86 @@ def generate_unique_username(txts, regex=USERNAME_RE):
     :param regex: regex to validate username
     :return: unique username
     """
-    User = get_user_model()
-    max_length = User._meta.get_field(User.USERNAME_FIELD).max_length
-    username = _generate_unique_username_base(txts, regex)
-    if not username:
-        username = get_random_string(max_length).lower()
-    i = 0
+    return generate_unique_usernames([txts], regex)[0]
+
+
+def guess_format(path, default=CSV):
+    """
+    Guesses import/export file format from file extension
+    :param path: file path
+    :param default: format to use if it can't be guessed
+    :return: one of `FORMATS`
+    """
+    ext = os.path.splitext(path or '')[1].lower()
+    if ext in ('.jsonl', '.ndjson', '.json'):
+        return JSONL
+    if ext == '.csv':
+        return CSV
+    return default
+
+
+def iter_rows(fp, fmt):
+    """
+    Lazily reads rows from CSV (with header) or JSONL file object, one row is kept in memory
+    at a time. Malformed JSONL lines and CSV rows with more cells than the header are yielded
+    as `None`.
+    :param fp: file object opened in text mode
+    :param fmt: one of `FORMATS`
+    :return: generator of (line number, row dict) tuples
+    """
+    if fmt == JSONL:
+        for line_no, line in enumerate(fp, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError:
+                row = None
+            if not isinstance(row, dict):
+                row = None
+            yield line_no, row
+    else:
+        reader = csv.DictReader(fp)
+        for row in reader:
+            # cells beyond the header are collected under `None` key
+            if None in row:
+                row = None
+            yield reader.line_num, row
+
+
+def chunked(iterable, size):
+    """
+    Splits iterable into lists of `size` items without consuming it upfront
+    """
+    iterator = iter(iterable)
     while True:
-        try:
-            if i:
-                pfx = str(i + 1)
-            else:
-                pfx = ''
-            ret = username[0:max_length - len(pfx)] + pfx
-            query = {User.USERNAME_FIELD + '__iexact': ret}
-            User.objects.get(**query)
-            i += 1
-        except User.DoesNotExist:
-            return ret
+        chunk = list(itertools.islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+class RowWriter(object):
+    """
+    Writes dict rows to a CSV or JSONL file object. CSV header is written before the first row,
+    if `fieldnames` is not given it's taken from the keys of the first row.
+    """
+    def __init__(self, fp, fmt, fieldnames=None):
+        self.fp = fp
+        self.fmt = fmt
+        self.fieldnames = list(fieldnames) if fieldnames else None
+        self.writer = None
+
+    def writeheader(self):
+        if self.fmt == CSV and self.writer is None:
+            self.writer = csv.DictWriter(self.fp, self.fieldnames, extrasaction='ignore')
+            self.writer.writeheader()
+
+    def writerow(self, row):
+        if self.fmt == JSONL:
+            return self.fp.write(json.dumps(row, sort_keys=True, default=force_text) + '\n')
+        if self.fieldnames is None:
+            self.fieldnames = sorted(key for key in row if key is not None)
+        self.writeheader()
+        return self.writer.writerow(row)
@@ -0,0 +1,35 @@
+from django.contrib.admin.widgets import ForeignKeyRawIdWidget
+from django.core.urlresolvers import NoReverseMatch, reverse
+from django.utils.html import format_html
+from django.utils.text import Truncator
+
+from .filters import creator_from_row, find_creator
+
+
+class CreatorRawIdWidget(ForeignKeyRawIdWidget):
+    """
+    Raw id widget of `created_by` which resolves its label from cached creators, all of them
+    are fetched by a single query, instead of querying the user of every rendered widget.
+    Beyond `CREATORS_CACHE_LIMIT` creators the label is queried.
+    """
+    def label_for_value(self, value):
+        try:
+            pk = int(value)
+        except (TypeError, ValueError):
+            return ''
+        row = find_creator(pk)
+        if row is None:
+            # user who didn't create anyone yet
+            return super(CreatorRawIdWidget, self).label_for_value(value)
+
+        obj = creator_from_row(self.rel.model, row)
+        text = Truncator(obj).words(14, truncate='...')
+        try:
+            change_url = reverse(
+                '%s:%s_%s_change' % (self.admin_site.name, obj._meta.app_label, obj._meta.model_name),
+                args=(obj.pk, ))
+        except NoReverseMatch:
+            pass
+        else:
+            text = format_html('<a href="{}">{}</a>', change_url, text)
+        return format_html('&nbsp;<strong>{}</strong>', text)
@@ -11,6 +11,7 @@ https://docs.djangoproject.com/en/1.10/ref/settings/
 """
 
 import os
+import tempfile
 import dj_database_url
 from decouple import config, Csv
 
@@ -30,6 +31,9 @@ DEBUG = config('DEBUG', cast=bool, default=False)
 
 ALLOWED_HOSTS = config('ALLOWED_HOSTS', cast=Csv(), default='*')
 
+# social login, when disabled its app, middleware, context processors and backend are not loaded at all
+SOCIAL_AUTH_ENABLED = config('SOCIAL_AUTH_ENABLED', cast=bool, default=True)
+
 
 # Application definition
 
@@ -43,6 +47,7 @@ INSTALLED_APPS = [
 
     # external apps
     'localflavor',
+    # installed even when SOCIAL_AUTH_ENABLED is off, its table references users
     'social.apps.django_app.default',
 
     # internal apps
@@ -50,16 +55,23 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'superman.apps.accounts.metrics.MetricsMiddleware',
+    'superman.apps.accounts.queries.QueryBudgetMiddleware',
+    'superman.apps.accounts.routers.ReplicaMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'superman.apps.accounts.audit.AuditMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
-    'superman.apps.accounts.middleware.SocialAuthExceptionMiddleware',
+    'superman.apps.accounts.profiling.ProfilingMiddleware',
 ]
 
+if SOCIAL_AUTH_ENABLED:
+    MIDDLEWARE += ['superman.apps.accounts.middleware.SocialAuthExceptionMiddleware']
+
 ROOT_URLCONF = 'superman.urls'
 
 TEMPLATES = [
@@ -74,20 +86,61 @@ TEMPLATES = [
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
                 'superman.apps.accounts.context_processors.accounts',
-                'social.apps.django_app.context_processors.backends',
-                'social.apps.django_app.context_processors.login_redirect',
             ],
         },
     },
 ]
 
+if SOCIAL_AUTH_ENABLED:
+    TEMPLATES[0]['OPTIONS']['context_processors'] += [
+        'superman.apps.accounts.context_processors.backends',
+        'social.apps.django_app.context_processors.login_redirect',
+    ]
+
 WSGI_APPLICATION = 'superman.wsgi.application'
 
 
 # Database
 # https://docs.djangoproject.com/en/1.10/ref/settings/#databases
 
-DATABASES = {'default': dj_database_url.config(default='postgres://localhost/superman')}
+# seconds to keep connections open between requests, 0 closes them after every request
+CONN_MAX_AGE = config('CONN_MAX_AGE', cast=int, default=0)
+
+DATABASES = {
+    'default': dj_database_url.config(default='postgres://localhost/superman', conn_max_age=CONN_MAX_AGE),
+}
+
+# read replicas (comma separated database URLs) serve reads, the primary `default` database serves writes
+DATABASE_REPLICAS = []
+for i, url in enumerate(config('DATABASE_REPLICA_URLS', cast=Csv(), default='')):
+    alias = 'replica%d' % (i + 1)
+    DATABASES[alias] = dj_database_url.parse(url, conn_max_age=CONN_MAX_AGE)
+    # tests run against the primary only
+    DATABASES[alias]['TEST'] = {'MIRROR': 'default'}
+    DATABASE_REPLICAS.append(alias)
+
+DATABASE_ROUTERS = ['superman.apps.accounts.routers.ReplicaRouter']
+# clients who wrote read from the primary for this many seconds, so lagging replicas don't hide their writes
+REPLICA_STICKY_SECONDS = config('REPLICA_STICKY_SECONDS', cast=int, default=15)
+
+
+# Cache
+# https://docs.djangoproject.com/en/1.10/topics/cache/
+# `accounts` cache should be shared by all workers (e.g. memcached) in production
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'accounts': {
+        'BACKEND': config('ACCOUNTS_CACHE_BACKEND', default='django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': config('ACCOUNTS_CACHE_LOCATION', default='accounts'),
+        'TIMEOUT': config('ACCOUNTS_CACHE_TIMEOUT', cast=int, default=300),
+        'OPTIONS': {
+            'MAX_ENTRIES': config('ACCOUNTS_CACHE_MAX_ENTRIES', cast=int, default=10000),
+        },
+    },
+}
 
 
 # Password validation
@@ -134,9 +187,10 @@ LOGIN_REDIRECT_URL = '/'
 
 # python-scial-auth settings
 from django.conf.global_settings import AUTHENTICATION_BACKENDS
-AUTHENTICATION_BACKENDS = [
-    'social.backends.google.GoogleOAuth2',
-] + AUTHENTICATION_BACKENDS
+if SOCIAL_AUTH_ENABLED:
+    AUTHENTICATION_BACKENDS = [
+        'social.backends.google.GoogleOAuth2',
+    ] + AUTHENTICATION_BACKENDS
 
 SOCIAL_AUTH_USER_MODEL = AUTH_USER_MODEL
 SOCIAL_AUTH_SLUGIFY_USERNAMES = True
@@ -156,4 +210,54 @@ SOCIAL_AUTH_PIPELINE = (
 )
 
 # custom settings
-SOCIAL_AUTH_ENABLED = config('SOCIAL_AUTH_ENABLED', cast=bool, default=True)
+ADMIN_KEYSET_PAGINATION = config('ADMIN_KEYSET_PAGINATION', cast=bool, default=False)
+ADMIN_SUBTREE_SCOPE = config('ADMIN_SUBTREE_SCOPE', cast=bool, default=False)
+
+# SQL queries per request are recorded and checked against budgets of views (url name or dotted path)
+QUERY_BUDGET_ENABLED = config('QUERY_BUDGET_ENABLED', cast=bool, default=DEBUG)
+QUERY_BUDGET_DEFAULT = config('QUERY_BUDGET_DEFAULT', cast=int, default=50)
+QUERY_BUDGETS = {
+    'admin:accounts_user_changelist': 15,
+    'admin:accounts_user_change': 15,
+    'admin:accounts_user_add': 15,
+    'api:user_list': 5,
+    'api:user_detail': 5,
+    'api:user_changes': 6,
+}
+
+# changes of users are audited, entries are written in batches by a background thread unless it's disabled
+AUDIT_LOG_ASYNC = config('AUDIT_LOG_ASYNC', cast=bool, default=True)
+AUDIT_LOG_BATCH_SIZE = config('AUDIT_LOG_BATCH_SIZE', cast=int, default=500)
+AUDIT_LOG_FLUSH_INTERVAL = config('AUDIT_LOG_FLUSH_INTERVAL', cast=float, default=1.0)
+AUDIT_LOG_QUEUE_SIZE = config('AUDIT_LOG_QUEUE_SIZE', cast=int, default=10000)
+# tests write audit entries synchronously, see superman.test_runner
+TEST_RUNNER = 'superman.test_runner.TestRunner'
+
+# incremental sync returns changes older than this, so transactions in flight during a sync aren't skipped
+SYNC_LAG_SECONDS = config('SYNC_LAG_SECONDS', cast=int, default=5)
+
+# events of users are written to an outbox along with the change and delivered to these webhooks
+# by `deliver_webhooks` command, failed deliveries are retried after exponentially growing delays
+WEBHOOK_URLS = config('WEBHOOK_URLS', cast=Csv(), default='')
+WEBHOOK_EVENTS_PER_REQUEST = config('WEBHOOK_EVENTS_PER_REQUEST', cast=int, default=100)
+WEBHOOK_CONCURRENCY = config('WEBHOOK_CONCURRENCY', cast=int, default=4)
+WEBHOOK_TIMEOUT = config('WEBHOOK_TIMEOUT', cast=float, default=10.0)
+WEBHOOK_MAX_ATTEMPTS = config('WEBHOOK_MAX_ATTEMPTS', cast=int, default=10)
+WEBHOOK_RETRY_DELAY = config('WEBHOOK_RETRY_DELAY', cast=float, default=10.0)
+WEBHOOK_RETRY_MAX_DELAY = config('WEBHOOK_RETRY_MAX_DELAY', cast=float, default=3600.0)
+
+# superusers profile a request with `_profile` query parameter or `X-Profile` header, dumps of the last
+# PROFILING_MAX_DUMPS profiled requests are kept in PROFILING_DIR
+PROFILING_ENABLED = config('PROFILING_ENABLED', cast=bool, default=False)
+PROFILING_DIR = config('PROFILING_DIR', default=os.path.join(tempfile.gettempdir(), 'superman-profiles'))
+PROFILING_MAX_DUMPS = config('PROFILING_MAX_DUMPS', cast=int, default=50)
+
+# latency, SQL queries and cache metrics in Prometheus format at /metrics/ for superusers or scrapers
+# sending `Authorization: Bearer <METRICS_TOKEN>`, workers of multi-process servers share METRICS_DIR
+METRICS_ENABLED = config('METRICS_ENABLED', cast=bool, default=False)
+METRICS_TOKEN = config('METRICS_TOKEN', default=None)
+METRICS_DIR = config('METRICS_DIR', default=None)
+
+# users JSON API, pages are limited by `limit` parameter
+API_PAGE_SIZE = config('API_PAGE_SIZE', cast=int, default=100)
+API_MAX_PAGE_SIZE = config('API_MAX_PAGE_SIZE', cast=int, default=5000)
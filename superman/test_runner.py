@@ -0,0 +1,24 @@
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+
+
+class TestRunner(DiscoverRunner):
+    """
+    Audit entries are written synchronously in tests, entries queued for the background writer
+    could be written after test databases are destroyed. Tests of the writer turn it on and
+    whatever they leave queued is written before the databases are destroyed.
+    """
+    def setup_test_environment(self, **kwargs):
+        super(TestRunner, self).setup_test_environment(**kwargs)
+        self.audit_settings = override_settings(AUDIT_LOG_ASYNC=False)
+        self.audit_settings.enable()
+
+    def teardown_databases(self, old_config, **kwargs):
+        from superman.apps.accounts.audit import get_writer
+
+        get_writer().stop()
+        super(TestRunner, self).teardown_databases(old_config, **kwargs)
+
+    def teardown_test_environment(self, **kwargs):
+        self.audit_settings.disable()
+        super(TestRunner, self).teardown_test_environment(**kwargs)
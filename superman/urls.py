@@ -17,7 +17,11 @@ from django.conf.urls import url, include
 from django.contrib import admin
 from django.conf import settings
 
+from superman.apps.accounts.metrics import metrics_view
+
 urlpatterns = [
+    url(r'^api/', include('superman.apps.accounts.urls', namespace='api')),
+    url(r'^metrics/$', metrics_view, name='metrics'),
     url(r'^', admin.site.urls),
 ]
 